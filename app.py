@@ -1,14 +1,30 @@
 import os
+import threading
+from datetime import date, timedelta
+import click
 from flask import Flask, render_template
-from helpers.setup import register_error_handlers, get_db, close_db
+from helpers.setup import register_error_handlers, get_db, init_app
+from helpers.api import preload_ticker_metadata
+from helpers.ledger import backfill_position_totals, rebuild_position_totals
+from helpers.lots import backfill_lots, rebuild_lots
+from helpers.importer import import_transactions, CsvImportError, IMPORT_CHUNK_SIZE
+from helpers.metadata import held_tickers
+from helpers.pricestore import STORE
+from helpers.returns import ReturnIndexError
+from helpers.snapshots import update_snapshots
 
 # Importing blueprints
 from blueprints.transactions import bp as transactions_bp
 from blueprints.index import bp as api_bp
+from blueprints.analytics import bp as analytics_bp
 
 # Application set-up
 app = Flask(__name__)
 app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "dev-secret")
+app.config["DATABASE"] = os.getenv("PORTFOLIO_DB", "portfolio.db")
+
+# Pooled database connections, returned at app-context teardown
+init_app(app)
 
 @app.after_request
 def after_request(response):
@@ -21,9 +37,14 @@ def after_request(response):
 # Register error handlers
 register_error_handlers(app)
 
+# Optionally warm ticker metadata in the background
+if os.getenv("PRELOAD_TICKER_METADATA"):
+    threading.Thread(target=preload_ticker_metadata, daemon=True).start()
+
 # Register blueprints
 app.register_blueprint(transactions_bp)
 app.register_blueprint(api_bp)
+app.register_blueprint(analytics_bp)
 
 # Root route
 @app.route("/")
@@ -31,7 +52,6 @@ def index():
     db = get_db()
     rows = db.execute("SELECT id, name FROM strategy").fetchall()
     strategies = [{"id": row["id"], "name": row["name"]} for row in rows]
-    close_db()
     return render_template("index.html", strategies=strategies)
 
 # Transactions route
@@ -40,9 +60,104 @@ def transactions():
     db = get_db()
     rows = db.execute("SELECT id, name FROM strategy").fetchall()
     strategies = [{"id": row["id"], "name": row["name"]} for row in rows]
-    close_db()
     return render_template("transactions.html", strategies=strategies)
 
+# Backfills, run by `flask init-db`; the connection pool applies the schema itself on first use
+def migrate_db():
+    """Fill tables derived from the ledger for databases that recorded trades before those tables existed."""
+    with app.app_context():
+        backfill_lots(get_db())  # totals take cost basis and realized P&L from the lots
+        backfill_position_totals(get_db())
+
+# CLI: create or upgrade the database
+@app.cli.command("init-db")
+def init_db_command():
+    """Create the database, or bring an existing one up to the current schema."""
+    migrate_db()
+    print(f"Database ready at {app.config['DATABASE']}.")
+
+# CLI: preload ticker metadata
+@app.cli.command("preload-metadata")
+def preload_metadata_command():
+    """Store exchange/currency metadata for every held ticker."""
+    result = preload_ticker_metadata()
+    print(f"{result['fetched']} of {result['tickers']} tickers fetched.")
+
+# CLI: rebuild or verify position totals
+@app.cli.command("rebuild-totals")
+@click.option("--verify", is_flag=True, help="Only report drift; do not rewrite totals.")
+@click.option("--strategy", "strategy_id", type=int, default=None, help="Limit to one strategy.")
+def rebuild_totals_command(verify, strategy_id):
+    """Recompute position totals from the transaction ledger and tax lots."""
+    result = rebuild_position_totals(get_db(), strategy_id=strategy_id, verify=verify)
+
+    for d in result["drift"]:
+        print(f"strategy {d['strategy_id']} {d['ticker']} {d['column']}: stored {d['stored']:.6f}, ledger {d['expected']:.6f}")
+    action = "Verified" if verify else "Rebuilt"
+    print(f"{action} {result['positions']} positions; {len(result['drift'])} drifted values.")
+    if verify and result["drift"]:
+        raise SystemExit(1)
+
+# CLI: rebuild tax lots
+@app.cli.command("rebuild-lots")
+@click.option("--method", type=click.Choice(["fifo", "lifo"]), default="fifo", help="How past sells are matched.")
+@click.option("--strategy", "strategy_id", type=int, default=None, help="Limit to one strategy.")
+def rebuild_lots_command(method, strategy_id):
+    """Recreate tax lots by replaying the transaction ledger (position totals follow)."""
+    db = get_db()
+    result = rebuild_lots(db, strategy_id=strategy_id, method=method, commit=False)
+    rebuild_position_totals(db, strategy_id=strategy_id)  # realized P&L depends on the matching
+    print(f"Rebuilt {result['lots']} lots with {result['closures']} closures.")
+
+# CLI: bulk import historical transactions
+@app.cli.command("import-transactions")
+@click.argument("strategy_id", type=int)
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE, help="Rows per insert batch.")
+def import_transactions_command(strategy_id, path, chunk_size):
+    """Stream a CSV (date,type,ticker,shares,price[,amount]) into a strategy's ledger."""
+    def progress(summary):
+        print(f"{summary['rows']} rows read, {summary['inserted']} inserted ({summary['rows_per_second']:.0f} rows/s)")
+
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        try:
+            result = import_transactions(get_db(), strategy_id, f, chunk_size=chunk_size, progress=progress)
+        except CsvImportError as e:
+            raise click.ClickException(str(e))
+
+    for error in result["errors"]:
+        print(f"line {error['line']}: {error['message']}")
+    print(f"Imported {result['inserted']} of {result['rows']} rows in {result['seconds']:.2f}s; {result['skipped']} skipped.")
+
+# CLI: refresh stored price history
+@app.cli.command("refresh-prices")
+@click.option("--start", default=None, help="First date (YYYY-MM-DD); default five years ago.")
+@click.option("--end", default=None, help="Last date (YYYY-MM-DD); default today.")
+@click.option("--ticker", "tickers", multiple=True, help="Ticker to refresh (repeatable); default every holding.")
+def refresh_prices_command(start, end, tickers):
+    """Download missing daily bars into the local price store."""
+    start = start or (date.today() - timedelta(days=5 * 365)).isoformat()
+    tickers = [t.strip().upper() for t in tickers] or held_tickers()
+    result = STORE.refresh(tickers, start, end)
+    print(f"{result['symbols']} symbols, {result['downloads']} downloads, {result['rows']} bars written; {result['up_to_date']} already up to date.")
+
+# CLI: append daily equity snapshots
+@app.cli.command("update-snapshots")
+@click.option("--strategy", "strategy_id", type=int, default=None, help="Limit to one strategy.")
+@click.option("--end", default=None, help="Last date (YYYY-MM-DD); default yesterday.")
+@click.option("--no-refresh", is_flag=True, help="Use stored prices only; download nothing.")
+@click.option("--rebuild", is_flag=True, help="Drop stored snapshots and replay the whole ledger.")
+def update_snapshots_command(strategy_id, end, no_refresh, rebuild):
+    """Replay the ledger against close prices from each strategy's last snapshot forward."""
+    try:
+        result = update_snapshots(get_db(), strategy_id=strategy_id, end=end, refresh=not no_refresh, rebuild=rebuild)
+    except ReturnIndexError as e:
+        raise click.ClickException(str(e))
+    if result["unpriced"]:
+        print(f"Warning: no price history for {', '.join(result['unpriced'])}.")
+    print(f"Wrote {result['rows']} snapshots for {result['strategies']} strategies.")
+
 # Run the application
 if __name__ == "__main__":
+    migrate_db()
     app.run(debug=True)
\ No newline at end of file
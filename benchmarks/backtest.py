@@ -0,0 +1,93 @@
+"""Backtest engine benchmark on synthetic prices.
+
+Generates a decade of daily prices (geometric Brownian motion) for a large
+universe, times one backtest, then sweeps many random weight/rebalance/cost
+variations through the process pool. Prints one JSON line per stage.
+
+    python benchmarks/backtest.py --tickers 500 --years 10 --variations 200
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from helpers.backtest import TRADING_DAYS, run_backtest, run_many  # noqa: E402
+
+
+# =====================================================
+# Synthetic Data
+# =====================================================
+def synthetic_prices(days, tickers, seed):
+    rng = np.random.default_rng(seed)
+    drift = rng.normal(0.0003, 0.0002, tickers)
+    volatility = rng.uniform(0.01, 0.03, tickers)
+    log_returns = rng.standard_normal((days, tickers)) * volatility + drift
+    return 100.0 * np.exp(np.cumsum(log_returns, axis=0))
+
+
+def random_variations(tickers, count, seed):
+    rng = np.random.default_rng(seed + 1)
+    rebalances = ["weekly", "monthly", "quarterly", "yearly", "never"]
+    variations = []
+    for i in range(count):
+        picks = rng.choice(len(tickers), size=min(50, len(tickers)), replace=False)
+        weights = rng.dirichlet(np.ones(len(picks))) * rng.uniform(0.8, 1.0)
+        variations.append({
+            "weights": {tickers[j]: float(w) for j, w in zip(picks, weights)},
+            "rebalance": rebalances[i % len(rebalances)],
+            "starting_cash": 10000,
+            "cost_bps": float(rng.choice([0, 5, 10])),
+        })
+    return variations
+
+
+# =====================================================
+# Main
+# =====================================================
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickers", type=int, default=500)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--variations", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size (default: all cores).")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    days = args.years * TRADING_DAYS
+    tickers = [f"T{i:04d}" for i in range(args.tickers)]
+    prices = synthetic_prices(days, args.tickers, args.seed)
+    variations = random_variations(tickers, args.variations, args.seed)
+
+    start = time.perf_counter()
+    result = run_backtest(tickers, prices, variations[1])
+    single = time.perf_counter() - start
+    print(json.dumps({
+        "stage": "single",
+        "days": days,
+        "tickers": args.tickers,
+        "seconds": round(single, 4),
+        "cagr": round(result["stats"]["cagr"], 4),
+    }))
+
+    start = time.perf_counter()
+    results = run_many(tickers, prices, variations, workers=args.workers)
+    sweep = time.perf_counter() - start
+    best = max(results, key=lambda r: r["stats"]["sharpe"])
+    print(json.dumps({
+        "stage": "sweep",
+        "variations": len(results),
+        "workers": args.workers or os.cpu_count(),
+        "seconds": round(sweep, 3),
+        "backtests_per_second": round(len(results) / sweep, 1),
+        "best_sharpe": round(best["stats"]["sharpe"], 3),
+    }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""Offline micro-benchmarks for the quote, valuation and trade hot paths.
+
+Builds a synthetic portfolio.db in a temp directory (one strategy per
+positions x transactions size) and serves every quote from the synthetic
+provider, so runs need no network and are comparable across commits.
+Times lookup / lookup_many (cold and cached), check_market_status,
+get_portfolio_metrics and the quote, buy and sell endpoints through the
+Flask test client. Prints one JSON line per benchmark; --output saves the
+whole run, and --compare exits non-zero when a median regresses by more
+than --threshold against a saved run.
+
+    python benchmarks/hot_paths.py --output before.json
+    python benchmarks/hot_paths.py --compare before.json --threshold 0.2
+    python benchmarks/hot_paths.py --positions 1000 --transactions 10000000 --repeat 20
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+STARTING_CASH = 1e12  # never the limiting factor for synthetic buys
+INSERT_CHUNK = 100000
+EXCHANGE = "NASDAQ"
+
+
+def sizes(text):
+    return [int(float(value)) for value in text.split(",") if value]
+
+
+# =====================================================
+# Synthetic Ledger
+# =====================================================
+def ticker_names(count):
+    return [f"S{i:04d}" for i in range(count)]
+
+
+def ledger_rows(strategy_id, tickers, transactions, seed):
+    """Trades cycling through the tickers as buy, buy, sell, so no position goes short."""
+    rng = np.random.default_rng(seed)
+    base = np.datetime64("2015-01-01T09:30")
+    for start in range(0, transactions, INSERT_CHUNK):
+        index = np.arange(start, min(start + INSERT_CHUNK, transactions))
+        sells = (index // len(tickers)) % 3 == 2
+        prices = rng.uniform(10, 500, len(index)).round(2)
+        minutes = index * (10 * 365 * 24 * 60 // max(transactions, 1))  # spread over ten years
+        dates = np.datetime_as_string(base + minutes.astype("timedelta64[m]"), unit="s")
+        for i, sell, price, date in zip(index.tolist(), sells.tolist(), prices.tolist(), dates.tolist()):
+            yield (strategy_id, "sell" if sell else "buy", tickers[i % len(tickers)], 10.0, price, date.replace("T", " "))
+
+
+def build_strategy(db, name, positions, transactions, seed):
+    """Insert one synthetic strategy and derive its holdings, running totals and lots."""
+    from helpers.ledger import rebuild_holdings, rebuild_position_totals
+    from helpers.lots import rebuild_lots
+    from helpers.metadata import save_metadata
+
+    tickers = ticker_names(positions)
+    strategy_id = db.execute(
+        "INSERT INTO strategy (name, starting_cash, current_cash, total_value) VALUES (?, ?, ?, ?)",
+        (name, STARTING_CASH, STARTING_CASH, STARTING_CASH),
+    ).lastrowid
+    db.executemany(
+        "INSERT INTO transactions (strategy_id, type, ticker, shares, price, date) VALUES (?, ?, ?, ?, ?, ?)",
+        ledger_rows(strategy_id, tickers, transactions, seed),
+    )
+    rebuild_holdings(db, strategy_id)
+    rebuild_lots(db, strategy_id)
+    rebuild_position_totals(db, strategy_id=strategy_id)
+    db.commit()
+    save_metadata({t: {"exchange": EXCHANGE, "currency": "USD"} for t in tickers})
+    return strategy_id, tickers
+
+
+# =====================================================
+# Timing
+# =====================================================
+def measure(fn, repeat, setup=None):
+    """Run fn repeat times (after one untimed warm-up) and summarize in microseconds."""
+    if setup:
+        setup()
+    fn()
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples = np.array(samples)
+    return {
+        "runs": repeat,
+        "min_us": round(float(samples.min()), 1),
+        "median_us": round(float(np.median(samples)), 1),
+        "mean_us": round(float(samples.mean()), 1),
+        "p95_us": round(float(np.percentile(samples, 95)), 1),
+    }
+
+
+def record(results, name, params, stats):
+    entry = {"name": name, "params": params, **stats}
+    results.append(entry)
+    print(json.dumps(entry), flush=True)
+
+
+def key(entry):
+    return entry["name"] + "".join(f" {k}={v}" for k, v in sorted(entry["params"].items()))
+
+
+# =====================================================
+# Benchmarks
+# =====================================================
+def bench_quotes(results, repeat, positions):
+    from helpers.api import QUOTES, check_market_status, lookup, lookup_many
+
+    record(results, "check_market_status", {}, measure(lambda: check_market_status(EXCHANGE), repeat))
+    record(results, "lookup.cached", {}, measure(lambda: lookup("S0000"), repeat))
+    record(results, "lookup.price_fetch", {}, measure(lambda: lookup("S0000"), repeat, setup=QUOTES.clear))
+
+    fresh = iter(range(10 ** 9))
+    record(results, "lookup.resolve", {}, measure(lambda: lookup(f"NEW{next(fresh)}"), repeat))
+
+    for count in positions:
+        tickers = ticker_names(count)
+        params = {"tickers": count}
+        record(results, "lookup_many.cached", params, measure(lambda: lookup_many(tickers), repeat))
+        record(results, "lookup_many.price_fetch", params,
+               measure(lambda: lookup_many(tickers), repeat, setup=QUOTES.clear))
+
+
+def bench_strategy(results, repeat, app, strategy_id, tickers, params):
+    from blueprints.index import get_portfolio_metrics
+    from helpers.api import QUOTES
+    from helpers.setup import get_db
+
+    with app.app_context():
+        db = get_db()
+        record(results, "get_portfolio_metrics.cached", params,
+               measure(lambda: get_portfolio_metrics(db, strategy_id), repeat))
+        record(results, "get_portfolio_metrics.price_fetch", params,
+               measure(lambda: get_portfolio_metrics(db, strategy_id), repeat, setup=QUOTES.clear))
+
+    client = app.test_client()
+    client.post("/transactions/api/strategy", data={"strategy_id": str(strategy_id)})
+    picks = iter(np.random.default_rng(len(tickers)).choice(tickers, 10 ** 6).tolist())
+
+    def post(route, body):
+        response = client.post(route, json=body)
+        if response.status_code != 200:
+            raise RuntimeError(f"{route} returned {response.status_code}: {response.get_data(as_text=True)}")
+
+    record(results, "POST /transactions/api/quote", params,
+           measure(lambda: post("/transactions/api/quote", {"ticker": next(picks), "shares": 1}), repeat))
+    record(results, "POST /transactions/api/buy", params,
+           measure(lambda: post("/transactions/api/buy", {"ticker": next(picks), "shares": 1, "price": 100.0}), repeat))
+    record(results, "POST /transactions/api/sell", params,
+           measure(lambda: post("/transactions/api/sell", {"ticker": next(picks), "shares": 1, "price": 100.0}), repeat))
+
+
+# =====================================================
+# Comparison
+# =====================================================
+def compare(results, baseline_path, threshold):
+    """Print median ratios against a saved run; returns the benchmarks that regressed."""
+    with open(baseline_path) as f:
+        baseline = {key(entry): entry for entry in json.load(f)["results"]}
+    regressions = []
+    print(f"\n{'benchmark':<70} {'before':>12} {'after':>12} {'ratio':>7}")
+    for entry in results:
+        before = baseline.get(key(entry))
+        if not before:
+            continue
+        ratio = entry["median_us"] / max(before["median_us"], 1e-9)
+        flag = " REGRESSED" if ratio > 1 + threshold else ""
+        print(f"{key(entry):<70} {before['median_us']:>10.1f}us {entry['median_us']:>10.1f}us {ratio:>6.2f}x{flag}")
+        if flag:
+            regressions.append(key(entry))
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# =====================================================
+# Main
+# =====================================================
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--positions", type=sizes, default=sizes("10,100,1000"))
+    parser.add_argument("--transactions", type=sizes, default=sizes("10000,100000,1000000"),
+                        help="Ledger sizes; add 10000000 for the largest case (slow to build).")
+    parser.add_argument("--repeat", type=int, default=50, help="Timed runs per benchmark.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write the full run as JSON.")
+    parser.add_argument("--compare", help="Saved run to compare medians against.")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed median slowdown (0.25 = 25%%).")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="hot-paths-")
+    os.environ["PORTFOLIO_DB"] = os.path.join(workdir, "portfolio.db")
+    os.environ["PRICE_STORE_DIR"] = os.path.join(workdir, "price_store")
+    os.environ["QUOTE_PROVIDER"] = "synthetic"
+    os.environ.setdefault("QUOTE_LATENCY_MS", "0")
+
+    from app import app, migrate_db
+    from helpers.setup import connect_db
+
+    migrate_db()
+    results = []
+    bench_quotes(results, args.repeat, args.positions)
+
+    db = connect_db()
+    for transactions in args.transactions:
+        for positions in args.positions:
+            if transactions < 3 * positions:
+                continue  # too few trades to give every position a buy, buy, sell cycle
+            start = time.perf_counter()
+            strategy_id, tickers = build_strategy(db, f"bench-{positions}-{transactions}", positions, transactions,
+                                                  args.seed)
+            params = {"positions": positions, "transactions": transactions}
+            print(json.dumps({"built": params, "seconds": round(time.perf_counter() - start, 2)}), flush=True)
+            bench_strategy(results, args.repeat, app, strategy_id, tickers, params)
+    db.close()
+
+    run = {
+        "meta": {
+            "commit": git_commit(),
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "sqlite": __import__("sqlite3").sqlite_version,
+            "machine": platform.machine(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(run, f, indent=2)
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) slower than the baseline by more than {args.threshold:.0%}.")
+            sys.exit(1)
+        print("\nNo regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""End-to-end load test of app.py under concurrent users.
+
+Starts the app in W server processes sharing one port (SO_REUSEPORT, like
+gunicorn workers), each serving requests on a pool of T threads, against a
+fresh SQLite database and the synthetic quote provider. Client threads then
+act as users on a handful of seeded strategies with a realistic mix of
+dashboard loads, strategy lists, quotes, buys, sells and deposits for a
+fixed duration. Reports throughput, p50/p95/p99 latency per endpoint and
+the SQLite lock-error rate (503 "database busy" replies plus unhandled
+"database is locked" errors) for every workers x threads combination.
+
+    python benchmarks/load_test.py --workers 1,2,4 --threads 4,8 --users 32 --duration 20
+    python benchmarks/load_test.py --quote-latency-ms 50 --output load.json
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TICKERS = [f"L{i:03d}" for i in range(25)]
+STARTING_CASH = 1_000_000.0
+SEED_POSITIONS = 10  # Holdings bought for each strategy before the run
+
+# Relative frequency of each user action
+MIX = {
+    "GET /api/portfolio/<id>": 30,
+    "GET /api/strategies": 15,
+    "POST /transactions/api/quote": 20,
+    "POST /transactions/api/buy": 15,
+    "POST /transactions/api/sell": 10,
+    "POST /transactions/api/deposit": 10,
+}
+WRITES = ("POST /transactions/api/buy", "POST /transactions/api/sell", "POST /transactions/api/deposit")
+
+
+def counts(text):
+    return [int(value) for value in text.split(",") if value]
+
+
+# =====================================================
+# Server (one worker process)
+# =====================================================
+def serve(port, threads):
+    """Serve app.py on a shared port with a bounded request thread pool."""
+    import sqlite3
+    from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+    from app import app
+    from helpers.trading import is_busy
+
+    @app.errorhandler(sqlite3.OperationalError)
+    def operational_error(e):
+        # Keep the 500, but let the client tell lock errors from other failures
+        if is_busy(e):
+            return "database is locked", 500
+        raise e
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    class PooledServer(BaseWSGIServer):
+        multithread = True
+        request_queue_size = 1024
+
+        def __init__(self):
+            self.pool = ThreadPoolExecutor(max_workers=threads)
+            super().__init__("127.0.0.1", port, app, handler=QuietHandler)
+
+        def server_bind(self):
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            super().server_bind()
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self._handle, request, client_address)
+
+        def _handle(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    PooledServer().serve_forever()
+
+
+def start_servers(workers, threads, port, workdir, latency_ms):
+    env = {
+        **os.environ,
+        "PORTFOLIO_DB": os.path.join(workdir, "portfolio.db"),
+        "PRICE_STORE_DIR": os.path.join(workdir, "price_store"),
+        "QUOTE_PROVIDER": "synthetic",
+        "QUOTE_LATENCY_MS": str(latency_ms),
+    }
+    subprocess.run([sys.executable, "-m", "flask", "--app", "app", "init-db"], cwd=ROOT, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+    command = [sys.executable, os.path.abspath(__file__), "--serve", "--port", str(port), "--threads", str(threads)]
+    procs = [subprocess.Popen(command, cwd=ROOT, env=env) for _ in range(workers)]
+    wait_ready(port)
+    return procs
+
+
+def wait_ready(port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if Client(port).request("GET", "/api/strategies")[0] == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError("Server did not start.")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# =====================================================
+# Client (one simulated user)
+# =====================================================
+class Client:
+    """Minimal HTTP client keeping the Flask session cookie; one connection per request."""
+
+    def __init__(self, port):
+        self.port = port
+        self.cookie = None
+
+    def request(self, method, path, json_body=None, form=None):
+        headers = {"Connection": "close"}
+        body = None
+        if json_body is not None:
+            body, headers["Content-Type"] = json.dumps(json_body), "application/json"
+        elif form is not None:
+            body, headers["Content-Type"] = urlencode(form), "application/x-www-form-urlencoded"
+        if self.cookie:
+            headers["Cookie"] = self.cookie
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=60)
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            data = response.read()
+            cookie = response.getheader("Set-Cookie")
+            if cookie:
+                self.cookie = cookie.split(";", 1)[0]
+            return response.status, data
+        finally:
+            connection.close()
+
+
+def seed_strategies(port, strategies, seed):
+    """Create strategies through the API and give each a few starting positions."""
+    rng = random.Random(seed)
+    ids = []
+    client = Client(port)
+    for i in range(strategies):
+        status, data = client.request("POST", "/api/create-strategy", form={"name": f"load-{i}", "cash": STARTING_CASH})
+        if status != 201:
+            raise RuntimeError(f"Could not create strategy: {data[:200]}")
+        strategy_id = json.loads(data)["id"]
+        client.request("POST", "/transactions/api/strategy", form={"strategy_id": strategy_id})
+        for ticker in rng.sample(TICKERS, SEED_POSITIONS):
+            client.request("POST", "/transactions/api/buy", json_body={"ticker": ticker, "shares": 100, "price": 50.0})
+        ids.append(strategy_id)
+    return ids
+
+
+def user(port, strategy_id, deadline, warmup_until, seed, samples, lock):
+    rng = random.Random(seed)
+    client = Client(port)
+    client.request("POST", "/transactions/api/strategy", form={"strategy_id": strategy_id})
+    actions, weights = list(MIX), list(MIX.values())
+    local = []
+
+    while time.monotonic() < deadline:
+        action = rng.choices(actions, weights)[0]
+        method, route = action.split(" ", 1)
+        path = route.replace("<id>", str(strategy_id))
+        body = None
+        if action.endswith(("buy", "sell")):
+            body = {"ticker": rng.choice(TICKERS), "shares": rng.randint(1, 5), "price": round(rng.uniform(20, 80), 2)}
+        elif action.endswith("quote"):
+            body = {"ticker": rng.choice(TICKERS), "shares": 1}
+        elif action.endswith("deposit"):
+            body = {"amount": round(rng.uniform(10, 1000), 2)}
+
+        start = time.monotonic()
+        try:
+            status, data = client.request(method, path, json_body=body)
+        except OSError:
+            status, data = 0, b""
+        elapsed = time.monotonic() - start
+        if start >= warmup_until:
+            locked = status == 503 or (status == 500 and b"database is locked" in data)
+            local.append((action, elapsed, status, locked))
+
+    with lock:
+        samples.extend(local)
+
+
+# =====================================================
+# Run
+# =====================================================
+def summarize(samples, seconds):
+    """Per-endpoint and overall throughput, latency percentiles and error rates."""
+    def stats(rows):
+        latency = np.array([row[1] for row in rows]) * 1000 if rows else np.zeros(1)
+        locked = sum(row[3] for row in rows)
+        return {
+            "requests": len(rows),
+            "rps": round(len(rows) / seconds, 1),
+            "p50_ms": round(float(np.percentile(latency, 50)), 2),
+            "p95_ms": round(float(np.percentile(latency, 95)), 2),
+            "p99_ms": round(float(np.percentile(latency, 99)), 2),
+            "max_ms": round(float(latency.max()), 2),
+            "rejected": sum(400 <= row[2] < 500 for row in rows),
+            "errors": sum((row[2] == 0 or row[2] >= 500) and not row[3] for row in rows),
+            "lock_errors": locked,
+            "lock_error_rate": round(locked / len(rows), 5) if rows else 0.0,
+        }
+
+    writes = [row for row in samples if row[0] in WRITES]
+    return {
+        "overall": stats(samples),
+        "writes": stats(writes),
+        "endpoints": {action: stats([row for row in samples if row[0] == action]) for action in MIX},
+    }
+
+
+def run(workers, threads, args):
+    workdir = tempfile.mkdtemp(prefix="load-")
+    port = free_port()
+    procs = start_servers(workers, threads, port, workdir, args.quote_latency_ms)
+    try:
+        ids = seed_strategies(port, args.strategies, args.seed)
+        samples, lock = [], threading.Lock()
+        now = time.monotonic()
+        warmup_until, deadline = now + args.warmup, now + args.warmup + args.duration
+        users = [
+            threading.Thread(target=user, args=(port, ids[i % len(ids)], deadline, warmup_until,
+                                                args.seed * 1000 + i, samples, lock))
+            for i in range(args.users)
+        ]
+        for thread in users:
+            thread.start()
+        for thread in users:
+            thread.join()
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "workers": workers,
+        "threads": threads,
+        "users": args.users,
+        "strategies": args.strategies,
+        "seconds": args.duration,
+        "quote_latency_ms": args.quote_latency_ms,
+        **summarize(samples, args.duration),
+    }
+
+
+def report(result):
+    overall = result["overall"]
+    print(f"\nworkers={result['workers']} threads={result['threads']} users={result['users']}: "
+          f"{overall['rps']} req/s, lock-error rate {overall['lock_error_rate']:.3%} "
+          f"(writes {result['writes']['lock_error_rate']:.3%})")
+    print(f"  {'endpoint':<32} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'4xx':>6} {'err':>5} {'lock':>5}")
+    for action, stats in result["endpoints"].items():
+        print(f"  {action:<32} {stats['rps']:>8} {stats['p50_ms']:>8} {stats['p95_ms']:>8} {stats['p99_ms']:>8} "
+              f"{stats['rejected']:>6} {stats['errors']:>5} {stats['lock_errors']:>5}")
+
+
+# =====================================================
+# Main
+# =====================================================
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=counts, default=counts("1,2"), help="Server processes (list to sweep).")
+    parser.add_argument("--threads", type=counts, default=counts("4,8"), help="Threads per server process (list).")
+    parser.add_argument("--users", type=int, default=16, help="Concurrent client threads.")
+    parser.add_argument("--strategies", type=int, default=4, help="Strategies the users are spread over.")
+    parser.add_argument("--duration", type=float, default=15.0, help="Measured seconds per combination.")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Unmeasured seconds before each run.")
+    parser.add_argument("--quote-latency-ms", type=float, default=20.0, help="Simulated upstream quote latency.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write every combination's results as JSON.")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port, args.threads[0])
+        return
+
+    results = []
+    for workers in args.workers:
+        for threads in args.threads:
+            result = run(workers, threads, args)
+            report(result)
+            results.append(result)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Monte Carlo projection benchmark on synthetic returns.
+
+Projects a synthetic portfolio with both return models, first in-process
+and then across the process pool, and checks that the same seed gives the
+same percentiles either way. Prints one JSON line per run.
+
+    python benchmarks/montecarlo.py --holdings 20 --paths 100000 --years 10
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from helpers.backtest import TRADING_DAYS  # noqa: E402
+from helpers.montecarlo import build_model, project  # noqa: E402
+
+
+def synthetic_returns(days, holdings, seed):
+    rng = np.random.default_rng(seed)
+    market = rng.normal(0.0003, 0.01, (days, 1))
+    return market * rng.uniform(0.5, 1.5, holdings) + rng.normal(0.0001, 0.012, (days, holdings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--holdings", type=int, default=20)
+    parser.add_argument("--paths", type=int, default=100000)
+    parser.add_argument("--years", type=float, default=10)
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size (default: all cores).")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    returns = synthetic_returns(3 * TRADING_DAYS, args.holdings, args.seed)
+    values = rng.uniform(1000, 5000, args.holdings)
+    horizons = sorted({1, 5, args.years})
+
+    for method in ("normal", "bootstrap"):
+        model = build_model(values, 5000, returns, method, target=2 * values.sum())
+        results = {}
+        for label, workers in (("single", 1), ("pool", args.workers or max(os.cpu_count() or 1, 2))):
+            start = time.perf_counter()
+            results[label] = project(model, horizons, args.paths, seed=args.seed, workers=workers)
+            elapsed = time.perf_counter() - start
+            print(json.dumps({
+                "method": method,
+                "run": label,
+                "workers": workers,
+                "paths": args.paths,
+                "holdings": args.holdings,
+                "seconds": round(elapsed, 3),
+                "paths_per_second": round(args.paths / elapsed),
+                "median_final": round(results[label]["horizons"][-1]["percentiles"]["50"], 2),
+                "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            }))
+        print(json.dumps({"method": method, "reproducible": results["single"] == results["pool"]}))
+
+
+if __name__ == "__main__":
+    main()
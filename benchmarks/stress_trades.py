@@ -0,0 +1,179 @@
+"""Concurrent order-flow stress test for a single strategy.
+
+Spawns worker processes (like gunicorn workers), each running several
+threads that fire random deposits, withdrawals, buys and sells at the same
+strategy through the Flask test client. Afterwards the strategy's cash,
+holdings, running totals and lots are checked against the transaction
+ledger; any lost update shows up as a mismatch and a non-zero exit code.
+
+    python benchmarks/stress_trades.py --processes 4 --threads 4 --orders 200
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TICKERS = ["AAA", "BBB", "CCC"]
+STARTING_CASH = 100_000.0
+TOLERANCE = 1e-6
+
+
+# =====================================================
+# Worker
+# =====================================================
+def worker(db_path, strategy_id, threads, orders, seed, results):
+    os.environ["PORTFOLIO_DB"] = db_path
+    from app import app
+
+    counts = {"ok": 0, "rejected": 0, "busy": 0, "error": 0}
+    lock = threading.Lock()
+
+    def run(thread_seed):
+        rng = random.Random(thread_seed)
+        client = app.test_client()
+        client.post("/transactions/api/strategy", data={"strategy_id": str(strategy_id)})
+        for _ in range(orders):
+            kind = rng.choice(["deposit", "withdraw", "buy", "buy", "sell", "sell"])
+            if kind in ("deposit", "withdraw"):
+                body = {"amount": round(rng.uniform(1, 500), 2)}
+            else:
+                body = {"ticker": rng.choice(TICKERS), "shares": rng.randint(1, 20), "price": round(rng.uniform(10, 200), 2)}
+            response = client.post(f"/transactions/api/{kind}", json=body)
+            outcome = {200: "ok", 400: "rejected", 503: "busy"}.get(response.status_code, "error")
+            with lock:
+                counts[outcome] += 1
+
+    pool = [threading.Thread(target=run, args=(seed * 1000 + i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put(counts)
+
+
+# =====================================================
+# Ledger Checks
+# =====================================================
+def check_invariants(db, strategy_id):
+    from helpers.ledger import rebuild_position_totals
+
+    failures = []
+    strategy = db.execute("SELECT starting_cash, current_cash FROM strategy WHERE id = ?", (strategy_id,)).fetchone()
+    flows = db.execute(
+        """
+        SELECT
+            COALESCE(SUM(CASE WHEN type = 'deposit' THEN price END), 0)
+          - COALESCE(SUM(CASE WHEN type = 'withdraw' THEN price END), 0)
+          - COALESCE(SUM(CASE WHEN type = 'buy' THEN price * shares END), 0)
+          + COALESCE(SUM(CASE WHEN type = 'sell' THEN price * shares END), 0) AS net
+        FROM transactions WHERE strategy_id = ?
+        """,
+        (strategy_id,),
+    ).fetchone()
+    ledger_cash = strategy["starting_cash"] + flows["net"]
+    if abs(ledger_cash - strategy["current_cash"]) > TOLERANCE:
+        failures.append(f"cash {strategy['current_cash']:.4f} != ledger {ledger_cash:.4f}")
+    if strategy["current_cash"] < -TOLERANCE:
+        failures.append(f"negative cash {strategy['current_cash']:.4f}")
+
+    ledger_shares = {
+        row["ticker"]: row["net"]
+        for row in db.execute(
+            """
+            SELECT ticker, SUM(CASE WHEN type = 'buy' THEN shares ELSE -shares END) AS net
+            FROM transactions WHERE strategy_id = ? AND type IN ('buy', 'sell') GROUP BY ticker
+            """,
+            (strategy_id,),
+        )
+    }
+    held = {row["ticker"]: row["shares"] for row in db.execute("SELECT ticker, shares FROM portfolio WHERE strategy_id = ?", (strategy_id,))}
+    lots = {
+        row["ticker"]: row["remaining"]
+        for row in db.execute(
+            "SELECT ticker, SUM(remaining) AS remaining FROM lots WHERE strategy_id = ? GROUP BY ticker", (strategy_id,)
+        )
+    }
+    for ticker in set(ledger_shares) | set(held):
+        want = ledger_shares.get(ticker, 0.0)
+        if want < -TOLERANCE:
+            failures.append(f"{ticker}: ledger sold more than it bought ({want})")
+        if abs(held.get(ticker, 0.0) - want) > TOLERANCE:
+            failures.append(f"{ticker}: portfolio {held.get(ticker, 0.0)} != ledger {want}")
+        if abs(lots.get(ticker, 0.0) - want) > TOLERANCE:
+            failures.append(f"{ticker}: open lots {lots.get(ticker, 0.0)} != ledger {want}")
+
+    drift = rebuild_position_totals(db, strategy_id=strategy_id, verify=True)["drift"]
+    failures.extend(f"{d['ticker']} {d['column']} drifted" for d in drift)
+    return failures
+
+
+# =====================================================
+# Main
+# =====================================================
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--orders", type=int, default=100, help="Orders per thread.")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="stress-")
+    db_path = os.path.join(workdir, "portfolio.db")
+    os.environ["PORTFOLIO_DB"] = db_path
+    os.environ.setdefault("QUOTE_PROVIDER", "fixture:" + os.path.join(workdir, "quotes.json"))
+    with open(os.path.join(workdir, "quotes.json"), "w") as f:
+        json.dump({"info": {}, "closes": {}}, f)
+
+    from helpers.setup import init_db, db_connection
+    init_db()
+    with db_connection() as db:
+        cursor = db.execute(
+            "INSERT INTO strategy (name, starting_cash, current_cash, total_value) VALUES (?, ?, ?, ?)",
+            ("stress", STARTING_CASH, STARTING_CASH, STARTING_CASH),
+        )
+        strategy_id = cursor.lastrowid
+        db.commit()
+
+    results = multiprocessing.Queue()
+    start = time.perf_counter()
+    procs = [
+        multiprocessing.Process(target=worker, args=(db_path, strategy_id, args.threads, args.orders, args.seed + i, results))
+        for i in range(args.processes)
+    ]
+    for proc in procs:
+        proc.start()
+    totals = {"ok": 0, "rejected": 0, "busy": 0, "error": 0}
+    for _ in procs:
+        for key, value in results.get().items():
+            totals[key] += value
+    for proc in procs:
+        proc.join()
+    elapsed = time.perf_counter() - start
+
+    with db_connection() as db:
+        failures = check_invariants(db, strategy_id)
+        recorded = db.execute("SELECT COUNT(*) FROM transactions WHERE strategy_id = ?", (strategy_id,)).fetchone()[0]
+    if recorded != totals["ok"]:
+        failures.append(f"{totals['ok']} orders acknowledged but {recorded} recorded")
+
+    sent = sum(totals.values())
+    print(json.dumps({**totals, "orders": sent, "seconds": round(elapsed, 2), "orders_per_second": round(sent / elapsed, 1)}))
+    if failures:
+        print("FAILED:")
+        for failure in failures:
+            print("  " + failure)
+        sys.exit(1)
+    print("OK: cash, holdings, totals and lots all match the ledger.")
+
+
+if __name__ == "__main__":
+    main()
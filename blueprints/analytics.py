@@ -0,0 +1,274 @@
+from datetime import date, timedelta
+from flask import request, abort, jsonify
+
+# Custom modules
+from helpers.setup import get_db, create_blueprint
+from helpers.backtest import BacktestError, run_backtest
+from helpers.pricestore import STORE, PriceStoreError
+from helpers.risk import CONFIDENCE_LEVELS, DEFAULT_BENCHMARK, DEFAULT_LOOKBACK, RiskError, estimates, portfolio_risk
+from helpers.optimizer import FRONTIER_POINTS, OptimizerError, optimize
+from helpers.montecarlo import (DEFAULT_PATHS, HORIZONS, MAX_REQUEST_PATHS, MAX_REQUEST_STEPS, STEP_DAYS, ProjectionError,
+                               build_model, project)
+from helpers.snapshots import equity_curve, period_return, update_snapshots
+from helpers.returns import DEFAULT_SPANS, ReturnIndexError, SpanError, span_window, window_returns
+from blueprints.index import get_portfolio_metrics
+
+bp = create_blueprint("analytics")
+
+DEFAULT_LOOKBACK_DAYS = 5 * 365
+
+
+# =====================================================
+# Helper: Strategy Weights
+# =====================================================
+def current_weights(db, strategy_id):
+    """Each holding's share of the strategy's total value right now (the rest is cash).
+
+    Returns (weights, starting_cash, total_value).
+    """
+    strategy = db.execute(
+        "SELECT starting_cash, current_cash FROM strategy WHERE id = ?", (strategy_id,)
+    ).fetchone()
+    if not strategy:
+        abort(404, description="Strategy not found.")
+    metrics = get_portfolio_metrics(db, strategy_id)
+    total = metrics["equity_value"] + float(strategy["current_cash"])
+    weights = {stock["ticker"]: stock["share_value"] / total for stock in metrics["portfolio"]} if total > 0 else {}
+    return weights, float(strategy["starting_cash"]), total
+
+
+def require_strategy(db, strategy_id):
+    if not db.execute("SELECT id FROM strategy WHERE id = ?", (strategy_id,)).fetchone():
+        abort(404, description="Strategy not found.")
+
+
+def lookback_start(end, lookback):
+    """Calendar start date comfortably covering lookback business days before end."""
+    last = date.fromisoformat(end) if end else date.today()
+    return (last - timedelta(days=lookback * 7 // 5 + 7)).isoformat(), last.isoformat()
+
+
+def date_range(data):
+    end = data.get("end") or date.today().isoformat()
+    start = data.get("start") or (date.today() - timedelta(days=DEFAULT_LOOKBACK_DAYS)).isoformat()
+    return start, end
+
+
+def refresh_prices(tickers, start, end):
+    """Make sure the price store covers tickers over [start, end], downloading only what is missing."""
+    try:
+        STORE.refresh(tickers, start, end)
+    except PriceStoreError as e:
+        abort(400, description=str(e))
+    except Exception as e:
+        print(f"[history error] {', '.join(tickers)}: {e}")
+        abort(502, description="Failed to download price history.")
+
+
+# =====================================================
+# Backtest
+# =====================================================
+@bp.route("/api/backtest", methods=["POST"])
+def backtest():
+    """Backtest target weights (or a strategy's current mix) over stored daily prices."""
+    data = request.get_json(silent=True) or {}
+    db = get_db()
+    rules = {key: data[key] for key in ("rebalance", "cost_bps", "starting_cash") if key in data}
+
+    weights = data.get("weights")
+    if data.get("strategy_id"):
+        held, starting_cash, _ = current_weights(db, data["strategy_id"])
+        weights = weights or held
+        rules.setdefault("starting_cash", starting_cash)
+    if not isinstance(weights, dict) or not weights:
+        abort(400, description="Provide weights or a strategy with holdings.")
+    weights = {(ticker or "").strip().upper(): w for ticker, w in weights.items()}
+    rules["weights"] = weights
+
+    start, end = date_range(data)
+    tickers = sorted(weights)
+    refresh_prices(tickers, start, end)
+
+    try:
+        prices, tickers, dates = STORE.window(tickers, start, end, currency="USD")
+        result = run_backtest(tickers, prices.T, rules, dates=[str(d) for d in dates])
+    except (BacktestError, PriceStoreError) as e:
+        abort(400, description=str(e))
+
+    return jsonify({"start": start, "end": end, "tickers": tickers, **result})
+
+
+# =====================================================
+# Risk
+# =====================================================
+@bp.route("/api/portfolio/<int:id>/risk", methods=["GET"])
+def get_portfolio_risk(id):
+    """Volatility, beta, Sharpe/Sortino, drawdown and VaR/CVaR of the current holdings.
+
+    ?benchmark=SPY&lookback=252 (daily returns)&end=&risk_free=0.04&confidence=0.95,0.99
+    """
+    db = get_db()
+    weights, _, total = current_weights(db, id)
+    if not weights:
+        abort(400, description="Strategy has no holdings to measure.")
+    try:
+        benchmark = (request.args.get("benchmark") or DEFAULT_BENCHMARK).strip().upper()
+        lookback = int(request.args.get("lookback") or DEFAULT_LOOKBACK)
+        risk_free = float(request.args.get("risk_free") or 0.0)
+        levels = [float(c) for c in request.args["confidence"].split(",")] if request.args.get("confidence") \
+            else CONFIDENCE_LEVELS
+        end = date.fromisoformat(request.args["end"]).isoformat() if request.args.get("end") else None
+    except ValueError as e:
+        abort(400, description=str(e))
+
+    refresh_prices(sorted(set(weights) | {benchmark}), *lookback_start(end, lookback))
+    try:
+        result = portfolio_risk(weights, total, benchmark, lookback, end, risk_free, levels)
+    except (RiskError, PriceStoreError) as e:
+        abort(400, description=str(e))
+    return jsonify(result)
+
+
+# =====================================================
+# Mean-Variance Optimization
+# =====================================================
+@bp.route("/api/portfolio/<int:id>/optimize", methods=["POST"])
+def optimize_portfolio(id):
+    """Minimum-variance, maximum-Sharpe and target-return weights plus the efficient frontier.
+
+    JSON body (all optional): lookback, end, max_weight, min_cash, risk_free,
+    target_return, points. The universe is the strategy's current holdings.
+    """
+    data = request.get_json(silent=True) or {}
+    db = get_db()
+    require_strategy(db, id)
+    tickers = sorted({
+        row["ticker"].strip().upper()
+        for row in db.execute("SELECT ticker FROM portfolio WHERE strategy_id = ? AND shares > 0", (id,))
+    })
+    if len(tickers) < 2:
+        abort(400, description="Optimization needs at least two holdings.")
+    try:
+        lookback = int(data.get("lookback") or DEFAULT_LOOKBACK)
+        end = date.fromisoformat(data["end"]).isoformat() if data.get("end") else None
+        options = {
+            "max_weight": float(data.get("max_weight", 1.0)),
+            "min_cash": float(data.get("min_cash", 0.0)),
+            "risk_free": float(data.get("risk_free", 0.0)),
+            "target_return": float(data["target_return"]) if data.get("target_return") is not None else None,
+            "points": int(data.get("points") or FRONTIER_POINTS),
+        }
+    except (TypeError, ValueError) as e:
+        abort(400, description=str(e))
+
+    refresh_prices(tickers, *lookback_start(end, lookback))
+    try:
+        _, mean, covariance, _ = estimates(tickers, lookback, end)
+        result = optimize(tickers, mean, covariance, **options)
+    except (OptimizerError, RiskError, PriceStoreError) as e:
+        abort(400, description=str(e))
+
+    weights, _, _ = current_weights(db, id)
+    result["current"] = [weights.get(ticker, 0.0) for ticker in tickers]
+    return jsonify(result)
+
+
+# =====================================================
+# Monte Carlo Projection
+# =====================================================
+@bp.route("/api/portfolio/<int:id>/projection", methods=["POST"])
+def project_portfolio(id):
+    """Percentile fan and target probabilities for the strategy's current holdings and cash.
+
+    JSON body (all optional): years (list), paths, method (normal|bootstrap),
+    step_days, target, risk_free, seed, lookback, end.
+    """
+    data = request.get_json(silent=True) or {}
+    db = get_db()
+    strategy = db.execute("SELECT current_cash FROM strategy WHERE id = ?", (id,)).fetchone()
+    if not strategy:
+        abort(404, description="Strategy not found.")
+    holdings = {stock["ticker"]: stock["share_value"] for stock in get_portfolio_metrics(db, id)["portfolio"]}
+    if not holdings:
+        abort(400, description="Strategy has no priced holdings to project.")
+    tickers = sorted(holdings)
+    try:
+        lookback = int(data.get("lookback") or DEFAULT_LOOKBACK)
+        end = date.fromisoformat(data["end"]).isoformat() if data.get("end") else None
+        horizons = [float(y) for y in data.get("years") or HORIZONS]
+        paths = int(data.get("paths") or DEFAULT_PATHS)
+        seed = int(data["seed"]) if data.get("seed") is not None else None
+        step_days = int(data.get("step_days") or STEP_DAYS)
+        target = float(data["target"]) if data.get("target") else None
+        risk_free = float(data.get("risk_free", 0.0))
+    except (TypeError, ValueError) as e:
+        abort(400, description=str(e))
+
+    refresh_prices(tickers, *lookback_start(end, lookback))
+    try:
+        returns, _, _, _ = estimates(tickers, lookback, end)
+        model = build_model([holdings[t] for t in tickers], float(strategy["current_cash"]), returns,
+                            data.get("method", "normal"), step_days, risk_free, target)
+        result = project(model, horizons, paths, seed, max_paths=MAX_REQUEST_PATHS, max_steps=MAX_REQUEST_STEPS)
+    except (ProjectionError, RiskError, PriceStoreError) as e:
+        abort(400, description=str(e))
+    return jsonify({"tickers": tickers, **result})
+
+
+# =====================================================
+# Equity Curve & Period Returns (daily snapshots)
+# =====================================================
+@bp.route("/api/portfolio/<int:id>/equity-curve", methods=["GET"])
+def get_equity_curve(id):
+    """Daily end-of-day values from equity_snapshots; ?refresh=1 appends any missing days first."""
+    db = get_db()
+    require_strategy(db, id)
+    if request.args.get("refresh"):
+        try:
+            update_snapshots(db, strategy_id=id)
+        except PriceStoreError as e:
+            abort(400, description=str(e))
+        except ReturnIndexError as e:
+            abort(500, description=str(e))
+    return jsonify(equity_curve(db, id, request.args.get("start"), request.args.get("end")))
+
+
+@bp.route("/api/portfolio/<int:id>/returns", methods=["GET"])
+def get_period_return(id):
+    """Value change, net deposits/withdrawals and time-weighted return between two dates."""
+    db = get_db()
+    require_strategy(db, id)
+    result = period_return(equity_curve(db, id, request.args.get("start"), request.args.get("end")))
+    if result is None:
+        abort(404, description="Not enough snapshots in that range; run flask update-snapshots.")
+    return jsonify(result)
+
+
+@bp.route("/api/returns", methods=["GET"])
+def get_window_returns():
+    """Returns for many strategies over many windows, each read from two return_index rows.
+
+    ?strategies=1,2 (default all), ?spans=1M,YTD,1Y,MAX ending on ?end (default
+    yesterday) and/or ?windows=start:end,start:end for explicit date ranges.
+    """
+    db = get_db()
+    try:
+        end = date.fromisoformat(request.args.get("end") or (date.today() - timedelta(days=1)).isoformat())
+        if request.args.get("strategies"):
+            strategy_ids = [int(s) for s in request.args["strategies"].split(",") if s.strip()]
+        else:
+            strategy_ids = [row["id"] for row in db.execute("SELECT id FROM strategy ORDER BY id")]
+
+        windows = []
+        spans = request.args.get("spans")
+        if spans or not request.args.get("windows"):
+            for span in (spans.split(",") if spans else DEFAULT_SPANS):
+                windows.append((span.strip().upper(), *span_window(span, end)))
+        for window in filter(None, (request.args.get("windows") or "").split(",")):
+            start, _, stop = window.partition(":")
+            windows.append((window, date.fromisoformat(start).isoformat(), date.fromisoformat(stop).isoformat()))
+    except (SpanError, ValueError) as e:
+        abort(400, description=str(e))
+
+    results = window_returns(db, strategy_ids, windows)
+    return jsonify({"end": end.isoformat(), "strategies": {str(sid): spans for sid, spans in results.items()}})
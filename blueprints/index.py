@@ -1,12 +1,20 @@
+import json
+import time
 from sqlite3 import IntegrityError
-from flask import request, abort, jsonify
+from flask import Response, request, abort, jsonify
 
 # Custom modules
-from helpers.setup import get_db, close_db, create_blueprint
-from helpers.api import lookup
+from helpers.setup import get_db, create_blueprint, db_connection
+from helpers.api import lookup_many, QUOTES, FX_RATES, INFLIGHT
+from helpers.lots import lot_report
+from helpers.live import POLLER
+from helpers.valuation import value_strategies
+from helpers.risk import COVARIANCE
 
 bp = create_blueprint("index")
 
+LIVE_HEARTBEAT_SECONDS = 15  # Comment line sent when nothing moved, keeps proxies from closing the stream
+
 
 # =====================================================
 # Create Strategy
@@ -38,15 +46,12 @@ def create_strategy():
         db.commit()
     except IntegrityError:
         abort(400, description="Strategy name must be unique.")
-    try:
-        row = db.execute(
-            "SELECT id FROM strategy WHERE name = ?", (name,)
-        ).fetchone()
-        if not row:
-            abort(500, description="Failed to retrieve newly created strategy.")
-        id = row["id"]
-    finally:
-        close_db()
+    row = db.execute(
+        "SELECT id FROM strategy WHERE name = ?", (name,)
+    ).fetchone()
+    if not row:
+        abort(500, description="Failed to retrieve newly created strategy.")
+    id = row["id"]
 
     return jsonify({"status": "success", "id": id, "name": name, "cash": cash}), 201
 
@@ -57,22 +62,25 @@ def create_strategy():
 @bp.route("/api/strategies", methods=["GET"])
 def get_strategies():
     db = get_db()
-    try:
-        rows = db.execute(
-            "SELECT id, name, current_cash, total_value FROM strategy ORDER BY id ASC"
-        ).fetchall()
-        strategies = [
-            {
-                "id": row["id"],
-                "name": row["name"],
-                "cash": row["current_cash"],
-                "total_value": row["total_value"],
-            }
-            for row in rows
-        ]
-        return jsonify({"strategies": strategies, "exists": bool(rows)})
-    finally:
-        close_db()
+
+    # ?refresh=1: revalue every strategy now (one quote per distinct ticker, one write)
+    if request.args.get("refresh"):
+        result = value_strategies(db)
+        return jsonify({**result, "exists": bool(result["strategies"])})
+
+    rows = db.execute(
+        "SELECT id, name, current_cash, total_value FROM strategy ORDER BY id ASC"
+    ).fetchall()
+    strategies = [
+        {
+            "id": row["id"],
+            "name": row["name"],
+            "cash": row["current_cash"],
+            "total_value": row["total_value"],
+        }
+        for row in rows
+    ]
+    return jsonify({"strategies": strategies, "exists": bool(rows)})
 
 
 # =====================================================
@@ -87,16 +95,22 @@ def display_portfolio(id):
         "SELECT starting_cash, current_cash FROM strategy WHERE id = ?", (id,)
     ).fetchone()
     if not strategy:
-        close_db()
         abort(404, description="Strategy not found.")
 
-    starting_cash = float(strategy["starting_cash"])
-    current_cash = float(strategy["current_cash"])
-
     # Portfolio metrics
     portfolio_data = get_portfolio_metrics(db, id)
-    portfolio = portfolio_data["portfolio"]
-    equity_value = portfolio_data["equity_value"]
+    overview = build_overview(strategy, portfolio_data["equity_value"])
+
+    # Update cached total value
+    db.execute("UPDATE strategy SET total_value = ? WHERE id = ?", (overview["total_value"], id))
+    db.commit()
+
+    return jsonify({"portfolio": portfolio_data["portfolio"], "overview": overview})
+
+
+def build_overview(strategy, equity_value):
+    starting_cash = float(strategy["starting_cash"])
+    current_cash = float(strategy["current_cash"])
 
     total_value = equity_value + current_cash
     overall_return = (
@@ -105,49 +119,158 @@ def display_portfolio(id):
     cash_contribution = current_cash / total_value if total_value else 0
     equity_contribution = equity_value / total_value if total_value else 0
 
-    # Update cached total value
-    db.execute("UPDATE strategy SET total_value = ? WHERE id = ?", (total_value, id))
-    db.commit()
-    close_db()
+    return {
+        "starting_cash": starting_cash,
+        "current_cash": current_cash,
+        "cash_contribution": cash_contribution,
+        "equity_value": equity_value,
+        "equity_contribution": equity_contribution,
+        "total_value": total_value,
+        "overall_return": overall_return,
+    }
 
-    return jsonify(
-        {
-            "portfolio": portfolio,
-            "overview": {
-                "starting_cash": starting_cash,
-                "current_cash": current_cash,
-                "cash_contribution": cash_contribution,
-                "equity_value": equity_value,
-                "equity_contribution": equity_contribution,
-                "total_value": total_value,
-                "overall_return": overall_return,
-            },
-        }
+
+# =====================================================
+# Live Portfolio Stream (SSE)
+# =====================================================
+@bp.route("/api/portfolio/<int:id>/stream", methods=["GET"])
+def stream_portfolio(id):
+    """Push a snapshot, then per-tick deltas of the positions whose price moved."""
+    db = get_db()
+    if not db.execute("SELECT id FROM strategy WHERE id = ?", (id,)).fetchone():
+        abort(404, description="Strategy not found.")
+
+    response = Response(portfolio_events(id), mimetype="text/event-stream")
+    response.headers["X-Accel-Buffering"] = "no"  # don't let nginx buffer the stream
+    return response
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def read_state(id):
+    # Own pooled connection: events are produced after the request's teardown
+    with db_connection() as db:
+        strategy = db.execute(
+            "SELECT starting_cash, current_cash FROM strategy WHERE id = ?", (id,)
+        ).fetchone()
+        holdings = load_holdings(db, id) if strategy else {}
+    signature = strategy and (
+        tuple(strategy),
+        tuple((t, shares, tuple(row)) for t, (shares, row) in holdings.items()),
     )
+    return strategy, holdings, signature
+
+
+def portfolio_events(id, heartbeat=LIVE_HEARTBEAT_SECONDS):
+    """Generator of SSE frames for one client, fed by the shared POLLER.
+
+    Prices come from the poller's single batch per interval, so any number of
+    open streams cost one upstream fetch per ticker. Holdings and cash are
+    re-read (one indexed query) every interval; a trade triggers a fresh snapshot.
+    """
+    strategy, holdings, signature = read_state(id)
+    if not strategy:  # deleted between the route's check and the first frame
+        yield sse("deleted", {"id": id})
+        return
+    subscription = POLLER.subscribe(holdings)
+    try:
+        quotes = lookup_many(holdings)  # usually served by the quote cache the poller keeps warm
+        valued = value_holdings(holdings, quotes)
+        yield "retry: 5000\n" + sse("snapshot", {"portfolio": valued["portfolio"], "overview": build_overview(strategy, valued["equity_value"])})
+
+        sent = time.monotonic()
+        while True:
+            # Wake at least once per refresh interval so trades show up without a price move
+            changed = subscription.next(POLLER.interval)
+            strategy, holdings, current = read_state(id)
+            if not strategy:
+                yield sse("deleted", {"id": id})
+                return
+
+            if current != signature:
+                # Trade or cash movement: resubscribe to the new tickers and resend everything
+                signature = current
+                POLLER.update(subscription, holdings)
+                quotes = {**lookup_many(holdings), **POLLER.latest(holdings)}
+                valued = value_holdings(holdings, quotes)
+                yield sse("snapshot", {"portfolio": valued["portfolio"], "overview": build_overview(strategy, valued["equity_value"])})
+                sent = time.monotonic()
+                continue
+
+            if changed is None:
+                if time.monotonic() - sent >= heartbeat:
+                    yield ": keepalive\n\n"
+                    sent = time.monotonic()
+                continue
+
+            # Only prices this client hasn't been sent yet
+            latest = POLLER.latest(changed)
+            changed = {t for t, q in latest.items() if q["price"] != (quotes.get(t) or {}).get("price")}
+            if not changed:
+                continue
+            quotes.update(latest)
+            valued = value_holdings(holdings, quotes)
+            yield sse("delta", {
+                "positions": [
+                    {key: stock[key] for key in ("ticker", "price", "share_value", "stock_return")}
+                    for stock in valued["portfolio"] if stock["ticker"] in changed
+                ],
+                "weights": {stock["ticker"]: stock["portfolio_contribution"] for stock in valued["portfolio"]},
+                "overview": build_overview(strategy, valued["equity_value"]),
+            })
+            sent = time.monotonic()
+    finally:
+        POLLER.unsubscribe(subscription)
 
 
 # =====================================================
 # Helper: Portfolio Metrics
 # =====================================================
 def get_portfolio_metrics(db, id):
-    portfolio = []
-    equity_value = 0.0
+    holdings = load_holdings(db, id)
+    if not holdings:
+        return {"portfolio": [], "equity_value": 0.0}
+
+    # Quote every holding in one batch so latency tracks the slowest ticker
+    return value_holdings(holdings, lookup_many(holdings))
+
 
+def load_holdings(db, id):
+    """{ticker: (shares, row)} with running totals: one indexed read, O(positions)."""
     stocks = db.execute(
-        "SELECT ticker, shares FROM portfolio WHERE strategy_id = ?", (id,)
+        """
+        SELECT p.ticker, p.shares,
+               COALESCE(t.total_bought, 0) AS total_bought,
+               COALESCE(t.total_sold, 0) AS total_sold,
+               COALESCE(t.cost_basis, 0) AS cost_basis,
+               COALESCE(t.realized_pnl, 0) AS realized_pnl
+        FROM portfolio p
+        LEFT JOIN position_totals t
+            ON t.strategy_id = p.strategy_id AND t.ticker = p.ticker
+        WHERE p.strategy_id = ?
+        """,
+        (id,),
     ).fetchall()
 
-    if not stocks:
-        return {"portfolio": [], "equity_value": 0.0}
-
+    holdings = {}
     for stock in stocks:
         ticker = stock["ticker"].strip().upper()
         shares = float(stock["shares"])
         if shares <= 0:
             continue  # ignore invalid or stale entries
+        holdings[ticker] = (shares, stock)
+    return holdings
+
+
+def value_holdings(holdings, quotes):
+    portfolio = []
+    equity_value = 0.0
 
-        quote = lookup(ticker)
-        if not quote or "price" not in quote:
+    for ticker, (shares, stock) in holdings.items():
+        quote = quotes.get(ticker)
+        if not quote or quote.get("price") is None:
             continue  # skip unavailable tickers instead of aborting entire portfolio
 
         price = float(quote["price"])
@@ -155,18 +278,7 @@ def get_portfolio_metrics(db, id):
         equity_value += share_value
 
         # Weighted purchase price
-        buys = db.execute(
-            "SELECT price, shares FROM transactions WHERE strategy_id = ? AND ticker = ? AND type = 'buy'",
-            (id, ticker),
-        ).fetchall()
-        sells = db.execute(
-            "SELECT price, shares FROM transactions WHERE strategy_id = ? AND ticker = ? AND type = 'sell'",
-            (id, ticker),
-        ).fetchall()
-
-        total_buys = sum(b["price"] * b["shares"] for b in buys)
-        total_sells = sum(s["price"] * s["shares"] for s in sells)
-        net_spent = total_buys - total_sells
+        net_spent = float(stock["total_bought"]) - float(stock["total_sold"])
         weighted_price = net_spent / shares if shares else 0
 
         stock_return = (
@@ -183,6 +295,8 @@ def get_portfolio_metrics(db, id):
             "weighted_price": weighted_price,
             "portfolio_contribution": 0,  # to be calculated later
             "stock_return": stock_return,
+            "cost_basis": float(stock["cost_basis"]),
+            "realized_pnl": float(stock["realized_pnl"]),
             })
     
     for stock in portfolio:
@@ -192,6 +306,46 @@ def get_portfolio_metrics(db, id):
     return {"portfolio": portfolio, "equity_value": equity_value}
 
 
+# =====================================================
+# Tax Lots
+# =====================================================
+@bp.route("/api/portfolio/<int:id>/lots", methods=["GET"])
+def display_lots(id):
+    db = get_db()
+    if not db.execute("SELECT id FROM strategy WHERE id = ?", (id,)).fetchone():
+        abort(404, description="Strategy not found.")
+
+    tickers = [
+        row["ticker"]
+        for row in db.execute(
+            "SELECT DISTINCT ticker FROM lots WHERE strategy_id = ? AND remaining > 0", (id,)
+        ).fetchall()
+    ]
+    quotes = lookup_many(tickers)
+    prices = {t: q["price"] for t, q in quotes.items() if q.get("price") is not None}
+    lots = lot_report(db, id, prices)
+
+    return jsonify({
+        "lots": lots,
+        "realized_pnl": sum(lot["realized_pnl"] for lot in lots),
+        "unrealized_pnl": sum(lot["unrealized_pnl"] or 0 for lot in lots),
+    })
+
+
+# =====================================================
+# Quote Cache Stats
+# =====================================================
+@bp.route("/api/cache-stats", methods=["GET"])
+def cache_stats():
+    return jsonify({
+        "quotes": QUOTES.stats(),
+        "fx": FX_RATES.stats(),
+        "live": POLLER.stats(),
+        "in_flight": {name: flight.stats() for name, flight in INFLIGHT.items()},
+        "covariance": COVARIANCE.stats(),
+    })
+
+
 # =====================================================
 # Rename Strategy
 # =====================================================
@@ -211,8 +365,6 @@ def rename_strategy(id):
         return jsonify({"status": "success"})
     except IntegrityError:
         abort(400, description="A strategy with that name already exists.")
-    finally:
-        close_db()
 
 
 # =====================================================
@@ -221,17 +373,21 @@ def rename_strategy(id):
 @bp.route("/api/delete-strategy/<int:id>", methods=["DELETE"])
 def delete_strategy(id):
     db = get_db()
-    try:
-        # Verify existence before deletion
-        row = db.execute("SELECT id FROM strategy WHERE id = ?", (id,)).fetchone()
-        if not row:
-            abort(404, description="Strategy not found.")
+    # Verify existence before deletion
+    row = db.execute("SELECT id FROM strategy WHERE id = ?", (id,)).fetchone()
+    if not row:
+        abort(404, description="Strategy not found.")
 
-        db.execute("DELETE FROM portfolio WHERE strategy_id = ?", (id,))
-        db.execute("DELETE FROM transactions WHERE strategy_id = ?", (id,))
-        db.execute("DELETE FROM strategy WHERE id = ?", (id,))
-        db.commit()
+    db.execute("DELETE FROM portfolio WHERE strategy_id = ?", (id,))
+    db.execute("DELETE FROM position_totals WHERE strategy_id = ?", (id,))
+    db.execute(
+        "DELETE FROM lot_closures WHERE lot_id IN (SELECT id FROM lots WHERE strategy_id = ?)", (id,)
+    )
+    db.execute("DELETE FROM lots WHERE strategy_id = ?", (id,))
+    db.execute("DELETE FROM equity_snapshots WHERE strategy_id = ?", (id,))
+    db.execute("DELETE FROM return_index WHERE strategy_id = ?", (id,))
+    db.execute("DELETE FROM transactions WHERE strategy_id = ?", (id,))
+    db.execute("DELETE FROM strategy WHERE id = ?", (id,))
+    db.commit()
 
-        return jsonify({"status": "deleted"})
-    finally:
-        close_db()
+    return jsonify({"status": "deleted"})
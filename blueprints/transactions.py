@@ -1,9 +1,16 @@
-from datetime import datetime
-from flask import request, session, abort, jsonify
+import io
+import sqlite3
+import time
+from flask import Response, request, session, abort, jsonify
 
 # Custom modules
-from helpers.setup import get_db, close_db, create_blueprint
-from helpers.api import lookup
+from helpers.setup import get_db, create_blueprint
+from helpers.api import lookup, lookup_many
+from helpers.lots import LotError, LOT_METHODS
+from helpers.importer import import_transactions, CsvImportError
+from helpers import history
+from helpers import rebalance
+from helpers import trading
 
 bp = create_blueprint("transactions")
 
@@ -19,22 +26,53 @@ def select_strategy():
         abort(400, description="Missing strategy ID.")
 
     db = get_db()
+    row = db.execute(
+        "SELECT current_cash FROM strategy WHERE id = ?", (strategy_id,)
+    ).fetchone()
+    if not row:
+        abort(404, description="Strategy not found.")
+
+    # Only the id lives in the session; cash is always read from the database
+    session["strategy_id"] = int(strategy_id)
+    session.pop("current_cash", None)
+
+    return jsonify(
+        {"status": "success", "strategy_id": int(strategy_id), "cash": float(row["current_cash"])}
+    ), 200
+
+
+# =====================================================
+# Helper: Execute Order
+# =====================================================
+def execute(order, *args, **kwargs):
+    """Run a helpers.trading entry point, mapping rejections to HTTP errors."""
     try:
-        row = db.execute(
-            "SELECT current_cash FROM strategy WHERE id = ?", (strategy_id,)
-        ).fetchone()
-        if not row:
-            abort(404, description="Strategy not found.")
+        return order(get_db(), *args, **kwargs)
+    except trading.BatchRejected:
+        raise  # carries per-order results for the caller
+    except (trading.TradeError, LotError, CsvImportError, rebalance.RebalanceError) as e:
+        abort(400, description=str(e))
+    except sqlite3.OperationalError as e:
+        if trading.is_busy(e):
+            abort(503, description="Database busy, please retry.")
+        raise
+
+
+def active_strategy():
+    strategy_id = session.get("strategy_id")
+    if not strategy_id:
+        abort(400, description="No active strategy.")
+    return strategy_id
 
-        current_cash = float(row["current_cash"])
-        session["strategy_id"] = int(strategy_id)
-        session["current_cash"] = current_cash
 
-        return jsonify(
-            {"status": "success", "strategy_id": int(strategy_id), "cash": current_cash}
-        ), 200
-    finally:
-        close_db()
+def requested_strategy(strategy_id):
+    """Strategy ID given in the request body, or the active one when omitted."""
+    if strategy_id is None or strategy_id == "":
+        return active_strategy()
+    try:
+        return int(strategy_id)
+    except (TypeError, ValueError):
+        abort(400, description="Invalid strategy ID.")
 
 
 # =====================================================
@@ -43,9 +81,7 @@ def select_strategy():
 @bp.route("/transactions/api/deposit", methods=["POST"])
 def deposit():
     """Deposit funds into the current strategy."""
-    strategy_id = session.get("strategy_id")
-    if not strategy_id:
-        abort(400, description="No active strategy.")
+    strategy_id = active_strategy()
 
     data = request.get_json(silent=True) or {}
     amount = data.get("amount")
@@ -57,31 +93,8 @@ def deposit():
     except (TypeError, ValueError):
         abort(400, description="Invalid deposit amount.")
 
-    db = get_db()
-    try:
-        current_cash = session.get("current_cash", 0.0)
-        new_cash = current_cash + amount
-
-        db.execute(
-            "UPDATE strategy SET current_cash = ? WHERE id = ?", (new_cash, strategy_id)
-        )
-        db.execute(
-            """
-            INSERT INTO transactions (strategy_id, type, ticker, shares, price, date)
-            VALUES (?, ?, NULL, NULL, ?, ?)
-            """,
-            (
-                strategy_id,
-                "deposit",
-                amount,
-                datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            ),
-        )
-        db.commit()
-        session["current_cash"] = new_cash
-        return jsonify({"status": "success", "new_cash": new_cash}), 200
-    finally:
-        close_db()
+    result = execute(trading.deposit, strategy_id, amount)
+    return jsonify({"status": "success", "new_cash": result["new_cash"]}), 200
 
 
 # =====================================================
@@ -90,10 +103,7 @@ def deposit():
 @bp.route("/transactions/api/withdraw", methods=["POST"])
 def withdraw():
     """Withdraw funds from the current strategy."""
-    strategy_id = session.get("strategy_id")
-    current_cash = session.get("current_cash")
-    if not strategy_id or current_cash is None:
-        abort(400, description="No active strategy.")
+    strategy_id = active_strategy()
 
     data = request.get_json(silent=True) or {}
     amount = data.get("amount")
@@ -102,35 +112,11 @@ def withdraw():
         amount = float(amount) # type: ignore
         if amount <= 0:
             abort(400, description="Withdraw amount must be positive.")
-        if amount > current_cash:
-            abort(400, description="Insufficient cash balance.")
     except (TypeError, ValueError):
         abort(400, description="Invalid withdraw amount.")
 
-    db = get_db()
-    try:
-        new_cash = current_cash - amount
-
-        db.execute(
-            "UPDATE strategy SET current_cash = ? WHERE id = ?", (new_cash, strategy_id)
-        )
-        db.execute(
-            """
-            INSERT INTO transactions (strategy_id, type, ticker, shares, price, date)
-            VALUES (?, ?, NULL, NULL, ?, ?)
-            """,
-            (
-                strategy_id,
-                "withdraw",
-                amount,
-                datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            ),
-        )
-        db.commit()
-        session["current_cash"] = new_cash
-        return jsonify({"status": "success", "new_cash": new_cash}), 200
-    finally:
-        close_db()
+    result = execute(trading.withdraw, strategy_id, amount)
+    return jsonify({"status": "success", "new_cash": result["new_cash"]}), 200
 
 
 # =====================================================
@@ -176,21 +162,15 @@ def get_quote():
 
 
 # =====================================================
-# Buy Stocks
+# Helper: Trade Parameters
 # =====================================================
-@bp.route("/transactions/api/buy", methods=["POST"])
-def buy():
-    """Buy shares of a stock for the active strategy."""
-    strategy_id = session.get("strategy_id")
-    current_cash = session.get("current_cash")
-    if not strategy_id or current_cash is None:
-        abort(400, description="No active strategy.")
-
-    data = request.get_json(silent=True) or {}
+def trade_parameters(data):
     ticker = (data.get("ticker") or "").strip().upper()
     shares = data.get("shares")
     price = data.get("price")
 
+    if not ticker:
+        abort(400, description="Missing ticker symbol.")
     try:
         shares = float(shares) # type: ignore
         price = float(price) # type: ignore
@@ -199,54 +179,44 @@ def buy():
     except (TypeError, ValueError):
         abort(400, description="Invalid trade parameters.")
 
-    cost = price * shares
-    if cost > current_cash:
-        abort(400, description="Insufficient cash balance.")
+    return ticker, shares, price
 
-    db = get_db()
+
+def lot_parameters(data):
+    method = (data.get("lot_method") or "fifo").strip().lower()
+    lot_ids = data.get("lot_ids") or []
+
+    if method not in LOT_METHODS:
+        abort(400, description=f"Lot method must be one of: {', '.join(LOT_METHODS)}.")
     try:
-        existing = db.execute(
-            "SELECT shares FROM portfolio WHERE strategy_id = ? AND ticker = ?",
-            (strategy_id, ticker),
-        ).fetchone()
-
-        if existing:
-            db.execute(
-                "UPDATE portfolio SET shares = shares + ? WHERE strategy_id = ? AND ticker = ?",
-                (shares, strategy_id, ticker),
-            )
-        else:
-            db.execute(
-                "INSERT INTO portfolio (strategy_id, ticker, shares) VALUES (?, ?, ?)",
-                (strategy_id, ticker, shares),
-            )
-
-        new_cash = current_cash - cost
-        db.execute(
-            """
-            INSERT INTO transactions (strategy_id, type, ticker, shares, price, date)
-            VALUES (?, ?, ?, ?, ?, ?)
-            """,
-            (
-                strategy_id,
-                "buy",
-                ticker,
-                shares,
-                price,
-                datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            ),
-        )
-        db.execute(
-            "UPDATE strategy SET current_cash = ? WHERE id = ?", (new_cash, strategy_id)
-        )
-        db.commit()
-
-        session["current_cash"] = new_cash
-        return jsonify(
-            {"status": "success", "ticker": ticker, "shares": shares, "cost": cost}
-        ), 200
-    finally:
-        close_db()
+        lot_ids = [int(lot_id) for lot_id in lot_ids]
+    except (TypeError, ValueError):
+        abort(400, description="Invalid lot IDs.")
+
+    return method, lot_ids
+
+
+# =====================================================
+# Buy Stocks
+# =====================================================
+@bp.route("/transactions/api/buy", methods=["POST"])
+def buy():
+    """Buy shares of a stock for the active strategy."""
+    strategy_id = active_strategy()
+    data = request.get_json(silent=True) or {}
+    ticker, shares, price = trade_parameters(data)
+
+    result = execute(trading.buy, strategy_id, ticker, shares, price)
+    return jsonify(
+        {
+            "status": "success",
+            "ticker": ticker,
+            "shares": shares,
+            "cost": result["cost"],
+            "lot_id": result["lot_id"],
+            "new_cash": result["new_cash"],
+        }
+    ), 200
 
 
 # =====================================================
@@ -255,76 +225,212 @@ def buy():
 @bp.route("/transactions/api/sell", methods=["POST"])
 def sell():
     """Sell shares of a stock for the active strategy."""
-    strategy_id = session.get("strategy_id")
-    current_cash = session.get("current_cash")
-    if not strategy_id or current_cash is None:
-        abort(400, description="No active strategy.")
-
+    strategy_id = active_strategy()
     data = request.get_json(silent=True) or {}
-    ticker = (data.get("ticker") or "").strip().upper()
-    shares = data.get("shares")
-    price = data.get("price")
+    ticker, shares, price = trade_parameters(data)
+    method, lot_ids = lot_parameters(data)
+
+    result = execute(trading.sell, strategy_id, ticker, shares, price, lot_method=method, lot_ids=lot_ids)
+    return jsonify(
+        {
+            "status": "success",
+            "ticker": ticker,
+            "shares": shares,
+            "revenue": result["revenue"],
+            "lots": result["lots"],
+            "new_cash": result["new_cash"],
+        }
+    ), 200
+
+
+# =====================================================
+# Batch Orders
+# =====================================================
+MAX_BATCH_ORDERS = 500
+
+
+def parse_order(item):
+    """Validate one batch entry; price is optional (None means use the live quote)."""
+    if not isinstance(item, dict):
+        raise ValueError("Order must be an object.")
+
+    side = (item.get("side") or "").strip().lower()
+    if side not in ("buy", "sell"):
+        raise ValueError("Side must be 'buy' or 'sell'.")
+    ticker = (item.get("ticker") or "").strip().upper()
+    if not ticker:
+        raise ValueError("Missing ticker symbol.")
 
     try:
-        shares = float(shares) # type: ignore
-        price = float(price) # type: ignore
-        if shares <= 0 or price <= 0:
-            abort(400, description="Shares and price must be positive.")
+        shares = float(item.get("shares"))  # type: ignore
+        price = item.get("price")
+        price = float(price) if price is not None else None
     except (TypeError, ValueError):
-        abort(400, description="Invalid trade parameters.")
+        raise ValueError("Invalid trade parameters.")
+    if shares <= 0 or (price is not None and price <= 0):
+        raise ValueError("Shares and price must be positive.")
 
-    db = get_db()
+    method = (item.get("lot_method") or "fifo").strip().lower()
+    if method not in LOT_METHODS:
+        raise ValueError(f"Lot method must be one of: {', '.join(LOT_METHODS)}.")
     try:
-        row = db.execute(
-            "SELECT shares FROM portfolio WHERE strategy_id = ? AND ticker = ?",
-            (strategy_id, ticker),
-        ).fetchone()
-        existing_shares = float(row["shares"]) if row else 0.0
-
-        if existing_shares < shares:
-            abort(400, description="Insufficient shares to sell.")
-
-        revenue = price * shares
-        new_cash = current_cash + revenue
-
-        if existing_shares == shares:
-            db.execute(
-                "DELETE FROM portfolio WHERE strategy_id = ? AND ticker = ?",
-                (strategy_id, ticker),
-            )
+        lot_ids = [int(lot_id) for lot_id in item.get("lot_ids") or []]
+    except (TypeError, ValueError):
+        raise ValueError("Invalid lot IDs.")
+
+    return {"side": side, "ticker": ticker, "shares": shares, "price": price, "lot_method": method, "lot_ids": lot_ids}
+
+
+def batch_response(start, results, status_code, **extra):
+    failed = status_code != 200
+    body = {
+        "status": "fail" if failed else "success",
+        "executed": not failed,
+        "results": results,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+        **extra,
+    }
+    if failed:
+        body.setdefault("message", "One or more orders were rejected; no orders were executed.")
+    return jsonify(body), status_code
+
+
+@bp.route("/transactions/api/orders", methods=["POST"])
+def batch_orders():
+    """Quote, validate and execute many buys/sells for one strategy with a single commit."""
+    start = time.perf_counter()
+    data = request.get_json(silent=True) or {}
+    strategy_id = requested_strategy(data.get("strategy_id"))
+    items = data.get("orders")
+    all_or_nothing = data.get("all_or_nothing", True) is not False
+
+    if not isinstance(items, list) or not items:
+        abort(400, description="Missing orders.")
+    if len(items) > MAX_BATCH_ORDERS:
+        abort(400, description=f"At most {MAX_BATCH_ORDERS} orders per batch.")
+
+    # Validate every order before touching the database
+    orders = []
+    invalid = []
+    for index, item in enumerate(items):
+        try:
+            orders.append(parse_order(item))
+        except ValueError as e:
+            invalid.append({"index": index, "status": "invalid", "message": str(e)})
+    if invalid:
+        return batch_response(start, invalid, 400)
+
+    # Quote every ticker without an explicit price in one batch
+    quotes = lookup_many(o["ticker"] for o in orders if o["price"] is None)
+    for index, order in enumerate(orders):
+        if order["price"] is not None:
+            continue
+        quote = quotes.get(order["ticker"]) or {}
+        if quote.get("price") is None:
+            invalid.append({"index": index, "status": "invalid", "message": f"Failed to fetch quote for {order['ticker']}."})
         else:
-            db.execute(
-                "UPDATE portfolio SET shares = shares - ? WHERE strategy_id = ? AND ticker = ?",
-                (shares, strategy_id, ticker),
-            )
-
-        db.execute(
-            """
-            INSERT INTO transactions (strategy_id, type, ticker, shares, price, date)
-            VALUES (?, ?, ?, ?, ?, ?)
-            """,
-            (
-                strategy_id,
-                "sell",
-                ticker,
-                shares,
-                price,
-                datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            ),
-        )
-        db.execute(
-            "UPDATE strategy SET current_cash = ? WHERE id = ?", (new_cash, strategy_id)
-        )
-        db.commit()
-
-        session["current_cash"] = new_cash
-        return jsonify(
-            {
-                "status": "success",
-                "ticker": ticker,
-                "shares": shares,
-                "revenue": revenue,
-            }
-        ), 200
-    finally:
-        close_db()
+            order["price"] = float(quote["price"])
+    if invalid:
+        return batch_response(start, invalid, 502)
+
+    try:
+        result = execute(trading.execute_orders, strategy_id, orders, all_or_nothing)
+    except trading.BatchRejected as e:
+        return batch_response(start, e.results, 400)
+
+    return batch_response(start, result["results"], 200, new_cash=result["new_cash"])
+
+
+# =====================================================
+# Rebalance To Target Weights
+# =====================================================
+@bp.route("/transactions/api/rebalance", methods=["POST"])
+def rebalance_strategies():
+    """Plan (and with execute=true, atomically place) the orders that move strategies to target weights.
+
+    JSON: {"targets": {"<strategy_id>": {"AAPL": 0.5, ...}}, "tolerance": 0.02,
+    "whole_shares": true, "min_trade_value": 0, "execute": false}
+    """
+    start = time.perf_counter()
+    data = request.get_json(silent=True) or {}
+    try:
+        targets = rebalance.parse_targets(data.get("targets"))
+        options = {
+            "tolerance": float(data.get("tolerance", 0.0)),
+            "whole_shares": bool(data.get("whole_shares", False)),
+            "min_trade_value": float(data.get("min_trade_value", 0.0)),
+        }
+    except (TypeError, ValueError) as e:
+        abort(400, description=str(e))
+
+    # One quote batch for every ticker any strategy holds or targets
+    tickers = execute(rebalance.needed_tickers, targets)
+    quotes = lookup_many(tickers)
+    prices = {t: (quotes.get(t) or {}).get("price") for t in tickers}
+    missing = [t for t, price in prices.items() if price is None]
+    if missing:
+        abort(502, description=f"Failed to fetch quote for {', '.join(missing)}.")
+
+    if not data.get("execute"):
+        plans = execute(rebalance.plan_rebalance, targets, prices, **options)
+    else:
+        try:
+            plans = execute(rebalance.execute_rebalance, targets, prices, **options)
+        except trading.BatchRejected as e:
+            return batch_response(start, e.results, 400)
+
+    return jsonify({
+        "status": "success",
+        "executed": bool(data.get("execute")),
+        "orders": sum(len(plan["orders"]) for plan in plans),
+        "strategies": plans,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+    })
+
+
+# =====================================================
+# Bulk CSV Import
+# =====================================================
+@bp.route("/transactions/api/import", methods=["POST"])
+def import_csv():
+    """Stream an uploaded CSV of historical transactions into a strategy's ledger."""
+    upload = request.files.get("file")
+    if not upload:
+        abort(400, description="Missing CSV file.")
+    strategy_id = requested_strategy(request.form.get("strategy_id"))
+
+    # Decode the upload lazily so the whole file is never held in memory
+    lines = io.TextIOWrapper(upload.stream, encoding="utf-8-sig", newline="")
+    return jsonify(execute(import_transactions, strategy_id, lines))
+
+
+# =====================================================
+# Transaction History
+# =====================================================
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+@bp.route("/transactions/api/history/<int:id>", methods=["GET"])
+def transaction_history(id):
+    """Page through a strategy's ledger by cursor, or stream all of it as NDJSON/CSV."""
+    db = get_db()
+    if not db.execute("SELECT id FROM strategy WHERE id = ?", (id,)).fetchone():
+        abort(404, description="Strategy not found.")
+
+    try:
+        filters = history.parse_filters(request.args)
+        export = request.args.get("format", "json").lower()
+        if export in EXPORT_FORMATS:
+            stream = history.stream_csv if export == "csv" else history.stream_ndjson
+            response = Response(stream(id, filters), mimetype=EXPORT_FORMATS[export])
+            response.headers["Content-Disposition"] = f"attachment; filename=strategy-{id}-transactions.{export}"
+            return response
+        if export != "json":
+            abort(400, description="Format must be json, ndjson or csv.")
+
+        limit = request.args.get("limit", history.PAGE_SIZE, type=int)
+        if not 1 <= limit <= history.MAX_PAGE_SIZE:
+            abort(400, description=f"Limit must be between 1 and {history.MAX_PAGE_SIZE}.")
+        return jsonify(history.history_page(db, id, filters, request.args.get("cursor"), limit))
+    except history.HistoryError as e:
+        abort(400, description=str(e))
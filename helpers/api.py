@@ -1,7 +1,12 @@
-import yfinance as yf
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from pytz import timezone
 
+# Custom modules
+from helpers.cache import FxRateCache, QuoteCache, SingleFlight
+from helpers.metadata import load_metadata, save_metadata, held_tickers
+from helpers.providers import provider_from_env
+
 EXCHANGES = {
     # 🇺🇸 United States
     "NYSE":   {"currency": "USD", "timezone": "America/New_York", "open": "09:30", "close": "16:00"},
@@ -130,28 +135,99 @@ EXCHANGE_ALIASES = {
 }
 
 
-CACHE = {}  # {"ticker": {"price": float, "time": datetime}}
+LOOKUP_MAX_WORKERS = 8  # Upper bound on concurrent quote requests
+FX_TTL_SECONDS = 300  # Refresh window for cached exchange rates
+QUOTE_CACHE_SIZE = 2048  # Most tickers held in the quote cache before LRU eviction
+QUOTE_TTL_OPEN = 15  # Seconds a live price is reused while its market is open
+
+QUOTES = QuoteCache(maxsize=QUOTE_CACHE_SIZE)  # {"ticker": local-currency price}
+
+# Concurrent callers for the same ticker/pair share one in-flight upstream call
+INFLIGHT = {"info": SingleFlight(), "prices": SingleFlight(), "fx": SingleFlight()}
+
+
+# =====================================================
+# Quote Provider
+# =====================================================
+PROVIDER = provider_from_env()  # QUOTE_PROVIDER selects yfinance, fixture replay or recording
+
+
+def get_provider():
+    """Active upstream data source (see helpers/providers.py)."""
+    return PROVIDER
+
+
+def set_provider(provider):
+    """Swap the upstream data source and drop prices cached from the old one."""
+    global PROVIDER
+    PROVIDER = provider
+    QUOTES.clear()
+    FX_RATES.clear()
+
+
+# =====================================================
+# Bulk Prices
+# =====================================================
+def fetch_prices(tickers):
+    """Latest and previous close for many tickers; returns {ticker: {"price", "previous_close"}}."""
+    prices = {}
+    try:
+        closes_by_ticker = INFLIGHT["prices"].do_many(tickers, lambda symbols: get_provider().closes(symbols))
+        for ticker, closes in closes_by_ticker.items():
+            if not closes:
+                continue
+            prices[ticker] = {
+                "price": float(closes[-1]),
+                "previous_close": float(closes[-2]) if len(closes) > 1 else None,
+            }
+    except Exception as e:
+        print(f"[price error] {', '.join(tickers)}: {e}")
+    return prices
+
 
 # =====================================================
 # Exchange Rate
 # =====================================================
+def fetch_exchange_rates(currencies):
+    """Fetch USD rates for several currencies with one bulk download."""
+    pairs = {f"USD{currency}=X": currency for currency in currencies}
+    rates = {}
+
+    try:
+        for pair, closes in get_provider().closes(list(pairs)).items():
+            rates[pairs[pair]] = float(closes[-1])
+    except Exception as e:
+        print(f"[fx error] {', '.join(pairs)}: {e}")
+
+    # Fall back to a per-pair quote for anything the bulk download missed
+    for pair, currency in pairs.items():
+        if rates.get(currency):
+            continue
+        try:
+            data = get_provider().info(pair)
+            rate = data.get("regularMarketPrice") or data.get("previousClose")
+            rates[currency] = float(rate) if rate else None
+        except Exception:
+            rates[currency] = None
+
+    return rates
+
+
+FX_RATES = FxRateCache(
+    lambda currencies: INFLIGHT["fx"].do_many(currencies, fetch_exchange_rates), ttl=FX_TTL_SECONDS
+)
+
+
+def get_exchange_rates(currencies):
+    """Return {currency: USD rate}, sharing cached pairs across callers."""
+    return FX_RATES.get_many(currencies)
+
+
 def get_exchange_rate(exchange: str):
     info = EXCHANGES.get(exchange)
     if not info:
         return None
-
-    currency = info["currency"]
-    if currency == "USD":
-        return 1.0
-
-    pair = f"USD{currency}=X"
-    try:
-        data = yf.Ticker(pair).info
-        rate = data.get("regularMarketPrice") or data.get("previousClose")
-        rate = float(rate) if rate else None
-        return rate if rate else None
-    except Exception:
-        return None
+    return FX_RATES.get(info["currency"])
 
 
 # =====================================================
@@ -165,15 +241,120 @@ def check_market_status(exchange: str):
     country_close = EXCHANGES[exchange]["close"]
     open_t = datetime.strptime(country_open, "%H:%M").time()
     close_t = datetime.strptime(country_close, "%H:%M").time()
-
+    weekday = now.weekday() < 5  # holidays are not modelled yet
 
     return {
-        "market_open": (open_t <= now.time() <= close_t),
+        "market_open": weekday and (open_t <= now.time() <= close_t),
         "time_now": now,
         "date_now": now.date(),
     }
 
 
+def next_market_open(exchange: str, now=None):
+    """Next weekday session open for an exchange, as an aware datetime."""
+    tz = timezone(EXCHANGES[exchange]["timezone"])
+    now = now or datetime.now(tz)
+    open_t = datetime.strptime(EXCHANGES[exchange]["open"], "%H:%M").time()
+
+    day = now.date()
+    candidate = tz.localize(datetime.combine(day, open_t))
+    while candidate <= now or candidate.weekday() >= 5:
+        day += timedelta(days=1)
+        candidate = tz.localize(datetime.combine(day, open_t))
+    return candidate
+
+
+def quote_ttl(exchange: str, status=None):
+    """Seconds a price stays valid: briefly while trading, until the next open otherwise."""
+    status = status or check_market_status(exchange)
+    if status["market_open"]:
+        return QUOTE_TTL_OPEN
+    return (next_market_open(exchange, status["time_now"]) - status["time_now"]).total_seconds()
+
+
+# =====================================================
+# Ticker Metadata
+# =====================================================
+def resolve_exchange(info):
+    """Map a yfinance .info blob to (exchange, raw exchange code)."""
+    exchange_code = info.get("exchange") or info.get("Exchange") or "N/A"
+    return EXCHANGE_ALIASES.get(exchange_code, exchange_code), exchange_code
+
+
+def fetch_ticker_info(ticker):
+    """Full .info fetch; stores the ticker's exchange and currency for later lookups."""
+    def fetch():
+        info = get_provider().info(ticker) or {}
+        exchange, _ = resolve_exchange(info)
+        if exchange in EXCHANGES:
+            save_metadata({ticker: {"exchange": exchange, "currency": EXCHANGES[exchange]["currency"]}})
+        return info
+
+    return INFLIGHT["info"].do(ticker, fetch)
+
+
+def preload_ticker_metadata(tickers=None):
+    """Resolve and store metadata for every held ticker that is missing or stale."""
+    tickers = tickers if tickers is not None else held_tickers()
+    known = load_metadata(tickers)
+    missing = [t for t in dict.fromkeys(tickers) if t not in known]
+
+    def fetch(ticker):
+        try:
+            fetch_ticker_info(ticker)
+        except Exception as e:
+            print(f"[metadata error] {ticker}: {e}")
+
+    if missing:
+        with ThreadPoolExecutor(max_workers=min(LOOKUP_MAX_WORKERS, len(missing))) as pool:
+            list(pool.map(fetch, missing))
+    return {"tickers": len(tickers), "fetched": len(missing)}
+
+
+def ticker_currencies(tickers):
+    """{ticker: trading currency} via each ticker's exchange in EXCHANGES (None if unknown)."""
+    tickers = list(dict.fromkeys(tickers))
+    known = load_metadata(tickers)
+    currencies = {t: known[t]["currency"] for t in known}
+    for ticker in tickers:
+        if ticker in currencies:
+            continue
+        try:
+            exchange, _ = resolve_exchange(fetch_ticker_info(ticker))
+            currencies[ticker] = EXCHANGES[exchange]["currency"] if exchange in EXCHANGES else None
+        except Exception as e:
+            print(f"[metadata error] {ticker}: {e}")
+            currencies[ticker] = None
+    return {t: currencies[t] for t in tickers}
+
+
+# =====================================================
+# Build Quote
+# =====================================================
+def select_price(ticker, exchange, live_price, previous_close):
+    """Pick the live or closing price by market state and cache it until it goes stale."""
+    status = check_market_status(exchange)
+    price = live_price if status["market_open"] else previous_close
+    if price:
+        QUOTES.set(ticker, float(price), quote_ttl(exchange, status))
+    return price
+
+
+def build_quote(ticker, exchange, price, rate):
+    """Convert a local-currency price to a USD quote."""
+    if not price:
+        return {"ticker": ticker, "price": None, "error": "Price not found"}
+
+    status = check_market_status(exchange)
+    price = round(float(price) / (rate or 1.0), 2)
+    return {
+        "ticker": ticker,
+        "price": price,
+        "date": str(status["date_now"]),
+        "time": str(status["time_now"].time())[:8],
+    }
+
+
 # =====================================================
 # Lookup Stock
 # =====================================================
@@ -183,47 +364,86 @@ def lookup(ticker: str):
         return {"ticker": ticker, "price": None, "error": "Invalid ticker"}
 
     try:
-        info = yf.Ticker(ticker).info or {}
-        exchange_code = info.get("exchange") or info.get("Exchange") or "N/A"
-        exchange = EXCHANGE_ALIASES.get(exchange_code, exchange_code)
+        # Known exchange: serve from cache, or a lightweight price fetch
+        meta = load_metadata([ticker]).get(ticker)
+        if meta:
+            price = QUOTES.get(ticker)
+            if price is None:
+                prices = fetch_prices([ticker]).get(ticker)
+                if prices:
+                    price = select_price(ticker, meta["exchange"], prices["price"], prices["previous_close"])
+            if price:
+                return build_quote(ticker, meta["exchange"], price, FX_RATES.get(meta["currency"]))
+
+        # Unknown ticker (or no recent prices): resolve the exchange from .info
+        info = fetch_ticker_info(ticker)
+        exchange, exchange_code = resolve_exchange(info)
 
         if exchange not in EXCHANGES:
             return {"ticker": ticker, "price": None, "error": f"Unknown exchange '{exchange_code}'"}
 
-        status = check_market_status(exchange)
         rate = get_exchange_rate(exchange)
-
-        if status["market_open"]:
-            price = info.get("regularMarketPrice")
-        else:
-            # Cached price
-            if ticker in CACHE:
-                price = CACHE[ticker]["price"]
-            else:
-                price = info.get("previousClose")
-                if price:
-                    CACHE[ticker] = {"price": price, "time": datetime.now()}
-
-        if not price:
-            return {"ticker": ticker, "price": None, "error": "Price not found"}
-
-        price = round(float(price) / (rate or 1.0), 2)
-        return {
-            "ticker": ticker,
-            "price": price,
-            "date": str(status["date_now"]),
-            "time": str(status["time_now"].time())[:8],
-        }
+        price = select_price(ticker, exchange, info.get("regularMarketPrice"), info.get("previousClose"))
+        return build_quote(ticker, exchange, price, rate)
 
     except Exception as e:
         print(f"[lookup error] {ticker}: {e}")
         return {"ticker": ticker, "price": None, "error": str(e)}
 
 
+# =====================================================
+# Lookup Many Stocks
+# =====================================================
+def lookup_many(tickers):
+    """Quote several tickers at once; returns {ticker: quote} in input order.
+
+    Tickers with stored metadata are served from the quote cache or share one
+    bulk price download and one FX fetch; the rest are resolved concurrently
+    on a bounded thread pool.
+    """
+    symbols = list(dict.fromkeys((t or "").strip().upper() for t in tickers))
+    symbols = [s for s in symbols if s]
+    if not symbols:
+        return {}
+
+    quotes = {}
+    metadata = load_metadata(symbols)
+    if metadata:
+        prices = {t: QUOTES.get(t) for t in metadata}
+        stale = [t for t, price in prices.items() if price is None]
+        if stale:
+            for ticker, fetched in fetch_prices(stale).items():
+                prices[ticker] = select_price(
+                    ticker, metadata[ticker]["exchange"], fetched["price"], fetched["previous_close"]
+                )
+
+        rates = get_exchange_rates({meta["currency"] for meta in metadata.values()})
+        for ticker, meta in metadata.items():
+            if not prices.get(ticker):
+                continue
+            try:
+                quotes[ticker] = build_quote(ticker, meta["exchange"], prices[ticker], rates.get(meta["currency"]))
+            except Exception as e:
+                print(f"[lookup error] {ticker}: {e}")
+
+    remaining = [s for s in symbols if s not in quotes]
+    if len(remaining) == 1:
+        quotes[remaining[0]] = lookup(remaining[0])
+    elif remaining:
+        workers = min(LOOKUP_MAX_WORKERS, len(remaining))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            quotes.update(zip(remaining, pool.map(lookup, remaining)))
+
+    return {s: quotes[s] for s in symbols}
+
+
 # =====================================================
 # Test
 # =====================================================
 if __name__ == "__main__":
     for symbol in ["AAPL", "MSFT", "MC.PA", "INVALID"]:
         print(symbol, "→", lookup(symbol))
-    print("\nCACHE:", CACHE)
+    print("\nBATCH:", lookup_many(["AAPL", "MSFT", "MC.PA"]))
+    print("\nQUOTES:", QUOTES.stats())
+    print("FX:", FX_RATES.stats())
+    print("IN FLIGHT:", {name: flight.stats() for name, flight in INFLIGHT.items()})
@@ -0,0 +1,203 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+TRADING_DAYS = 252
+REBALANCE_PERIODS = {  # Trading days between rebalances; None buys once and holds
+    "daily": 1,
+    "weekly": 5,
+    "monthly": 21,
+    "quarterly": 63,
+    "yearly": 252,
+    "never": None,
+}
+VARIATIONS_PER_TASK = 16  # Parameter sets simulated together in one worker call
+
+
+class BacktestError(ValueError):
+    """Rules or price data that cannot be simulated."""
+
+
+# =====================================================
+# Inputs
+# =====================================================
+def fill_prices(prices):
+    """Forward-fill gaps, and hold each ticker flat at its first price before it lists."""
+    prices = np.array(prices, dtype=float)
+    if prices.ndim != 2 or prices.shape[0] < 2:
+        raise BacktestError("Need a (days, tickers) price array with at least two days.")
+    missing = np.isnan(prices) | (prices <= 0)
+    if missing.all(axis=0).any():
+        raise BacktestError("Every ticker needs at least one price.")
+    if missing.any():
+        prices[missing] = np.nan
+        days = np.arange(prices.shape[0])[:, None]
+        last = np.maximum.accumulate(np.where(missing, -1, days), axis=0)
+        first = (~missing).argmax(axis=0)
+        prices = np.take_along_axis(prices, np.where(last < 0, first, last), axis=0)
+    return prices
+
+
+def rebalance_period(value):
+    if value in REBALANCE_PERIODS:
+        return REBALANCE_PERIODS[value]
+    try:
+        period = int(value)
+    except (TypeError, ValueError):
+        raise BacktestError(f"Rebalance must be one of {', '.join(REBALANCE_PERIODS)} or a number of days.")
+    if period < 1:
+        raise BacktestError("Rebalance period must be at least one day.")
+    return period
+
+
+def weight_vector(weights, tickers):
+    """Target weights as an array in ticker order; whatever is left over stays in cash."""
+    column = {ticker: i for i, ticker in enumerate(tickers)}
+    vector = np.zeros(len(tickers))
+    for ticker, weight in weights.items():
+        if ticker not in column:
+            raise BacktestError(f"No price history for {ticker}.")
+        vector[column[ticker]] = float(weight)
+    if (vector < 0).any() or vector.sum() > 1 + 1e-9:
+        raise BacktestError("Weights must be non-negative and sum to at most 1.")
+    return vector
+
+
+# =====================================================
+# Simulation
+# =====================================================
+def simulate(prices, weights, period, starting_cash=1.0, cost=0.0):
+    """Equity curves for K weight vectors sharing one rebalance period.
+
+    prices is (T, N), weights (K, N); starting_cash and cost (fraction of
+    traded value) may be scalars or length-K arrays. Holdings are constant
+    between rebalances, so each segment's value is the rebalance-day value
+    times the weighted price relatives - everything is array algebra over
+    days, tickers and variations at once. Returns (equity (T, K), turnover (K,)).
+    """
+    days = prices.shape[0]
+    weights = np.atleast_2d(weights)
+    cash_weight = 1.0 - weights.sum(axis=1)
+    starting_cash = np.broadcast_to(np.asarray(starting_cash, dtype=float), cash_weight.shape)
+    cost = np.broadcast_to(np.asarray(cost, dtype=float), cash_weight.shape)
+
+    points = np.arange(0, days, period) if period else np.array([0])
+    segment = np.repeat(np.arange(len(points)), np.diff(np.append(points, days)))
+
+    # Value relative to the last rebalance, for every day and variation
+    growth = (prices / prices[points][segment]) @ weights.T + cash_weight
+
+    # Drift over each full segment, and what rebalancing back to target trades
+    relatives = prices[points[1:]] / prices[points[:-1]]  # (J-1, N)
+    segment_growth = relatives @ weights.T + cash_weight  # (J-1, K)
+    drifted = weights[None, :, :] * relatives[:, None, :] / segment_growth[:, :, None]
+    traded = np.abs(drifted - weights[None, :, :]).sum(axis=2)  # (J-1, K) fraction of value
+
+    # Value right after each rebalance (the first one buys from all cash)
+    net = segment_growth * (1.0 - cost * traded)
+    level = starting_cash * (1.0 - cost * weights.sum(axis=1))
+    level = level * np.vstack([np.ones((1, len(cash_weight))), np.cumprod(net, axis=0)])
+
+    equity = level[segment] * growth
+    turnover = traded.sum(axis=0) + weights.sum(axis=1)
+    return equity, turnover
+
+
+def summarize(equity, starting_cash=None):
+    """Per-column summary statistics of (T, K) equity curves (returns measured from starting_cash)."""
+    start = equity[0] if starting_cash is None else starting_cash
+    daily = equity[1:] / equity[:-1] - 1.0
+    mean = daily.mean(axis=0)
+    std = daily.std(axis=0, ddof=1)
+    years = (equity.shape[0] - 1) / TRADING_DAYS
+    total_return = equity[-1] / start - 1.0
+    drawdown = equity / np.maximum.accumulate(equity, axis=0) - 1.0
+    return {
+        "final_value": equity[-1],
+        "total_return": total_return,
+        "cagr": np.power(equity[-1] / start, 1.0 / years) - 1.0 if years else total_return,
+        "volatility": std * np.sqrt(TRADING_DAYS),
+        "sharpe": np.divide(mean, std, out=np.zeros_like(mean), where=std > 0) * np.sqrt(TRADING_DAYS),
+        "max_drawdown": drawdown.min(axis=0),
+    }
+
+
+# =====================================================
+# Single Backtest
+# =====================================================
+def run_backtest(tickers, prices, rules, dates=None):
+    """Backtest one rule set: {"weights": {ticker: w}, "rebalance", "starting_cash", "cost_bps"}."""
+    prices = fill_prices(prices)
+    weights = weight_vector(rules.get("weights") or {}, tickers)
+    period = rebalance_period(rules.get("rebalance", "monthly"))
+    starting_cash = float(rules.get("starting_cash", 10000))
+    if starting_cash <= 0:
+        raise BacktestError("Starting cash must be positive.")
+
+    equity, turnover = simulate(prices, weights, period, starting_cash, float(rules.get("cost_bps", 0)) / 10000)
+    curve = equity[:, 0]
+    stats = {key: float(value[0]) for key, value in summarize(equity, starting_cash).items()}
+    stats["turnover"] = float(turnover[0])
+    return {
+        "equity": [{"date": d, "value": v} for d, v in zip(dates, curve.tolist())] if dates is not None else curve.tolist(),
+        "stats": stats,
+    }
+
+
+# =====================================================
+# Parameter Sweeps (process pool)
+# =====================================================
+_PRICES = None  # Per-worker copy of the filled price array, set once by the pool initializer
+
+
+def _init_worker(prices):
+    global _PRICES
+    _PRICES = prices
+
+
+def _run_chunk(chunk, curves=False):
+    """Simulate (index, weights, period, starting_cash, cost) variations, batching equal periods."""
+    results = []
+    by_period = {}
+    for item in chunk:
+        by_period.setdefault(item[2], []).append(item)
+    for period, items in by_period.items():
+        weights = np.array([item[1] for item in items])
+        starting_cash = np.array([item[3] for item in items])
+        equity, turnover = simulate(_PRICES, weights, period, starting_cash, np.array([item[4] for item in items]))
+        stats = summarize(equity, starting_cash)
+        for k, item in enumerate(items):
+            result = {"index": item[0], "stats": {key: float(value[k]) for key, value in stats.items()}}
+            result["stats"]["turnover"] = float(turnover[k])
+            if curves:
+                result["equity"] = equity[:, k].tolist()
+            results.append(result)
+    return results
+
+
+def run_many(tickers, prices, variations, workers=None, curves=False):
+    """Backtest many rule sets over the same prices across all cores; results keep input order."""
+    prices = fill_prices(prices)
+    items = [
+        (
+            i,
+            weight_vector(rules.get("weights") or {}, tickers),
+            rebalance_period(rules.get("rebalance", "monthly")),
+            float(rules.get("starting_cash", 10000)),
+            float(rules.get("cost_bps", 0)) / 10000,
+        )
+        for i, rules in enumerate(variations)
+    ]
+    # Sorting by period keeps equal periods in the same task so they batch into one matmul
+    items.sort(key=lambda item: (item[2] is None, item[2] or 0))
+    chunks = [items[i:i + VARIATIONS_PER_TASK] for i in range(0, len(items), VARIATIONS_PER_TASK)]
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(chunks) == 1:
+        _init_worker(prices)
+        results = [r for chunk in chunks for r in _run_chunk(chunk, curves)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(prices,)) as pool:
+            results = [r for batch in pool.map(_run_chunk, chunks, [curves] * len(chunks)) for r in batch]
+    return sorted(results, key=lambda r: r["index"])
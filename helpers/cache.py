@@ -0,0 +1,221 @@
+from collections import OrderedDict
+import threading
+import time
+
+
+# =====================================================
+# Exchange Rate Cache
+# =====================================================
+class FxRateCache:
+    """USD exchange rates keyed by currency, shared by every quote in a refresh window."""
+
+    def __init__(self, fetch_many, ttl=300):
+        # fetch_many(["EUR", "GBP"]) -> {"EUR": 0.92, "GBP": 0.79}; missing/None means unavailable
+        self._fetch_many = fetch_many
+        self.ttl = ttl
+        self._rates = {}  # {"EUR": {"rate": float, "fetched": monotonic seconds}}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, currency):
+        return self.get_many([currency]).get(currency)
+
+    def get_many(self, currencies):
+        """Return {currency: rate}, fetching every stale or unknown pair in one call."""
+        now = time.monotonic()
+        rates = {}
+        missing = []
+
+        with self._lock:
+            for currency in dict.fromkeys(c.upper() for c in currencies if c):
+                if currency == "USD":
+                    rates[currency] = 1.0
+                    continue
+                entry = self._rates.get(currency)
+                if entry and now - entry["fetched"] < self.ttl:
+                    self.hits += 1
+                    rates[currency] = entry["rate"]
+                else:
+                    self.misses += 1
+                    missing.append(currency)
+
+        if missing:
+            fetched = self._fetch_many(missing) or {}
+            now = time.monotonic()
+            with self._lock:
+                for currency in missing:
+                    rate = fetched.get(currency)
+                    rates[currency] = rate
+                    if rate:  # never cache a failed fetch
+                        self._rates[currency] = {"rate": rate, "fetched": now}
+
+        return rates
+
+    def age(self, currency):
+        """Seconds since the pair was fetched, or None if it is not cached."""
+        entry = self._rates.get((currency or "").upper())
+        return time.monotonic() - entry["fetched"] if entry else None
+
+    def clear(self):
+        with self._lock:
+            self._rates.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            pairs = {
+                currency: {
+                    "rate": entry["rate"],
+                    "age": round(now - entry["fetched"], 1),
+                    "fresh": now - entry["fetched"] < self.ttl,
+                }
+                for currency, entry in self._rates.items()
+            }
+            return {"hits": self.hits, "misses": self.misses, "ttl": self.ttl, "pairs": pairs}
+
+
+# =====================================================
+# Quote Cache
+# =====================================================
+class QuoteCache:
+    """Size-capped LRU cache where every entry carries its own expiry."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # {key: (value, expires at monotonic seconds)}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires = entry
+            if expires <= now:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl):
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        return entry[0] if entry else None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.expirations = self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0,
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+            }
+
+
+# =====================================================
+# Single-Flight Request Coalescing
+# =====================================================
+class _Call:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapse concurrent fetches of the same key into one upstream call.
+
+    The first caller for a key fetches it; callers arriving while that fetch
+    is in flight wait for its result (or its exception) instead of repeating it.
+    Nothing is kept once the fetch returns - caching is left to the caches above.
+    """
+
+    def __init__(self):
+        self._calls = {}  # {key: _Call} for fetches currently in flight
+        self._lock = threading.Lock()
+        self.upstream = 0  # fetches actually made
+        self.coalesced = 0  # keys served by another caller's fetch (upstream calls saved)
+
+    def do(self, key, fetch):
+        """Return fetch() for key, sharing the result with concurrent callers."""
+        return self.do_many([key], lambda keys: {key: fetch()})[key]
+
+    def do_many(self, keys, fetch_many):
+        """Return {key: value}; keys nobody is fetching go to fetch_many(keys) in one call."""
+        lead = {}
+        follow = {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                call = self._calls.get(key)
+                if call is None:
+                    lead[key] = self._calls[key] = _Call()
+                else:
+                    follow[key] = call
+                    self.coalesced += 1
+            if lead:
+                self.upstream += 1
+
+        results = {}
+        if lead:
+            try:
+                fetched = fetch_many(list(lead)) or {}
+                for key, call in lead.items():
+                    call.value = results[key] = fetched.get(key)
+            except BaseException as e:
+                for call in lead.values():
+                    call.error = e
+                raise
+            finally:
+                with self._lock:
+                    for key in lead:
+                        del self._calls[key]
+                for call in lead.values():
+                    call.done.set()
+
+        # Leaders fetch before waiting, so two overlapping batches cannot deadlock
+        for key, call in follow.items():
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            results[key] = call.value
+        return results
+
+    def stats(self):
+        with self._lock:
+            return {"upstream": self.upstream, "coalesced": self.coalesced, "in_flight": len(self._calls)}
@@ -0,0 +1,151 @@
+import base64
+import csv
+import io
+import json
+
+# Custom modules
+from helpers.setup import db_connection
+
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+EXPORT_FLUSH_ROWS = 500  # Rows per chunk written to the response while exporting
+COLUMNS = ("id", "date", "type", "ticker", "shares", "price")
+TYPES = ("buy", "sell", "deposit", "withdraw")
+
+
+class HistoryError(ValueError):
+    """Bad filter or cursor."""
+
+
+# =====================================================
+# Cursors
+# =====================================================
+def encode_cursor(row):
+    """Opaque token for the position just after row in (date, id) DESC order."""
+    raw = json.dumps([row["date"], row["id"]]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        date, id = json.loads(raw)
+        return str(date), int(id)
+    except (ValueError, TypeError):
+        raise HistoryError("Invalid cursor.")
+
+
+# =====================================================
+# Query Building
+# =====================================================
+def parse_filters(args):
+    """Normalise ticker/type/start/end query parameters."""
+    filters = {}
+    ticker = (args.get("ticker") or "").strip().upper()
+    if ticker:
+        filters["ticker"] = ticker
+    kind = (args.get("type") or "").strip().lower()
+    if kind:
+        if kind not in TYPES:
+            raise HistoryError(f"Type must be one of: {', '.join(TYPES)}.")
+        filters["type"] = kind
+    start = (args.get("start") or "").strip()
+    if start:
+        filters["start"] = start
+    end = (args.get("end") or "").strip()
+    if end:
+        # A bare date includes the whole day
+        filters["end"] = end + " 23:59:59" if len(end) == 10 else end
+    return filters
+
+
+def build_query(strategy_id, filters, after=None, limit=None):
+    """SELECT for one strategy's ledger, newest first, resuming strictly after the cursor.
+
+    The (date, id) row-value comparison is a range seek on the history
+    indexes, so a deep page reads only the rows it returns.
+    """
+    clauses = ["strategy_id = ?"]
+    params = [strategy_id]
+    if "ticker" in filters:
+        clauses.append("ticker = ?")
+        params.append(filters["ticker"])
+    if "type" in filters:
+        clauses.append("type = ?")
+        params.append(filters["type"])
+    if "start" in filters:
+        clauses.append("date >= ?")
+        params.append(filters["start"])
+    if "end" in filters:
+        clauses.append("date <= ?")
+        params.append(filters["end"])
+    if after:
+        clauses.append("(date, id) < (?, ?)")
+        params.extend(after)
+
+    query = f"""
+        SELECT {", ".join(COLUMNS)}
+        FROM transactions
+        WHERE {" AND ".join(clauses)}
+        ORDER BY date DESC, id DESC
+    """
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    return query, params
+
+
+# =====================================================
+# Paginated History
+# =====================================================
+def history_page(db, strategy_id, filters, cursor=None, limit=PAGE_SIZE):
+    """One page of transactions plus the cursor for the next page (None at the end)."""
+    after = decode_cursor(cursor) if cursor else None
+    query, params = build_query(strategy_id, filters, after, limit + 1)
+    rows = db.execute(query, params).fetchall()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "transactions": [dict(row) for row in rows],
+        "next_cursor": encode_cursor(rows[-1]) if has_more else None,
+        "has_more": has_more,
+    }
+
+
+# =====================================================
+# Streaming Export
+# =====================================================
+def _rows(strategy_id, filters):
+    # Own pooled connection: the response body is produced after the request's teardown
+    with db_connection() as db:
+        query, params = build_query(strategy_id, filters)
+        yield from db.execute(query, params)
+
+
+def stream_ndjson(strategy_id, filters):
+    """Yield newline-delimited JSON in chunks while iterating the SQLite cursor."""
+    chunk = []
+    for row in _rows(strategy_id, filters):
+        chunk.append(json.dumps(dict(row)))
+        if len(chunk) >= EXPORT_FLUSH_ROWS:
+            yield "\n".join(chunk) + "\n"
+            chunk.clear()
+    if chunk:
+        yield "\n".join(chunk) + "\n"
+
+
+def stream_csv(strategy_id, filters):
+    """Yield CSV (header first) in chunks while iterating the SQLite cursor."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    count = 0
+    for row in _rows(strategy_id, filters):
+        writer.writerow(tuple(row))
+        count += 1
+        if count % EXPORT_FLUSH_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
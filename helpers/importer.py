@@ -0,0 +1,167 @@
+import csv
+import time
+from datetime import datetime
+
+# Custom modules
+from helpers.ledger import ledger_violations, rebuild_holdings, rebuild_position_totals
+from helpers.lots import rebuild_lots
+from helpers.trading import run_in_write_transaction
+
+IMPORT_CHUNK_SIZE = 5000  # Rows staged per executemany and commit
+MAX_REPORTED_ERRORS = 100  # Invalid rows listed in the summary (all are counted)
+DATE_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d", "%Y-%m-%dT%H:%M:%S")
+TYPES = ("buy", "sell", "deposit", "withdraw")
+
+
+class CsvImportError(ValueError):
+    """The file cannot be imported at all (as opposed to a single bad row)."""
+
+
+# =====================================================
+# Row Validation
+# =====================================================
+def _parse_date(value):
+    value = (value or "").strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).strftime("%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid date '{value}'.")
+
+
+def _positive(value, field):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid {field} '{value}'.")
+    if number <= 0:
+        raise ValueError(f"{field.capitalize()} must be positive.")
+    return number
+
+
+def parse_row(row):
+    """Validate one CSV row; returns (type, ticker, shares, price, date) as stored in transactions."""
+    kind = (row.get("type") or "").strip().lower()
+    if kind not in TYPES:
+        raise ValueError(f"Type must be one of: {', '.join(TYPES)}.")
+    date = _parse_date(row.get("date"))
+
+    if kind in ("deposit", "withdraw"):
+        amount = row.get("amount") or row.get("price")
+        return kind, None, None, _positive(amount, "amount"), date
+
+    ticker = (row.get("ticker") or "").strip().upper()
+    if not ticker:
+        raise ValueError("Missing ticker symbol.")
+    return kind, ticker, _positive(row.get("shares"), "shares"), _positive(row.get("price"), "price"), date
+
+
+# =====================================================
+# Streaming Import
+# =====================================================
+def _stage(db):
+    """Connection-local staging table, spilled to a temp file so a large import keeps memory flat.
+
+    Writes to a TEMP table do not take the main database's write lock, so
+    other requests keep trading while the file is parsed.
+    """
+    db.commit()
+    db.execute("PRAGMA temp_store = FILE")
+    db.execute(
+        """
+        CREATE TEMP TABLE IF NOT EXISTS import_staging (
+            type TEXT NOT NULL, ticker TEXT, shares REAL, price REAL NOT NULL, date TEXT NOT NULL
+        )
+        """
+    )
+    db.execute("DELETE FROM temp.import_staging")
+    db.commit()
+
+
+def _unstage(db):
+    if db.in_transaction:
+        db.rollback()
+    db.execute("DROP TABLE IF EXISTS temp.import_staging")
+    db.execute("PRAGMA temp_store = MEMORY")  # back to the pool's setting (helpers/setup.py)
+
+
+def import_transactions(db, strategy_id, lines, chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+    """Stream CSV rows into a strategy's ledger, then rebuild its derived state once.
+
+    lines is any iterable of text lines (an open file, a request stream), so
+    only one chunk of rows is held in memory. Columns: date, type, ticker,
+    shares, price, and optionally amount for deposits/withdrawals. Invalid rows
+    are skipped and reported. progress(summary) is called after every chunk.
+
+    Rows are staged chunk by chunk (one commit each) without the write lock.
+    One short write transaction then moves them into the ledger and rebuilds:
+    if the merged ledger oversells a position or overdraws cash at any point,
+    nothing is imported and CsvImportError lists the offending rows.
+    """
+    if not db.execute("SELECT id FROM strategy WHERE id = ?", (strategy_id,)).fetchone():
+        raise CsvImportError("Strategy not found.")
+
+    reader = csv.DictReader(lines)
+    header = {(name or "").strip().lower() for name in reader.fieldnames or []}
+    if not {"date", "type"} <= header:
+        raise CsvImportError("CSV needs at least 'date' and 'type' columns.")
+    reader.fieldnames = [(name or "").strip().lower() for name in reader.fieldnames]
+
+    start = time.perf_counter()
+    summary = {"rows": 0, "inserted": 0, "skipped": 0, "errors": []}
+
+    def report():
+        elapsed = time.perf_counter() - start
+        summary["seconds"] = round(elapsed, 3)
+        summary["rows_per_second"] = round(summary["rows"] / elapsed, 1) if elapsed else 0.0
+        if progress:
+            progress(summary)
+
+    def flush(chunk):
+        db.executemany(
+            "INSERT INTO temp.import_staging (type, ticker, shares, price, date) VALUES (?, ?, ?, ?, ?)", chunk
+        )
+        db.commit()
+        summary["inserted"] += len(chunk)
+        chunk.clear()
+        report()
+
+    def merge(db):
+        db.execute(
+            """
+            INSERT INTO transactions (strategy_id, type, ticker, shares, price, date)
+            SELECT ?, type, ticker, shares, price, date FROM temp.import_staging ORDER BY rowid
+            """,
+            (strategy_id,),
+        )
+        violations = ledger_violations(db, strategy_id, limit=MAX_REPORTED_ERRORS)
+        if violations:
+            details = "; ".join(f"{v['date']} {v['type']}: {v['message']}" for v in violations[:5])
+            raise CsvImportError(f"Import rejected, nothing was imported. {len(violations)} row(s) oversell or overdraw: {details}.")
+
+        # Derived state is rebuilt once, not per row, in the same transaction
+        rebuild_holdings(db, strategy_id)
+        rebuild_lots(db, strategy_id=strategy_id, commit=False)
+        rebuild_position_totals(db, strategy_id=strategy_id, commit=False)
+
+    _stage(db)
+    try:
+        chunk = []
+        for row in reader:
+            summary["rows"] += 1
+            try:
+                chunk.append(parse_row(row))
+            except ValueError as e:
+                summary["skipped"] += 1
+                if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+                    summary["errors"].append({"line": reader.line_num, "message": str(e)})
+            if len(chunk) >= chunk_size:
+                flush(chunk)
+        if chunk:
+            flush(chunk)
+        run_in_write_transaction(db, merge)
+    finally:
+        _unstage(db)
+    report()
+    return summary
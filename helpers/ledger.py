@@ -0,0 +1,229 @@
+TOTAL_COLUMNS = ("shares_bought", "shares_sold", "total_bought", "total_sold", "cost_basis", "realized_pnl")
+DRIFT_TOLERANCE = 1e-6
+SHARE_EPSILON = 1e-9  # Holdings below this count as fully closed
+
+
+# =====================================================
+# Incremental Updates (call inside the trade's transaction)
+# =====================================================
+def record_buy(db, strategy_id, ticker, shares, price):
+    """Add a buy to the position's running totals."""
+    amount = shares * price
+    db.execute(
+        """
+        INSERT INTO position_totals (strategy_id, ticker, shares_bought, total_bought, cost_basis)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(strategy_id, ticker) DO UPDATE SET
+            shares_bought = shares_bought + excluded.shares_bought,
+            total_bought = total_bought + excluded.total_bought,
+            cost_basis = cost_basis + excluded.cost_basis
+        """,
+        (strategy_id, ticker, shares, amount, amount),
+    )
+
+
+def record_sell(db, strategy_id, ticker, shares, price, closures):
+    """Apply a sell using the lots it closed (from close_lots), so totals match the lot ledger."""
+    cost = sum(closure["shares"] * closure["cost"] for closure in closures)
+    realized = sum(closure["realized_pnl"] for closure in closures)
+    db.execute(
+        """
+        INSERT INTO position_totals (strategy_id, ticker) VALUES (?, ?)
+        ON CONFLICT(strategy_id, ticker) DO NOTHING
+        """,
+        (strategy_id, ticker),
+    )
+    db.execute(
+        """
+        UPDATE position_totals SET
+            shares_sold = shares_sold + ?,
+            total_sold = total_sold + ?,
+            realized_pnl = realized_pnl + ?,
+            cost_basis = cost_basis - ?
+        WHERE strategy_id = ? AND ticker = ?
+        """,
+        (shares, shares * price, realized, cost, strategy_id, ticker),
+    )
+
+
+# =====================================================
+# Totals From Ledger And Lots
+# =====================================================
+def compute_position_totals(db, strategy_id=None):
+    """Totals per position from the ledger and the lots; returns {(strategy_id, ticker): totals}.
+
+    Shares and amounts come from the transactions. Cost basis (open lots) and
+    realized P&L (lot closures) come from the lot tables, which record how
+    each sell was matched, so the lots must be current (rebuild_lots first).
+    """
+    scope = "" if strategy_id is None else "AND {}strategy_id = ?"
+    params = () if strategy_id is None else (strategy_id,)
+    totals = {}
+
+    def entry(row):
+        return totals.setdefault((row["strategy_id"], row["ticker"].strip().upper()), dict.fromkeys(TOTAL_COLUMNS, 0.0))
+
+    for row in db.execute(
+        f"""
+        SELECT strategy_id, ticker,
+               SUM(CASE WHEN type = 'buy' THEN shares ELSE 0 END) AS shares_bought,
+               SUM(CASE WHEN type = 'sell' THEN shares ELSE 0 END) AS shares_sold,
+               SUM(CASE WHEN type = 'buy' THEN shares * price ELSE 0 END) AS total_bought,
+               SUM(CASE WHEN type = 'sell' THEN shares * price ELSE 0 END) AS total_sold
+        FROM transactions
+        WHERE type IN ('buy', 'sell') {scope.format("")}
+        GROUP BY strategy_id, ticker
+        """,
+        params,
+    ):
+        for column in ("shares_bought", "shares_sold", "total_bought", "total_sold"):
+            entry(row)[column] += float(row[column] or 0)
+
+    for row in db.execute(
+        f"""
+        SELECT l.strategy_id, l.ticker,
+               SUM(l.remaining * l.price) AS cost_basis,
+               SUM((SELECT COALESCE(SUM(c.realized_pnl), 0) FROM lot_closures c WHERE c.lot_id = l.id)) AS realized_pnl
+        FROM lots l
+        WHERE 1 = 1 {scope.format("l.")}
+        GROUP BY l.strategy_id, l.ticker
+        """,
+        params,
+    ):
+        entry(row)["cost_basis"] += float(row["cost_basis"] or 0)
+        entry(row)["realized_pnl"] += float(row["realized_pnl"] or 0)
+
+    return totals
+
+
+def rebuild_position_totals(db, strategy_id=None, verify=False, tolerance=DRIFT_TOLERANCE, commit=True):
+    """Recompute running totals from the ledger and report drift against the stored rows.
+
+    With verify=True nothing is written; otherwise the stored totals are replaced
+    in a single transaction (left open with commit=False, for callers that
+    rebuild several tables in one unit of work).
+    """
+    expected = compute_position_totals(db, strategy_id)
+
+    if strategy_id is None:
+        rows = db.execute("SELECT * FROM position_totals").fetchall()
+    else:
+        rows = db.execute("SELECT * FROM position_totals WHERE strategy_id = ?", (strategy_id,)).fetchall()
+    stored = {(row["strategy_id"], row["ticker"]): {c: float(row[c] or 0) for c in TOTAL_COLUMNS} for row in rows}
+
+    drift = []
+    for key in sorted(set(expected) | set(stored), key=str):
+        want = expected.get(key, dict.fromkeys(TOTAL_COLUMNS, 0.0))
+        have = stored.get(key, dict.fromkeys(TOTAL_COLUMNS, 0.0))
+        for column in TOTAL_COLUMNS:
+            if abs(want[column] - have[column]) > tolerance:
+                drift.append({
+                    "strategy_id": key[0],
+                    "ticker": key[1],
+                    "column": column,
+                    "stored": have[column],
+                    "expected": want[column],
+                })
+
+    if not verify:
+        if strategy_id is None:
+            db.execute("DELETE FROM position_totals")
+        else:
+            db.execute("DELETE FROM position_totals WHERE strategy_id = ?", (strategy_id,))
+        db.executemany(
+            f"""
+            INSERT INTO position_totals (strategy_id, ticker, {", ".join(TOTAL_COLUMNS)})
+            VALUES (?, ?, {", ".join("?" for _ in TOTAL_COLUMNS)})
+            """,
+            [(key[0], key[1], *(entry[c] for c in TOTAL_COLUMNS)) for key, entry in expected.items()],
+        )
+        if commit:
+            db.commit()
+
+    return {"positions": len(expected), "drift": drift}
+
+
+def backfill_position_totals(db):
+    """Populate position_totals once for databases created before it existed (after backfill_lots)."""
+    has_totals = db.execute("SELECT 1 FROM position_totals LIMIT 1").fetchone()
+    has_trades = db.execute("SELECT 1 FROM transactions WHERE type IN ('buy', 'sell') LIMIT 1").fetchone()
+    if has_trades and not has_totals:
+        rebuild_position_totals(db)
+
+
+# =====================================================
+# Holdings And Cash From Ledger
+# =====================================================
+def rebuild_holdings(db, strategy_id):
+    """Recompute a strategy's portfolio rows and current cash from its ledger (no commit)."""
+    db.execute("DELETE FROM portfolio WHERE strategy_id = ?", (strategy_id,))
+    db.execute(
+        """
+        INSERT INTO portfolio (strategy_id, ticker, shares)
+        SELECT strategy_id, ticker, SUM(CASE WHEN type = 'buy' THEN shares ELSE -shares END) AS net
+        FROM transactions
+        WHERE strategy_id = ? AND type IN ('buy', 'sell')
+        GROUP BY ticker
+        HAVING net > ?
+        """,
+        (strategy_id, SHARE_EPSILON),
+    )
+    db.execute(
+        """
+        UPDATE strategy SET current_cash = starting_cash + (
+            SELECT COALESCE(SUM(CASE type
+                WHEN 'deposit' THEN price
+                WHEN 'withdraw' THEN -price
+                WHEN 'buy' THEN -price * shares
+                WHEN 'sell' THEN price * shares
+            END), 0)
+            FROM transactions WHERE strategy_id = ?
+        )
+        WHERE id = ?
+        """,
+        (strategy_id, strategy_id),
+    )
+
+
+def ledger_violations(db, strategy_id, limit=None):
+    """Replay a strategy's ledger in date order; returns the rows that oversell or overdraw.
+
+    Applies the same rules as the live endpoints: a sell needs the shares
+    held at that point, and a buy or withdrawal needs the cash. A violating
+    row is left out of the replay, so later rows are judged as the live
+    endpoints would have judged them.
+    """
+    cash = float(db.execute("SELECT starting_cash FROM strategy WHERE id = ?", (strategy_id,)).fetchone()[0] or 0)
+    held = {}
+    violations = []
+    rows = db.execute(
+        "SELECT id, type, ticker, shares, price, date FROM transactions WHERE strategy_id = ? ORDER BY date, id",
+        (strategy_id,),
+    )
+    for row in rows:
+        kind, ticker = row["type"], (row["ticker"] or "").strip().upper()
+        shares, price = float(row["shares"] or 0), float(row["price"] or 0)
+        problem = None
+        if kind == "deposit":
+            cash += price
+        elif kind == "withdraw":
+            if cash - price < -DRIFT_TOLERANCE:
+                problem = f"withdraws {price:.2f} with {cash:.2f} cash"
+            else:
+                cash -= price
+        elif kind == "buy":
+            if cash - shares * price < -DRIFT_TOLERANCE:
+                problem = f"buy costs {shares * price:.2f} with {cash:.2f} cash"
+            else:
+                cash -= shares * price
+                held[ticker] = held.get(ticker, 0.0) + shares
+        elif held.get(ticker, 0.0) < shares - SHARE_EPSILON:
+            problem = f"sells {shares:g} {ticker} with {held.get(ticker, 0.0):g} held"
+        else:
+            held[ticker] -= shares
+            cash += shares * price
+        if problem:
+            violations.append({"date": row["date"], "type": kind, "ticker": row["ticker"], "message": problem})
+            if limit and len(violations) >= limit:
+                break
+    return violations
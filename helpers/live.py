@@ -0,0 +1,150 @@
+import os
+import queue
+import threading
+from collections import Counter
+
+# Custom modules
+from helpers.api import lookup_many
+
+LIVE_REFRESH_SECONDS = float(os.getenv("LIVE_REFRESH_SECONDS", "15"))  # One upstream batch per interval
+SUBSCRIBER_QUEUE_SIZE = 64  # Ticks buffered per slow client before older ones are dropped
+
+
+# =====================================================
+# Subscription
+# =====================================================
+class Subscription:
+    """One client's interest in a set of tickers; ticks arrive as sets of changed tickers."""
+
+    def __init__(self, tickers):
+        self.tickers = set(tickers)
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def push(self, changed):
+        try:
+            self.queue.put_nowait(changed)
+        except queue.Full:
+            # Slow reader: merge into the oldest pending tick rather than block the poller
+            try:
+                pending = self.queue.get_nowait()
+            except queue.Empty:
+                pending = set()
+            self.queue.put_nowait(pending | changed)
+
+    def next(self, timeout):
+        """Changed tickers since the last call, or None after timeout."""
+        try:
+            changed = set(self.queue.get(timeout=timeout))
+        except queue.Empty:
+            return None
+        while True:
+            try:
+                changed |= self.queue.get_nowait()
+            except queue.Empty:
+                return changed
+
+
+# =====================================================
+# Shared Poller
+# =====================================================
+class PricePoller:
+    """Poll the union of every subscriber's tickers with a single lookup_many per interval.
+
+    Subscribers are told only which tickers' prices moved; the latest quotes
+    are read from latest(). The thread starts with the first subscriber and
+    exits once the last one leaves.
+    """
+
+    def __init__(self, interval=LIVE_REFRESH_SECONDS, fetch=lookup_many):
+        self.interval = interval
+        self.fetch = fetch
+        self._subscribers = set()
+        self._counts = Counter()  # ticker -> subscribers watching it
+        self._quotes = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._polls = 0
+
+    def subscribe(self, tickers):
+        subscription = Subscription(tickers)
+        with self._lock:
+            self._subscribers.add(subscription)
+            self._counts.update(subscription.tickers)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        self._wake.set()  # poll new tickers now instead of waiting out the interval
+        return subscription
+
+    def update(self, subscription, tickers):
+        """Change the tickers a subscription watches (e.g. after a trade)."""
+        tickers = set(tickers)
+        with self._lock:
+            self._counts.subtract(subscription.tickers)
+            self._counts.update(tickers)
+            self._counts = +self._counts
+            added = tickers - subscription.tickers
+            subscription.tickers = tickers
+        if added:
+            self._wake.set()
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.discard(subscription)
+                self._counts.subtract(subscription.tickers)
+                self._counts = +self._counts
+        self._wake.set()
+
+    def latest(self, tickers):
+        with self._lock:
+            return {t: self._quotes[t] for t in tickers if t in self._quotes}
+
+    def stats(self):
+        with self._lock:
+            return {"subscribers": len(self._subscribers), "tickers": len(self._counts), "polls": self._polls}
+
+    def poll(self):
+        """Fetch every watched ticker once and notify subscribers of price changes."""
+        with self._lock:
+            tickers = list(self._counts)
+        if not tickers:
+            return set()
+
+        quotes = self.fetch(tickers)
+        changed = set()
+        with self._lock:
+            self._polls += 1
+            for ticker, quote in quotes.items():
+                if not quote or quote.get("price") is None:
+                    continue
+                previous = self._quotes.get(ticker)
+                if previous is None or previous["price"] != quote["price"]:
+                    changed.add(ticker)
+                self._quotes[ticker] = quote
+            for ticker in set(self._quotes) - set(self._counts):
+                del self._quotes[ticker]
+            subscribers = list(self._subscribers)
+
+        for subscription in subscribers:
+            moved = changed & subscription.tickers
+            if moved:
+                subscription.push(moved)
+        return changed
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    return
+            self._wake.clear()
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"[live poller error] {e}")
+            self._wake.wait(self.interval)
+
+
+POLLER = PricePoller()
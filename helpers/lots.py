@@ -0,0 +1,244 @@
+from collections import deque
+
+LOT_METHODS = ("fifo", "lifo", "highest_cost", "specific")
+LOT_BATCH = 32  # Open lots read per round trip while matching a sell
+REBUILD_CHUNK = 10000  # Rows buffered before a rebuild writes them
+SHARE_EPSILON = 1e-9
+
+# Each ordering walks one of the partial indexes over open lots
+_LOT_ORDER = {
+    "fifo": "opened ASC, id ASC",
+    "lifo": "opened DESC, id DESC",
+    "highest_cost": "price DESC, id DESC",
+}
+
+
+class LotError(ValueError):
+    """A sell cannot be matched against the strategy's open lots."""
+
+
+# =====================================================
+# Open Lot (on buy)
+# =====================================================
+def open_lot(db, strategy_id, ticker, shares, price, opened, transaction_id=None):
+    cursor = db.execute(
+        """
+        INSERT INTO lots (strategy_id, ticker, transaction_id, opened, price, shares, remaining)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        (strategy_id, ticker, transaction_id, opened, price, shares, shares),
+    )
+    return cursor.lastrowid
+
+
+# =====================================================
+# Close Lots (on sell)
+# =====================================================
+def _consume(db, lot, take, price, closed, transaction_id):
+    remaining = lot["remaining"] - take
+    if remaining <= SHARE_EPSILON:
+        remaining = 0.0
+    realized = (price - lot["price"]) * take
+    db.execute("UPDATE lots SET remaining = ? WHERE id = ?", (remaining, lot["id"]))
+    db.execute(
+        """
+        INSERT INTO lot_closures (lot_id, transaction_id, closed, shares, price, realized_pnl)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        (lot["id"], transaction_id, closed, take, price, realized),
+    )
+    return {"lot_id": lot["id"], "shares": take, "cost": lot["price"], "realized_pnl": realized}
+
+
+def close_lots(db, strategy_id, ticker, shares, price, closed, method="fifo", lot_ids=None, transaction_id=None):
+    """Match a sell against open lots; returns the closures made.
+
+    Lots are read a small batch at a time through a partial index, so a sell
+    touches only the lots it consumes rather than every open lot. Raises
+    LotError if the open lots cannot cover the sell; the caller's transaction
+    should then be rolled back.
+    """
+    if method not in LOT_METHODS:
+        raise LotError(f"Unknown lot method '{method}'.")
+
+    closures = []
+    needed = shares
+
+    if method == "specific":
+        if not lot_ids:
+            raise LotError("Specific-lot sells need lot_ids.")
+        for lot_id in lot_ids:
+            if needed <= SHARE_EPSILON:
+                break
+            lot = db.execute(
+                """
+                SELECT id, price, remaining FROM lots
+                WHERE id = ? AND strategy_id = ? AND ticker = ? AND remaining > 0
+                """,
+                (lot_id, strategy_id, ticker),
+            ).fetchone()
+            if not lot:
+                raise LotError(f"Lot {lot_id} is not an open {ticker} lot in this strategy.")
+            take = min(needed, lot["remaining"])
+            closures.append(_consume(db, lot, take, price, closed, transaction_id))
+            needed -= take
+    else:
+        order = _LOT_ORDER[method]
+        while needed > SHARE_EPSILON:
+            # Consumed lots drop out of the partial index, so each batch starts at the next open lot
+            batch = db.execute(
+                f"""
+                SELECT id, price, remaining FROM lots
+                WHERE strategy_id = ? AND ticker = ? AND remaining > 0
+                ORDER BY {order}
+                LIMIT ?
+                """,
+                (strategy_id, ticker, LOT_BATCH),
+            ).fetchall()
+            if not batch:
+                break
+            for lot in batch:
+                take = min(needed, lot["remaining"])
+                closures.append(_consume(db, lot, take, price, closed, transaction_id))
+                needed -= take
+                if needed <= SHARE_EPSILON:
+                    break
+
+    if needed > SHARE_EPSILON:
+        raise LotError(f"Open {ticker} lots cover {shares - needed:g} of {shares:g} shares.")
+    return closures
+
+
+# =====================================================
+# Lot Report
+# =====================================================
+def lot_report(db, strategy_id, prices):
+    """Per-lot realized and unrealized P&L; prices is {ticker: current USD price}."""
+    rows = db.execute(
+        """
+        SELECT l.id, l.ticker, l.opened, l.price, l.shares, l.remaining,
+               COALESCE(SUM(c.realized_pnl), 0) AS realized_pnl
+        FROM lots l
+        LEFT JOIN lot_closures c ON c.lot_id = l.id
+        WHERE l.strategy_id = ?
+        GROUP BY l.id
+        ORDER BY l.ticker, l.opened, l.id
+        """,
+        (strategy_id,),
+    ).fetchall()
+
+    lots = []
+    for row in rows:
+        price = prices.get(row["ticker"])
+        unrealized = (price - row["price"]) * row["remaining"] if price is not None else None
+        lots.append({
+            "id": row["id"],
+            "ticker": row["ticker"],
+            "opened": row["opened"],
+            "cost": row["price"],
+            "shares": row["shares"],
+            "remaining": row["remaining"],
+            "price": price,
+            "realized_pnl": row["realized_pnl"],
+            "unrealized_pnl": unrealized,
+        })
+    return lots
+
+
+# =====================================================
+# Rebuild From Ledger
+# =====================================================
+def rebuild_lots(db, strategy_id=None, method="fifo", commit=True):
+    """Recreate lots from the transaction ledger, matching sells by FIFO or LIFO.
+
+    commit=False leaves the transaction open for callers rebuilding several
+    tables in one unit of work.
+    """
+    if method not in ("fifo", "lifo"):
+        raise LotError("Lots can only be rebuilt with fifo or lifo matching.")
+
+    scope = "" if strategy_id is None else "WHERE strategy_id = ?"
+    params = () if strategy_id is None else (strategy_id,)
+    db.execute(f"DELETE FROM lot_closures WHERE lot_id IN (SELECT id FROM lots {scope})", params)
+    db.execute(f"DELETE FROM lots {scope}", params)
+
+    next_id = (db.execute("SELECT MAX(id) FROM lots").fetchone()[0] or 0) + 1
+    counts = {"lots": 0, "closures": 0}
+    finished = []  # lots that can no longer change, waiting to be written
+    pending = [0]  # closures held on those lots
+    open_lots = {}  # {(strategy_id, ticker): deque of lot records still open}
+
+    def flush(force=False):
+        # Written in chunks so memory tracks open lots, not the whole ledger.
+        # Each lot row goes in before the closures that reference it.
+        if not force and len(finished) + pending[0] < REBUILD_CHUNK:
+            return
+        db.executemany(
+            """
+            INSERT INTO lots (id, strategy_id, ticker, transaction_id, opened, price, shares, remaining)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            [(lot_id, key[0], key[1], txn, opened, price, shares, remaining)
+             for lot_id, price, remaining, key, shares, txn, opened, _ in finished],
+        )
+        closures = [closure for lot in finished for closure in lot[7]]
+        db.executemany(
+            """
+            INSERT INTO lot_closures (lot_id, transaction_id, closed, shares, price, realized_pnl)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            closures,
+        )
+        counts["lots"] += len(finished)
+        counts["closures"] += len(closures)
+        finished.clear()
+        pending[0] = 0
+
+    trades = db.execute(
+        f"""
+        SELECT id, strategy_id, ticker, type, shares, price, date
+        FROM transactions
+        WHERE type IN ('buy', 'sell') {"AND strategy_id = ?" if strategy_id is not None else ""}
+        ORDER BY strategy_id, ticker, date, id
+        """,
+        params,
+    )
+    for trade in trades:
+        key = (trade["strategy_id"], trade["ticker"].strip().upper())
+        shares = float(trade["shares"] or 0)
+        price = float(trade["price"] or 0)
+        queue = open_lots.setdefault(key, deque())
+
+        if trade["type"] == "buy":
+            # [lot_id, price, remaining, key, shares, transaction_id, opened, closures]
+            queue.append([next_id, price, shares, key, shares, trade["id"], trade["date"], []])
+            next_id += 1
+            continue
+
+        needed = shares
+        while needed > SHARE_EPSILON and queue:
+            lot = queue[0] if method == "fifo" else queue[-1]
+            take = min(needed, lot[2])
+            lot[2] -= take
+            needed -= take
+            lot[7].append((lot[0], trade["id"], trade["date"], take, price, (price - lot[1]) * take))
+            if lot[2] <= SHARE_EPSILON:
+                lot[2] = 0.0
+                finished.append(queue.popleft() if method == "fifo" else queue.pop())
+                pending[0] += len(lot[7])
+        flush()
+
+    for queue in open_lots.values():
+        finished.extend(queue)
+    flush(force=True)
+    if commit:
+        db.commit()
+    return counts
+
+
+def backfill_lots(db):
+    """Build lots once for databases that recorded trades before lots existed."""
+    has_lots = db.execute("SELECT 1 FROM lots LIMIT 1").fetchone()
+    has_trades = db.execute("SELECT 1 FROM transactions WHERE type IN ('buy', 'sell') LIMIT 1").fetchone()
+    if has_trades and not has_lots:
+        rebuild_lots(db)
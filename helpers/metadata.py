@@ -0,0 +1,117 @@
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+# Custom modules
+from helpers.setup import db_connection
+
+METADATA_MAX_AGE = timedelta(days=30)  # Re-resolve exchange/currency after this long
+
+_MEMO = {}  # {"ticker": {"exchange": str, "currency": str, "updated_at": datetime}}
+_LOCK = threading.Lock()
+
+
+# =====================================================
+# Freshness
+# =====================================================
+def _is_fresh(entry, now=None):
+    now = now or datetime.now()
+    return now - entry["updated_at"] < METADATA_MAX_AGE
+
+
+# =====================================================
+# Load Metadata
+# =====================================================
+def load_metadata(tickers):
+    """Return {ticker: {"exchange", "currency"}} for tickers with fresh stored metadata."""
+    tickers = list(dict.fromkeys(tickers))
+    now = datetime.now()
+    found = {}
+
+    with _LOCK:
+        for ticker in tickers:
+            entry = _MEMO.get(ticker)
+            if entry and _is_fresh(entry, now):
+                found[ticker] = entry
+    missing = [t for t in tickers if t not in found]
+    if not missing:
+        return found
+
+    try:
+        with db_connection() as db:
+            placeholders = ", ".join("?" for _ in missing)
+            rows = db.execute(
+                f"SELECT ticker, exchange, currency, updated_at FROM ticker_metadata WHERE ticker IN ({placeholders})",
+                missing,
+            ).fetchall()
+    except sqlite3.OperationalError:
+        return found  # schema not initialised yet; callers fall back to a full fetch
+
+    with _LOCK:
+        for row in rows:
+            entry = {
+                "exchange": row["exchange"],
+                "currency": row["currency"],
+                "updated_at": datetime.strptime(row["updated_at"], "%Y-%m-%d %H:%M:%S"),
+            }
+            _MEMO[row["ticker"]] = entry
+            if _is_fresh(entry, now):
+                found[row["ticker"]] = entry
+
+    return found
+
+
+# =====================================================
+# Save Metadata
+# =====================================================
+def save_metadata(entries):
+    """Upsert {ticker: {"exchange", "currency"}} into memory and the ticker_metadata table."""
+    if not entries:
+        return
+
+    now = datetime.now().replace(microsecond=0)
+    with _LOCK:
+        for ticker, entry in entries.items():
+            _MEMO[ticker] = {"exchange": entry["exchange"], "currency": entry["currency"], "updated_at": now}
+
+    try:
+        with db_connection() as db:
+            db.executemany(
+                """
+                INSERT INTO ticker_metadata (ticker, exchange, currency, updated_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(ticker) DO UPDATE SET
+                    exchange = excluded.exchange,
+                    currency = excluded.currency,
+                    updated_at = excluded.updated_at
+                """,
+                [
+                    (ticker, entry["exchange"], entry["currency"], now.strftime("%Y-%m-%d %H:%M:%S"))
+                    for ticker, entry in entries.items()
+                ],
+            )
+            db.commit()
+    except sqlite3.OperationalError as e:
+        print(f"[metadata error] {e}")
+
+
+def invalidate_metadata(ticker):
+    """Forget a ticker so the next lookup re-resolves its exchange."""
+    with _LOCK:
+        _MEMO.pop(ticker, None)
+    try:
+        with db_connection() as db:
+            db.execute("DELETE FROM ticker_metadata WHERE ticker = ?", (ticker,))
+            db.commit()
+    except sqlite3.OperationalError:
+        pass
+
+
+# =====================================================
+# Held Tickers
+# =====================================================
+def held_tickers():
+    """Every distinct ticker currently held by any strategy."""
+    with db_connection() as db:
+        rows = db.execute("SELECT DISTINCT ticker FROM portfolio WHERE shares > 0").fetchall()
+        return [row["ticker"].strip().upper() for row in rows]
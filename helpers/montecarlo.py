@@ -0,0 +1,238 @@
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Custom modules
+from helpers.backtest import TRADING_DAYS
+
+METHODS = ("normal", "bootstrap")
+HORIZONS = (1, 5, 10)  # Years
+PERCENTILES = (5, 25, 50, 75, 95)
+DEFAULT_PATHS = 10000
+MAX_PATHS = 2000000  # CLI and benchmark ceiling
+MAX_REQUEST_PATHS = 200000  # Ceiling for projections requested over HTTP
+MAX_REQUEST_STEPS = 600  # Monthly steps over MAX_YEARS; keeps each chunk's histograms near 19 MB
+MAX_YEARS = 50
+CHUNK_PATHS = 10000  # Paths simulated together; bounds memory at CHUNK_PATHS x holdings
+STEP_DAYS = 21  # Trading days per simulated step (monthly)
+LOG_RANGE = (-5.0, 5.0)  # Histogram span of log(value / start value)
+BINS = 4000  # ~0.25% value resolution across LOG_RANGE
+
+
+class ProjectionError(ValueError):
+    """Bad projection parameters or too little history to sample from."""
+
+
+# =====================================================
+# Return Model
+# =====================================================
+def build_model(values, cash, returns, method="normal", step_days=STEP_DAYS, risk_free=0.0, target=None):
+    """Everything a worker needs to simulate paths, as plain arrays.
+
+    values are the USD holdings (N,), returns the (T, N) daily simple returns
+    of the same tickers. "normal" draws correlated multivariate-normal log
+    returns per step through the Cholesky factor of the step covariance;
+    "bootstrap" resamples whole step-length blocks of history, which keeps
+    each day's cross-asset moves (and fat tails) together.
+    """
+    if method not in METHODS:
+        raise ProjectionError(f"Method must be one of: {', '.join(METHODS)}.")
+    values = np.asarray(values, dtype=float)
+    held = values > 0
+    logs = np.log1p(np.asarray(returns, dtype=float)[:, held])
+    if not 1 <= step_days <= TRADING_DAYS:
+        raise ProjectionError(f"Step must be between 1 and {TRADING_DAYS} trading days.")
+
+    model = {
+        "method": method,
+        "step_days": step_days,
+        "log_values": np.log(values[held]),
+        "cash": float(cash),
+        "cash_growth": math.log1p(risk_free) * step_days / TRADING_DAYS,
+        "start": float(values[held].sum() + cash),
+        "target": float(target) if target else None,
+    }
+    if method == "normal":
+        covariance = np.atleast_2d(np.cov(logs.T)) * step_days
+        covariance += np.eye(len(covariance)) * 1e-12 * max(np.trace(covariance), 1e-12)
+        try:
+            model["factor"] = np.linalg.cholesky(covariance)
+        except np.linalg.LinAlgError:
+            raise ProjectionError("Return covariance is not positive definite.")
+        model["drift"] = logs.mean(axis=0) * step_days
+    else:
+        if len(logs) < 2 * step_days:
+            raise ProjectionError(f"Bootstrap needs at least {2 * step_days} days of history.")
+        running = np.vstack([np.zeros((1, logs.shape[1])), np.cumsum(logs, axis=0)])
+        model["blocks"] = running[step_days:] - running[:-step_days]  # every overlapping step-length block
+    return model
+
+
+# =====================================================
+# Simulation (one chunk of paths)
+# =====================================================
+def _simulate_chunk(model, seed, paths, steps):
+    """Histogram of log(total / start) per step, plus per-step tallies, for one chunk.
+
+    Everything returned is a count or a sum, so chunks merge by addition and
+    the result does not depend on how they are spread across processes.
+    """
+    rng = np.random.default_rng(seed)
+    low, high = LOG_RANGE
+    width = (high - low) / BINS
+    counts = np.zeros((steps, BINS), dtype=np.int64)
+    tallies = {key: np.zeros(steps) for key in ("total", "loss", "above", "hit")}
+
+    log_values = np.broadcast_to(model["log_values"], (paths, len(model["log_values"]))).copy()
+    reached = np.zeros(paths, dtype=bool)
+    for step in range(steps):
+        if model["method"] == "normal":
+            log_values += model["drift"] + rng.standard_normal(log_values.shape) @ model["factor"].T
+        else:
+            log_values += model["blocks"][rng.integers(0, len(model["blocks"]), paths)]
+        total = np.exp(log_values).sum(axis=1) + model["cash"] * math.exp(model["cash_growth"] * (step + 1))
+
+        ratio = np.log(np.maximum(total, 1e-300) / model["start"])
+        counts[step] = np.bincount(np.clip(((ratio - low) / width).astype(np.int64), 0, BINS - 1), minlength=BINS)
+        tallies["total"][step] = total.sum()
+        tallies["loss"][step] = (total < model["start"]).sum()
+        if model["target"]:
+            above = total >= model["target"]
+            reached |= above
+            tallies["above"][step] = above.sum()
+            tallies["hit"][step] = reached.sum()
+    return counts, tallies
+
+
+def _simulate_batch(model, seeds, sizes, steps):
+    """Run consecutive chunks in one task: summed histogram counts plus each chunk's tallies.
+
+    Counts are integers, so summing them here is exact; the float tallies go
+    back per chunk and are added in chunk order by the caller.
+    """
+    counts = None
+    tallies = []
+    for seed, paths in zip(seeds, sizes):
+        chunk_counts, chunk_tallies = _simulate_chunk(model, seed, paths, steps)
+        counts = chunk_counts if counts is None else counts + chunk_counts
+        tallies.append(chunk_tallies)
+    return counts, tallies
+
+
+# =====================================================
+# Shared Process Pool
+# =====================================================
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def _shared_pool():
+    """One pool per process, started on first use and reused by every projection.
+
+    Concurrent projections queue their batches on the same workers instead of
+    each starting a pool of its own, so CPU use stays at one process per core.
+    Workers are spawned rather than forked, so they never inherit a lock held
+    by another request thread at the moment the pool starts.
+    """
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ProcessPoolExecutor(max_workers=os.cpu_count() or 1, mp_context=multiprocessing.get_context("spawn"))
+        return _POOL
+
+
+# =====================================================
+# Projection
+# =====================================================
+def _quantiles(counts, start, percentiles):
+    """Values at each percentile from per-step histograms (linear within a bin)."""
+    low, high = LOG_RANGE
+    width = (high - low) / BINS
+    cumulative = np.cumsum(counts, axis=1)
+    total = cumulative[:, -1:]
+    result = {}
+    for p in percentiles:
+        rank = total[:, 0] * p / 100.0
+        index = np.minimum((cumulative < rank[:, None]).sum(axis=1), BINS - 1)
+        before = np.where(index > 0, cumulative[np.arange(len(index)), index - 1], 0)
+        inside = counts[np.arange(len(index)), index]
+        fraction = np.divide(rank - before, inside, out=np.full(len(index), 0.5), where=inside > 0)
+        result[p] = start * np.exp(low + (index + np.clip(fraction, 0.0, 1.0)) * width)
+    return result
+
+
+def project(model, horizons=HORIZONS, paths=DEFAULT_PATHS, seed=None, workers=None, percentiles=PERCENTILES,
+            max_paths=MAX_PATHS, max_steps=None):
+    """Percentile fan, mean and target probabilities at each horizon (years) over `paths` paths.
+
+    Paths are generated in CHUNK_PATHS chunks, each seeded by its own child
+    of one SeedSequence, so the same seed reproduces the same result with
+    any number of workers. workers is how many batches the chunks are split
+    into on the shared pool (1 runs inline). max_steps bounds the simulated
+    steps, and with them the (steps x BINS) histogram every chunk allocates.
+    """
+    horizons = sorted({float(h) for h in horizons})
+    if not horizons or horizons[0] <= 0 or horizons[-1] > MAX_YEARS:
+        raise ProjectionError(f"Horizons must be between 0 and {MAX_YEARS} years.")
+    if not 1 <= paths <= max_paths:
+        raise ProjectionError(f"Paths must be between 1 and {max_paths}.")
+    if any(not 0 < p < 100 for p in percentiles):
+        raise ProjectionError("Percentiles must be between 0 and 100.")
+
+    steps_per_year = TRADING_DAYS / model["step_days"]
+    steps = max(1, math.ceil(horizons[-1] * steps_per_year))
+    if max_steps and steps > max_steps:
+        raise ProjectionError(
+            f"{steps} steps of {model['step_days']} trading days exceed the limit of {max_steps}; "
+            "use fewer years or a longer step."
+        )
+    sequence = np.random.SeedSequence(seed)
+    sizes = [min(CHUNK_PATHS, paths - start) for start in range(0, paths, CHUNK_PATHS)]
+    seeds = sequence.spawn(len(sizes))
+
+    workers = min(workers or os.cpu_count() or 1, len(sizes))
+    if workers == 1:
+        batches = [_simulate_batch(model, seeds, sizes, steps)]
+    else:
+        # Contiguous batches, so the model is sent once per batch rather than once per chunk
+        bounds = np.linspace(0, len(sizes), workers + 1).astype(int)
+        futures = [
+            _shared_pool().submit(_simulate_batch, model, seeds[a:b], sizes[a:b], steps)
+            for a, b in zip(bounds[:-1], bounds[1:])
+        ]
+        batches = [future.result() for future in futures]
+
+    counts = sum(batch[0] for batch in batches)
+    chunk_tallies = [tally for batch in batches for tally in batch[1]]
+    tallies = {key: sum(tally[key] for tally in chunk_tallies) / paths for key in chunk_tallies[0]}
+    quantiles = _quantiles(counts, model["start"], percentiles)
+    clipped = (counts[:, 0] + counts[:, -1]) / paths  # share of paths at the histogram edges
+
+    def at(step):
+        point = {
+            "percentiles": {f"{p:g}": float(quantiles[p][step]) for p in percentiles},
+            "mean": float(tallies["total"][step]),
+            "probability_of_loss": float(tallies["loss"][step]),
+        }
+        if model["target"]:
+            point["probability_above_target"] = float(tallies["above"][step])
+            point["probability_hit_target"] = float(tallies["hit"][step])
+        return point
+
+    return {
+        "start_value": model["start"],
+        "method": model["method"],
+        "paths": paths,
+        "seed": sequence.entropy,
+        "step_days": model["step_days"],
+        "horizons": [{"years": h, **at(min(steps, max(1, round(h * steps_per_year))) - 1)} for h in horizons],
+        "fan": {
+            "years": [round((step + 1) / steps_per_year, 4) for step in range(steps)],
+            **{f"p{p:g}": quantiles[p].tolist() for p in percentiles},
+        },
+        "edge_share": float(clipped.max()),  # percentiles there are only bounds
+    }
@@ -0,0 +1,298 @@
+import numpy as np
+
+# Custom modules
+from helpers.backtest import TRADING_DAYS
+
+FRONTIER_POINTS = 50
+MAX_FRONTIER_POINTS = 500
+MAX_ITERATIONS = 100  # Active-set changes per solve
+INVERSE_CACHE_SIZE = 512  # Free-set inverses kept per problem
+SHARPE_STEPS = 40  # Golden-section refinements between frontier points
+TOLERANCE = 1e-10
+
+
+class OptimizerError(ValueError):
+    """Infeasible constraints or a problem the solver cannot finish."""
+
+
+# =====================================================
+# Mean-Variance Problem
+# =====================================================
+class MeanVariance:
+    """Long-only mean-variance problem with a per-asset cap and a cash reserve.
+
+    Weights satisfy 0 <= w <= max_weight and sum(w) = 1 - min_cash; the
+    reserve earns risk_free. mean and covariance are annualized. Each
+    active-set iteration solves the equality-constrained problem on the free
+    assets with the inverse of that covariance block. Inverses are cached per
+    free set, and every frontier point starts from the one before, so tracing
+    a frontier mostly reuses factorizations already made.
+    """
+
+    def __init__(self, mean, covariance, max_weight=1.0, min_cash=0.0, risk_free=0.0):
+        self.mean = np.asarray(mean, dtype=float)
+        covariance = np.asarray(covariance, dtype=float)
+        count = len(self.mean)
+        if count < 1 or covariance.shape != (count, count):
+            raise OptimizerError("Need a mean vector and a matching covariance matrix.")
+        if not 0 <= min_cash < 1:
+            raise OptimizerError("Cash reserve must be between 0 and 1.")
+        if not 0 < max_weight <= 1:
+            raise OptimizerError("Weight cap must be between 0 and 1.")
+        self.budget = 1.0 - min_cash
+        if max_weight * count < self.budget - TOLERANCE:
+            raise OptimizerError(f"A {max_weight:g} cap on {count} assets cannot invest {self.budget:.0%}.")
+
+        # A tiny ridge keeps near-singular sample covariances factorizable
+        self.covariance = covariance + np.eye(count) * 1e-10 * max(np.trace(covariance) / count, 1e-12)
+        self.upper = np.full(count, float(max_weight))
+        self.risk_free = float(risk_free)
+        self.cash = min_cash
+        self._inverses = {}
+        self._last = None
+        self.solves = 0
+        self.factorizations = 0
+
+    # ----- linear algebra -----
+    def _factorize(self, index):
+        try:
+            factor = np.linalg.cholesky(self.covariance[np.ix_(index, index)])
+        except np.linalg.LinAlgError:
+            raise OptimizerError("Covariance matrix is not positive definite.")
+        solved = np.linalg.solve(factor, np.eye(len(index)))
+        self.factorizations += 1
+        return solved.T @ solved
+
+    def _inverse(self, free):
+        """(asset order, inverse covariance block) for the free assets.
+
+        Active-set iterations change the free set one asset at a time, so
+        the previous inverse is bordered or deflated (an O(F^2) update) and a
+        full Cholesky factorization is only needed for a cold start.
+        """
+        key = free.tobytes()
+        cached = self._inverses.get(key)
+        if cached is not None:
+            self._last = (free.copy(), *cached)
+            return cached
+
+        wanted = np.flatnonzero(free)
+        if self._last:
+            mask, index, inverse = self._last
+            changed = np.flatnonzero(mask != free)
+            if len(changed) == 1 and free[changed[0]]:
+                added = changed[0]
+                column = self.covariance[index, added]
+                projected = inverse @ column
+                schur = self.covariance[added, added] - column @ projected
+                if schur > TOLERANCE * self.covariance[added, added]:
+                    inverse = np.block([
+                        [inverse + np.outer(projected, projected) / schur, -projected[:, None] / schur],
+                        [-projected[None, :] / schur, np.array([[1.0 / schur]])],
+                    ])
+                    return self._remember(key, free, np.append(index, added), inverse)
+            elif len(changed) == 1 and len(index) > 1:
+                j = int(np.flatnonzero(index == changed[0])[0])
+                keep = np.arange(len(index)) != j
+                inverse = inverse[np.ix_(keep, keep)] - np.outer(inverse[keep, j], inverse[j, keep]) / inverse[j, j]
+                return self._remember(key, free, index[keep], inverse)
+        return self._remember(key, free, wanted, self._factorize(wanted))
+
+    def _remember(self, key, free, index, inverse):
+        if len(self._inverses) >= INVERSE_CACHE_SIZE:
+            self._inverses.clear()
+        self._last = (free.copy(), index, inverse)
+        self._inverses[key] = (index, inverse)
+        return index, inverse
+
+    def _step(self, rows, weights, free):
+        """Equality-constrained Newton step on the free assets, and the constraint multipliers."""
+        gradient = self.covariance @ weights
+        step = np.zeros_like(weights)
+        multipliers = np.zeros(len(rows))
+        if free.sum() > len(rows):  # otherwise the equality rows pin every free asset
+            index, inverse = self._inverse(free)
+            active = rows[:, index]
+            scaled = active @ inverse
+            multipliers = np.linalg.lstsq(scaled @ active.T, -scaled @ gradient[index], rcond=None)[0]
+            step[index] = -inverse @ (gradient[index] + active.T @ multipliers)
+        if free.any() and np.abs(step).max() <= TOLERANCE:
+            step[:] = 0.0
+            multipliers = np.linalg.lstsq(rows[:, free].T, -gradient[free], rcond=None)[0]
+        return step, gradient + rows.T @ multipliers
+
+    def solve(self, target=None, start=None):
+        """Minimum-variance weights, optionally at a target return, from a feasible start.
+
+        Primal active-set method: assets in the working set stay at their
+        bound; each iteration steps the free ones toward the constrained
+        optimum, stopping at the first bound it hits, or releases the bound
+        whose multiplier has the wrong sign.
+        """
+        rows = np.ones((1, len(self.mean)))
+        if target is not None:
+            rows = np.vstack([rows, self.mean])
+        weights = self.feasible(target) if start is None else np.array(start, dtype=float)
+        at_lower = weights <= TOLERANCE
+        at_upper = ~at_lower & (weights >= self.upper - TOLERANCE)
+
+        for _ in range(MAX_ITERATIONS + 4 * len(weights)):
+            self.solves += 1
+            free = ~(at_lower | at_upper)
+            step, gradient = self._step(rows, weights, free)
+            if not step.any():
+                violated = np.where(at_lower, np.minimum(gradient, 0.0), 0.0) - np.where(
+                    at_upper, np.maximum(gradient, 0.0), 0.0
+                )
+                worst = int(np.argmin(violated))
+                if violated[worst] >= -TOLERANCE:
+                    return np.clip(weights, 0.0, self.upper)
+                at_lower[worst] = at_upper[worst] = False
+                continue
+
+            # Longest step (up to the full one) that keeps every free asset within its bounds
+            with np.errstate(divide="ignore", invalid="ignore"):
+                room = np.where(step < 0, -weights / step, np.where(step > 0, (self.upper - weights) / step, np.inf))
+            room[~free] = np.inf
+            blocking = int(np.argmin(room))
+            length = min(1.0, room[blocking])
+            weights = weights + length * step
+            if length < 1.0:
+                if step[blocking] < 0:
+                    weights[blocking], at_lower[blocking] = 0.0, True
+                else:
+                    weights[blocking], at_upper[blocking] = self.upper[blocking], True
+        raise OptimizerError("Optimizer did not converge.")
+
+    def _extreme(self, highest):
+        """Feasible weights with the lowest or highest expected return (fill caps greedily)."""
+        weights, left = np.zeros(len(self.mean)), self.budget
+        order = np.argsort(self.mean)
+        for i in order[::-1] if highest else order:
+            weights[i] = min(self.upper[i], left)
+            left -= weights[i]
+        return weights
+
+    def feasible(self, target=None, near=None):
+        """A feasible starting point at target, as close to near as a straight line allows.
+
+        Moving from a feasible portfolio toward the lowest- or highest-return
+        extreme stays feasible, so the previous frontier point plus a short
+        move is a warm start for the next one.
+        """
+        if near is None:
+            near = np.minimum(np.full(len(self.mean), self.budget / len(self.mean)), self.upper)
+            near = near if abs(near.sum() - self.budget) <= TOLERANCE else self._extreme(True)
+        if target is None:
+            return near
+        target -= self.risk_free * self.cash
+        current = self.mean @ near
+        extreme = self._extreme(target > current)
+        span = self.mean @ extreme - current
+        share = (target - current) / span if abs(span) > TOLERANCE else 0.0
+        if not -TOLERANCE <= share <= 1 + TOLERANCE:
+            raise OptimizerError("Target return is not reachable under these constraints.")
+        return near + min(max(share, 0.0), 1.0) * (extreme - near)
+
+    # ----- portfolios -----
+    def describe(self, weights):
+        expected = float(self.mean @ weights + self.risk_free * self.cash)
+        volatility = float(np.sqrt(max(weights @ self.covariance @ weights, 0.0)))
+        return {
+            "expected_return": expected,
+            "volatility": volatility,
+            "sharpe": (expected - self.risk_free) / volatility if volatility > 0 else 0.0,
+            "cash": self.cash,
+            "weights": weights.tolist(),
+        }
+
+    def return_range(self):
+        """Lowest and highest expected return any feasible portfolio reaches."""
+        cash = self.risk_free * self.cash
+        return float(self.mean @ self._extreme(False) + cash), float(self.mean @ self._extreme(True) + cash)
+
+    def min_variance(self):
+        return self.solve()
+
+    def target_return(self, target, near=None):
+        low, high = self.return_range()
+        if not low - TOLERANCE <= target <= high + TOLERANCE:
+            raise OptimizerError(f"Target return must be between {low:.2%} and {high:.2%} with these constraints.")
+        target = min(max(target, low), high)
+        return self.solve(target, self.feasible(target, near))
+
+    def frontier(self, points=FRONTIER_POINTS):
+        """Efficient portfolios from minimum variance up to the highest reachable return.
+
+        Returns (targets, weights (points, N)); each point starts from the one before.
+        """
+        weights = self.min_variance()
+        low = float(self.mean @ weights + self.risk_free * self.cash)
+        high = self.return_range()[1]
+        targets = np.linspace(low, high, points) if high > low + TOLERANCE else np.array([low])
+        frontier = [weights]
+        for target in targets[1:]:
+            frontier.append(self.target_return(target, frontier[-1]))
+        return targets, np.array(frontier)
+
+    def max_sharpe(self, targets, frontier):
+        """Refine the best frontier point by golden-section search on the target return."""
+        sharpe = [self.describe(w)["sharpe"] for w in frontier]
+        best = int(np.argmax(sharpe))
+        if len(targets) < 3:
+            return frontier[best]
+        low, high = targets[max(best - 1, 0)], targets[min(best + 1, len(targets) - 1)]
+        ratio = (np.sqrt(5) - 1) / 2
+        result = [frontier[best], sharpe[best]]
+
+        def score(target):
+            weights = self.target_return(target, result[0])
+            value = self.describe(weights)["sharpe"]
+            if value > result[1]:
+                result[:] = weights, value
+            return value
+
+        a, b = high - ratio * (high - low), low + ratio * (high - low)
+        fa, fb = score(a), score(b)
+        for _ in range(SHARPE_STEPS):
+            if fa < fb:
+                low, a, fa = a, b, fb
+                b = low + ratio * (high - low)
+                fb = score(b)
+            else:
+                high, b, fb = b, a, fa
+                a = high - ratio * (high - low)
+                fa = score(a)
+        return result[0]
+
+
+# =====================================================
+# Strategy Optimization
+# =====================================================
+def optimize(tickers, mean, covariance, max_weight=1.0, min_cash=0.0, risk_free=0.0, target_return=None,
+             points=FRONTIER_POINTS):
+    """Minimum-variance, maximum-Sharpe, optional target-return portfolios and the frontier.
+
+    mean and covariance are daily (as from the covariance cache) and are
+    annualized here.
+    """
+    if not 2 <= points <= MAX_FRONTIER_POINTS:
+        raise OptimizerError(f"Frontier points must be between 2 and {MAX_FRONTIER_POINTS}.")
+    problem = MeanVariance(np.asarray(mean) * TRADING_DAYS, np.asarray(covariance) * TRADING_DAYS,
+                           max_weight, min_cash, risk_free)
+    targets, frontier = problem.frontier(points)
+
+    result = {
+        "tickers": list(tickers),
+        "min_variance": problem.describe(frontier[0]),
+        "max_sharpe": problem.describe(problem.max_sharpe(targets, frontier)),
+        "frontier": [
+            {key: value for key, value in problem.describe(weights).items() if key != "cash"}
+            for weights in frontier
+        ],
+    }
+    if target_return is not None:
+        weights = problem.target_return(float(target_return))
+        result["target_return"] = problem.describe(weights)
+    result["solver"] = {"solves": problem.solves, "factorizations": problem.factorizations}
+    return result
@@ -0,0 +1,302 @@
+import json
+import os
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+
+# Custom modules
+from helpers.api import get_provider, ticker_currencies
+
+PRICE_STORE_DIR = os.getenv("PRICE_STORE_DIR", "price_store")
+BASE_DATE = "2000-01-03"  # Day 0 of the business-day axis (a Monday)
+FIELDS = ("open", "high", "low", "close", "volume")
+INITIAL_TICKERS = 64  # Row capacity of a new store; doubled whenever it fills
+DAY_HEADROOM = 520  # Extra business days (~2 years) allocated past the last needed day
+HISTORY_BATCH = 50  # Tickers per upstream history download
+
+
+class PriceStoreError(ValueError):
+    """Unknown ticker, bad date range or an incompatible store on disk."""
+
+
+def fx_symbol(currency):
+    """Yahoo symbol quoting one USD in currency (same pairs as helpers.api)."""
+    return f"USD{currency}=X"
+
+
+def forward_fill(values):
+    """Carry the last valid value along each row (axis 1); returns a copy."""
+    values = np.array(values, dtype=float)
+    valid = ~np.isnan(values)
+    last = np.maximum.accumulate(np.where(valid, np.arange(values.shape[1]), -1), axis=1)
+    filled = np.take_along_axis(values, np.maximum(last, 0), axis=1)
+    filled[last < 0] = np.nan
+    return filled
+
+
+# =====================================================
+# Price Store
+# =====================================================
+class PriceStore:
+    """Daily OHLCV bars on disk, one memory-mapped (tickers x business days) .npy per field.
+
+    Rows are tickers (in the order they were first stored) and columns are
+    Monday-Friday days counted from BASE_DATE, so a ticker x date window is a
+    plain slice of the mapped file. index.json keeps the row order, each
+    ticker's currency and the day range already fetched, which is what lets
+    refresh() download only the missing ends. Prices are stored in the
+    ticker's local currency; window(currency="USD") converts with the stored
+    USD FX pairs.
+    """
+
+    def __init__(self, path=PRICE_STORE_DIR, base=BASE_DATE):
+        self.path = path
+        self.base = np.datetime64(base, "D")
+        self._lock = threading.RLock()
+        self._arrays = {}
+        self._loaded = None
+        self._load_index()
+
+    # ----- index -----
+    def _index_path(self):
+        return os.path.join(self.path, "index.json")
+
+    def _load_index(self):
+        try:
+            with open(self._index_path()) as f:
+                index = json.load(f)
+            self._loaded = os.stat(self._index_path()).st_mtime_ns
+        except FileNotFoundError:
+            index = {"base": str(self.base), "capacity": [0, 0], "tickers": [], "currency": {}, "coverage": {}}
+        if index["base"] != str(self.base):
+            raise PriceStoreError(f"Store at {self.path} starts on {index['base']}, not {self.base}.")
+        self._index = index
+        self._rows = {ticker: i for i, ticker in enumerate(index["tickers"])}
+        self._arrays.clear()
+
+    def _save_index(self):
+        os.makedirs(self.path, exist_ok=True)
+        temp = self._index_path() + ".tmp"
+        with open(temp, "w") as f:
+            json.dump(self._index, f)
+        os.replace(temp, self._index_path())
+        self._loaded = os.stat(self._index_path()).st_mtime_ns
+
+    def _sync(self):
+        """Pick up a refresh made by another process (index.json replaced)."""
+        try:
+            changed = os.stat(self._index_path()).st_mtime_ns != self._loaded
+        except FileNotFoundError:
+            changed = False
+        if changed:
+            self._load_index()
+
+    # ----- calendar -----
+    def day(self, value):
+        """Index of the first business day on or after value."""
+        return int(np.busday_count(self.base, np.datetime64(value, "D")))
+
+    def last_day(self, value):
+        """Index of the last business day on or before value."""
+        return int(np.busday_count(self.base, np.datetime64(value, "D") + 1)) - 1
+
+    def dates(self, first, last):
+        return np.busday_offset(self.base, np.arange(first, last + 1), roll="forward")
+
+    # ----- storage -----
+    def _file(self, field):
+        return os.path.join(self.path, f"{field}.npy")
+
+    def _array(self, field):
+        array = self._arrays.get(field)
+        if array is None:
+            array = self._arrays[field] = np.load(self._file(field), mmap_mode="r+")
+        return array
+
+    def _ensure_capacity(self, tickers, days):
+        rows, columns = self._index["capacity"]
+        if tickers <= rows and days <= columns:
+            return
+        shape = (
+            max(tickers, rows * 2, INITIAL_TICKERS) if tickers > rows else rows,
+            days + DAY_HEADROOM if days > columns else columns,
+        )
+        os.makedirs(self.path, exist_ok=True)
+        for field in FIELDS:
+            temp = self._file(field) + ".tmp"
+            grown = np.lib.format.open_memmap(temp, mode="w+", dtype=np.float64, shape=shape)
+            grown[:] = np.nan
+            if rows and columns:
+                grown[:rows, :columns] = self._array(field)
+            grown.flush()
+            del grown
+            os.replace(temp, self._file(field))
+        self._arrays.clear()
+        self._index["capacity"] = list(shape)
+
+    def _row(self, ticker):
+        row = self._rows.get(ticker)
+        if row is None:
+            row = self._rows[ticker] = len(self._index["tickers"])
+            self._index["tickers"].append(ticker)
+        return row
+
+    def _write(self, symbol, bars):
+        dates = np.array(bars["dates"], dtype="datetime64[D]")
+        keep = np.is_busday(dates)
+        if not keep.any():
+            return 0
+        columns = np.busday_count(self.base, dates[keep])
+        if columns.min() < 0:
+            raise PriceStoreError(f"Prices before {self.base} are outside the store.")
+        row = self._row(symbol)
+        self._ensure_capacity(row + 1, int(columns.max()) + 1)
+        for field in FIELDS:
+            if field in bars:
+                self._array(field)[row, columns] = np.asarray(bars[field], dtype=float)[keep]
+        return int(keep.sum())
+
+    # ----- coverage -----
+    def coverage(self, ticker):
+        """(first, last) day indices already fetched for ticker, or None."""
+        span = self._index["coverage"].get(ticker)
+        return tuple(span) if span else None
+
+    def missing(self, ticker, first, last):
+        """Day ranges in [first, last] that have never been fetched for ticker."""
+        span = self.coverage(ticker)
+        if span is None:
+            return [(first, last)]
+        gaps = []
+        if first < span[0]:
+            gaps.append((first, span[0] - 1))
+        if last > span[1]:
+            gaps.append((span[1] + 1, last))
+        return gaps
+
+    def _cover(self, ticker, first, last):
+        span = self.coverage(ticker)
+        if span:
+            first, last = min(first, span[0]), max(last, span[1])
+        self._index["coverage"][ticker] = [first, last]
+
+    # ----- refresh -----
+    def refresh(self, tickers, start, end=None, provider=None):
+        """Download only the missing days of [start, end] for tickers and their FX pairs.
+
+        Tickers with the same gap share one history() call per HISTORY_BATCH
+        symbols, so a daily refresh of every holding is one or two downloads.
+        Today's bar is stored but not marked as fetched, so its final close
+        replaces it on the next refresh.
+        """
+        provider = provider or get_provider()
+        end = end or date.today().isoformat()
+        first, last = self.day(start), self.last_day(end)
+        if last < first:
+            raise PriceStoreError("End date is before start date.")
+        settled = self.last_day(date.today() - timedelta(days=1))
+
+        with self._lock:
+            self._sync()
+            tickers = list(dict.fromkeys(tickers))
+            unknown = [t for t in tickers if t not in self._index["currency"]]
+            if unknown:
+                self._index["currency"].update(ticker_currencies(unknown))
+            currencies = {self._index["currency"].get(t) for t in tickers} - {None, "USD"}
+            symbols = tickers + [fx_symbol(c) for c in sorted(currencies)]
+
+            groups = {}
+            for symbol in symbols:
+                for gap in self.missing(symbol, first, last):
+                    groups.setdefault(gap, []).append(symbol)
+
+            downloads = rows = 0
+            for (gap_first, gap_last), group in sorted(groups.items()):
+                start_date = str(self.dates(gap_first, gap_first)[0])
+                end_date = str(self.dates(gap_last, gap_last)[0])
+                for i in range(0, len(group), HISTORY_BATCH):
+                    batch = group[i:i + HISTORY_BATCH]
+                    bars = provider.history(batch, start_date, end_date)
+                    downloads += 1
+                    for symbol, symbol_bars in bars.items():
+                        rows += self._write(symbol, symbol_bars)
+                    if gap_first <= min(gap_last, settled):
+                        for symbol in batch:
+                            self._row(symbol)
+                            self._cover(symbol, gap_first, min(gap_last, settled))
+
+            for array in self._arrays.values():
+                array.flush()
+            self._save_index()
+
+        return {"symbols": len(symbols), "downloads": downloads, "rows": rows, "up_to_date": len(symbols) - len({s for g in groups.values() for s in g})}
+
+    # ----- reads -----
+    def tickers(self):
+        self._sync()
+        return list(self._index["tickers"])
+
+    def currency(self, ticker):
+        return self._index["currency"].get(ticker)
+
+    def window(self, tickers=None, start=None, end=None, field="close", currency=None):
+        """(values, tickers, dates) for a ticker x business-day window.
+
+        values has one row per ticker and one column per day. It is a view of
+        the mapped file (no copy) when tickers is None or a run of adjacent
+        rows; any other ticker selection, and USD conversion, copies just the
+        window. Missing days are NaN.
+        """
+        if field not in FIELDS:
+            raise PriceStoreError(f"Field must be one of: {', '.join(FIELDS)}.")
+        with self._lock:
+            self._sync()
+            if not self._index["tickers"]:
+                raise PriceStoreError("The price store is empty; run a refresh first.")
+
+            if tickers is None:
+                tickers = list(self._index["tickers"])
+                rows = slice(0, len(tickers))
+            else:
+                missing = [t for t in tickers if t not in self._rows]
+                if missing:
+                    raise PriceStoreError(f"No stored prices for {', '.join(missing)}.")
+                index = [self._rows[t] for t in tickers]
+                contiguous = index == list(range(index[0], index[0] + len(index)))
+                rows = slice(index[0], index[0] + len(index)) if contiguous else index
+
+            spans = [self.coverage(t) for t in tickers if self.coverage(t)]
+            first = self.day(start) if start else min((s[0] for s in spans), default=0)
+            last = self.last_day(end) if end else min(
+                max((s[1] for s in spans), default=0) + 1, self.last_day(date.today())
+            )
+            last = min(last, self._index["capacity"][1] - 1)
+            if last < first:
+                raise PriceStoreError("Empty date range.")
+
+            values = self._array(field)[rows, first:last + 1]
+            if currency == "USD":
+                values = self._to_usd(values, tickers, first, last)
+            return values, list(tickers), self.dates(first, last)
+
+    def _to_usd(self, values, tickers, first, last):
+        values = np.array(values, dtype=float)
+        close = self._array("close")
+        groups = {}
+        for i, ticker in enumerate(tickers):
+            if not ticker.endswith("=X"):  # FX pairs themselves stay as rates
+                groups.setdefault(self.currency(ticker), []).append(i)
+        for currency, rows in groups.items():
+            if currency == "USD":
+                continue
+            pair = fx_symbol(currency) if currency else None
+            if pair not in self._rows:
+                names = ", ".join(tickers[i] for i in rows)
+                raise PriceStoreError(f"Cannot convert {names} to USD: no FX history for {currency or 'unknown currency'}.")
+            rate = forward_fill(close[self._rows[pair], first:last + 1][None, :])[0]
+            values[rows] /= rate
+        return values
+
+
+STORE = PriceStore()
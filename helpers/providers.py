@@ -0,0 +1,263 @@
+import atexit
+import json
+import os
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+
+import numpy as np
+import yfinance as yf
+
+HISTORY_FIELDS = {"open": "Open", "high": "High", "low": "Low", "close": "Close", "volume": "Volume"}
+
+
+# =====================================================
+# Provider Interface
+# =====================================================
+class QuoteProvider:
+    """Upstream market data used by helpers.api.
+
+    info(ticker)     -> dict shaped like yfinance's Ticker.info (at least
+                        "exchange", "regularMarketPrice", "previousClose")
+    closes(symbols)  -> {symbol: [daily closes, oldest first]} for the last
+                        few sessions; symbols without data are omitted
+    history(symbols, start, end)
+                     -> {symbol: {"dates": ["YYYY-MM-DD", ...], "open": [...],
+                        "high": [...], "low": [...], "close": [...], "volume": [...]}}
+                        daily bars from start to end inclusive, in local currency
+    """
+
+    name = "base"
+
+    def info(self, ticker):
+        raise NotImplementedError
+
+    def closes(self, symbols):
+        raise NotImplementedError
+
+    def history(self, symbols, start, end):
+        raise NotImplementedError
+
+
+# =====================================================
+# YFinance Provider
+# =====================================================
+class YFinanceProvider(QuoteProvider):
+    name = "yfinance"
+
+    def info(self, ticker):
+        return yf.Ticker(ticker).info or {}
+
+    def closes(self, symbols):
+        symbols = list(symbols)
+        data = yf.download(symbols, period="5d", interval="1d", progress=False, threads=True, auto_adjust=False)
+        frame = data["Close"]
+        if not hasattr(frame, "columns"):  # single symbol comes back as a Series
+            frame = frame.to_frame(symbols[0])
+
+        closes = {}
+        for symbol in symbols:
+            if symbol in frame.columns:
+                column = frame[symbol].dropna()
+                if not column.empty:
+                    closes[symbol] = [float(value) for value in column]
+        return closes
+
+    def history(self, symbols, start, end):
+        symbols = list(symbols)
+        # yfinance's end date is exclusive
+        stop = (datetime.strptime(end, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+        data = yf.download(
+            symbols, start=start, end=stop, interval="1d", progress=False, threads=True,
+            auto_adjust=False, group_by="column",
+        )
+        if data is None or data.empty:
+            return {}
+
+        history = {}
+        for symbol in symbols:
+            columns = {}
+            for field, name in HISTORY_FIELDS.items():
+                frame = data[name]
+                if hasattr(frame, "columns"):
+                    if symbol not in frame.columns:
+                        break
+                    frame = frame[symbol]
+                columns[field] = frame
+            else:
+                close = columns["close"].dropna()
+                if close.empty:
+                    continue
+                rows = close.index
+                history[symbol] = {"dates": [d.strftime("%Y-%m-%d") for d in rows]}
+                for field, series in columns.items():
+                    history[symbol][field] = [float(value) for value in series.loc[rows]]
+        return history
+
+
+# =====================================================
+# Fixture Provider (offline replay)
+# =====================================================
+class FixtureProvider(QuoteProvider):
+    """Replay recorded responses from a JSON file, with optional simulated latency.
+
+    File format: {"info": {ticker: {...}}, "closes": {symbol: [float, ...]},
+                  "history": {symbol: {"dates": [...], "close": [...], ...}}}
+    """
+
+    name = "fixture"
+
+    def __init__(self, path=None, latency=0.0, data=None):
+        self.path = path
+        self.latency = latency  # seconds added to every upstream call
+        if data is None:
+            with open(path) as f:
+                data = json.load(f)
+        self.data = {"info": data.get("info", {}), "closes": data.get("closes", {}), "history": data.get("history", {})}
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def info(self, ticker):
+        self._wait()
+        return dict(self.data["info"].get(ticker, {}))
+
+    def closes(self, symbols):
+        self._wait()
+        recorded = self.data["closes"]
+        return {symbol: list(recorded[symbol]) for symbol in symbols if recorded.get(symbol)}
+
+    def history(self, symbols, start, end):
+        self._wait()
+        history = {}
+        for symbol in symbols:
+            recorded = self.data["history"].get(symbol)
+            if not recorded:
+                continue
+            rows = [i for i, date in enumerate(recorded["dates"]) if start <= date <= end]
+            if rows:
+                history[symbol] = {key: [values[i] for i in rows] for key, values in recorded.items()}
+        return history
+
+
+# =====================================================
+# Synthetic Provider (offline, any symbol)
+# =====================================================
+class SyntheticProvider(QuoteProvider):
+    """Deterministic made-up quotes for any symbol, for benchmarks and load tests.
+
+    Every ticker trades on NASDAQ in USD at a price derived from its name;
+    history is a seeded random walk, so repeated runs see identical data.
+    """
+
+    name = "synthetic"
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    @staticmethod
+    def _price(symbol):
+        return 10.0 + zlib.crc32(symbol.encode()) % 49000 / 100.0
+
+    def info(self, ticker):
+        self._wait()
+        price = self._price(ticker)
+        return {"exchange": "NMS", "currency": "USD", "regularMarketPrice": price, "previousClose": round(price * 0.99, 2)}
+
+    def closes(self, symbols):
+        self._wait()
+        return {symbol: [round(self._price(symbol) * 0.99, 2), self._price(symbol)] for symbol in symbols}
+
+    def history(self, symbols, start, end):
+        self._wait()
+        dates = np.arange(np.datetime64(start, "D"), np.datetime64(end, "D") + 1)
+        dates = dates[np.is_busday(dates)]
+        history = {}
+        for symbol in symbols:
+            rng = np.random.default_rng(zlib.crc32(symbol.encode()))
+            walk = np.exp(np.cumsum(rng.normal(0.0003, 0.015, len(dates))))
+            close = (self._price(symbol) * walk).round(4).tolist()
+            history[symbol] = {
+                "dates": [str(d) for d in dates],
+                "open": close, "high": close, "low": close, "close": close,
+                "volume": [1e6] * len(dates),
+            }
+        return history
+
+
+# =====================================================
+# Recording Provider
+# =====================================================
+class RecordingProvider(QuoteProvider):
+    """Pass calls through to another provider and capture replies as a fixture file."""
+
+    name = "record"
+
+    def __init__(self, inner, path):
+        self.inner = inner
+        self.path = path
+        self.data = {"info": {}, "closes": {}, "history": {}}
+        self._lock = threading.Lock()
+        atexit.register(self.save)
+
+    def info(self, ticker):
+        info = self.inner.info(ticker)
+        with self._lock:
+            self.data["info"][ticker] = info
+        return info
+
+    def closes(self, symbols):
+        closes = self.inner.closes(symbols)
+        with self._lock:
+            self.data["closes"].update(closes)
+        return closes
+
+    def history(self, symbols, start, end):
+        history = self.inner.history(symbols, start, end)
+        with self._lock:
+            for symbol, bars in history.items():
+                recorded = self.data["history"].setdefault(symbol, {key: [] for key in bars})
+                merged = dict(zip(recorded["dates"], zip(*(recorded[k] for k in bars if k != "dates"))))
+                merged.update(zip(bars["dates"], zip(*(bars[k] for k in bars if k != "dates"))))
+                fields = [k for k in bars if k != "dates"]
+                dates = sorted(merged)
+                recorded["dates"] = dates
+                for i, field in enumerate(fields):
+                    recorded[field] = [merged[d][i] for d in dates]
+        return history
+
+    def save(self):
+        with self._lock:
+            payload = json.dumps(self.data, indent=2, default=str)
+        with open(self.path, "w") as f:
+            f.write(payload)
+
+
+# =====================================================
+# Provider From Environment
+# =====================================================
+def provider_from_env():
+    """Build the provider named by QUOTE_PROVIDER.
+
+    QUOTE_PROVIDER=yfinance (default) | fixture:<path> | record:<path> | synthetic
+    QUOTE_LATENCY_MS adds simulated latency to the fixture and synthetic providers.
+    """
+    spec = os.getenv("QUOTE_PROVIDER", "yfinance")
+    kind, _, path = spec.partition(":")
+
+    if kind == "fixture":
+        latency = float(os.getenv("QUOTE_LATENCY_MS", "0")) / 1000
+        return FixtureProvider(path, latency=latency)
+    if kind == "synthetic":
+        return SyntheticProvider(latency=float(os.getenv("QUOTE_LATENCY_MS", "0")) / 1000)
+    if kind == "record":
+        return RecordingProvider(YFinanceProvider(), path)
+    if kind == "yfinance":
+        return YFinanceProvider()
+    raise ValueError(f"Unknown QUOTE_PROVIDER '{spec}'")
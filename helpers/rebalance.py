@@ -0,0 +1,178 @@
+import numpy as np
+
+# Custom modules
+from helpers.trading import BatchRejected, apply_orders, run_in_write_transaction
+
+SHARE_DECIMALS = 4  # Fractional-share precision when whole_shares is off
+WEIGHT_EPSILON = 1e-9
+
+
+class RebalanceError(ValueError):
+    """Invalid targets or holdings that cannot be priced."""
+
+
+# =====================================================
+# Inputs
+# =====================================================
+def parse_targets(targets):
+    """{strategy_id: {TICKER: weight}} from request JSON, validating each strategy's weights."""
+    if not isinstance(targets, dict) or not targets:
+        raise RebalanceError("Provide target weights per strategy.")
+    parsed = {}
+    for strategy_id, weights in targets.items():
+        try:
+            strategy_id = int(strategy_id)
+            weights = {(t or "").strip().upper(): float(w) for t, w in (weights or {}).items()}
+        except (AttributeError, TypeError, ValueError):
+            raise RebalanceError(f"Invalid target weights for strategy {strategy_id}.")
+        if "" in weights or any(w < 0 for w in weights.values()):
+            raise RebalanceError(f"Strategy {strategy_id}: weights need a ticker and must be non-negative.")
+        if sum(weights.values()) > 1 + WEIGHT_EPSILON:
+            raise RebalanceError(f"Strategy {strategy_id}: weights sum to more than 1.")
+        parsed[strategy_id] = weights
+    return parsed
+
+
+def load_positions(db, strategy_ids):
+    """(cash {id: float}, positions [(strategy_id, TICKER, shares)]) for every strategy in two queries."""
+    marks = ", ".join("?" for _ in strategy_ids)
+    cash = {
+        row["id"]: float(row["current_cash"])
+        for row in db.execute(f"SELECT id, current_cash FROM strategy WHERE id IN ({marks})", list(strategy_ids))
+    }
+    missing = [str(s) for s in strategy_ids if s not in cash]
+    if missing:
+        raise RebalanceError(f"Strategy not found: {', '.join(missing)}.")
+    positions = [
+        (row["strategy_id"], row["ticker"].strip().upper(), float(row["shares"]))
+        for row in db.execute(
+            f"SELECT strategy_id, ticker, shares FROM portfolio WHERE strategy_id IN ({marks}) AND shares > 0",
+            list(strategy_ids),
+        )
+    ]
+    return cash, positions
+
+
+def needed_tickers(db, targets):
+    """Every ticker a plan has to price: targets plus everything currently held."""
+    _, positions = load_positions(db, list(targets))
+    return sorted({t for weights in targets.values() for t in weights} | {p[1] for p in positions})
+
+
+# =====================================================
+# Planning (all strategies at once)
+# =====================================================
+def _round(shares, whole_shares):
+    """Round share counts toward zero so no order spends more than planned."""
+    if whole_shares:
+        return np.trunc(shares + np.sign(shares) * WEIGHT_EPSILON)
+    scale = 10 ** SHARE_DECIMALS
+    return np.trunc(shares * scale + np.sign(shares) * WEIGHT_EPSILON) / scale
+
+
+def plan_rebalance(db, targets, prices, tolerance=0.0, whole_shares=False, min_trade_value=0.0):
+    """Orders that move each strategy to its target weights, without executing anything.
+
+    Holdings, targets and values are (strategies x tickers) arrays, so the
+    whole batch is a handful of array operations whatever its size. Only
+    positions whose weight is more than `tolerance` away from target trade,
+    and those trade back to target. A held ticker missing from a strategy's
+    targets has a target of zero. Sells are listed before buys, and buys are
+    scaled down if rounding would spend more than the cash available.
+    """
+    if not 0 <= tolerance < 1:
+        raise RebalanceError("Tolerance must be between 0 and 1.")
+    strategy_ids = sorted(targets)
+    cash, positions = load_positions(db, strategy_ids)
+    tickers = sorted({t for weights in targets.values() for t in weights} | {p[1] for p in positions})
+    unpriced = [t for t in tickers if not prices.get(t)]
+    if unpriced:
+        raise RebalanceError(f"No price for {', '.join(unpriced)}.")
+
+    row = {s: i for i, s in enumerate(strategy_ids)}
+    column = {t: j for j, t in enumerate(tickers)}
+    price = np.array([float(prices[t]) for t in tickers])
+    held = np.zeros((len(strategy_ids), len(tickers)))
+    target = np.zeros_like(held)
+    if positions:
+        rows, columns, shares = zip(*positions)
+        np.add.at(held, ([row[s] for s in rows], [column[t] for t in columns]), shares)
+    for strategy_id, weights in targets.items():
+        for ticker, weight in weights.items():
+            target[row[strategy_id], column[ticker]] = weight
+    cash_before = np.array([cash[s] for s in strategy_ids])
+
+    value = held * price
+    total = value.sum(axis=1) + cash_before
+    weight = np.divide(value, total[:, None], out=np.zeros_like(value), where=total[:, None] > 0)
+    drift = weight - target
+    trade = np.abs(drift) > tolerance + WEIGHT_EPSILON
+
+    delta = np.where(trade, (target * total[:, None] - value) / price, 0.0)
+    delta = _round(delta, whole_shares)
+    exits = trade & (target == 0)
+    delta[exits] = -held[exits]  # closing a position sells every share, fractional or not
+    delta[np.abs(delta * price) < max(min_trade_value, WEIGHT_EPSILON)] = 0.0
+
+    # Scale buys back where rounding or stale cash would overspend
+    proceeds = np.where(delta < 0, -delta * price, 0.0).sum(axis=1)
+    cost = np.where(delta > 0, delta * price, 0.0).sum(axis=1)
+    available = cash_before + proceeds
+    scale = np.divide(available, cost, out=np.ones_like(cost), where=cost > available)
+    delta = np.where(delta > 0, _round(delta * np.clip(scale, 0.0, 1.0)[:, None], whole_shares), delta)
+    cash_after = cash_before - (delta * price).sum(axis=1)
+
+    plans = []
+    for i, strategy_id in enumerate(strategy_ids):
+        orders = [
+            {"side": "sell" if delta[i, j] < 0 else "buy", "ticker": tickers[j],
+             "shares": float(abs(delta[i, j])), "price": float(price[j])}
+            for j in sorted(np.flatnonzero(delta[i]), key=lambda j: (delta[i, j] > 0, tickers[j]))
+        ]
+        after = (held[i] + delta[i]) * price
+        plans.append({
+            "strategy_id": strategy_id,
+            "total_value": float(total[i]),
+            "cash_before": float(cash_before[i]),
+            "cash_after": float(cash_after[i]),
+            "turnover": float(np.abs(delta[i] * price).sum() / total[i]) if total[i] > 0 else 0.0,
+            "orders": orders,
+            "positions": [
+                {
+                    "ticker": tickers[j],
+                    "shares": float(held[i, j]),
+                    "weight": float(weight[i, j]),
+                    "target": float(target[i, j]),
+                    "weight_after": float(after[j] / total[i]) if total[i] > 0 else 0.0,
+                }
+                for j in np.flatnonzero(held[i] + target[i])
+            ],
+        })
+    return plans
+
+
+# =====================================================
+# Execution
+# =====================================================
+def execute_rebalance(db, targets, prices, **options):
+    """Re-plan against current holdings and execute every strategy's orders in one transaction.
+
+    Planning happens under the write lock, so the orders match the holdings
+    they are applied to; any rejected order (BatchRejected) rolls back every
+    strategy.
+    """
+    def work(db):
+        plans = plan_rebalance(db, targets, prices, **options)
+        for plan in plans:
+            if not plan["orders"]:
+                continue
+            try:
+                executed = apply_orders(db, plan["strategy_id"], plan["orders"], all_or_nothing=True)
+            except BatchRejected as e:
+                for result in e.results:
+                    result["strategy_id"] = plan["strategy_id"]
+                raise
+            plan["results"], plan["cash_after"] = executed["results"], executed["new_cash"]
+        return plans
+
+    return run_in_write_transaction(db, work)
@@ -0,0 +1,222 @@
+import calendar
+import math
+import re
+from datetime import date, timedelta
+
+import numpy as np
+
+# Custom modules
+from helpers.pricestore import STORE
+
+DAYS_PER_YEAR = 365.25
+DEFAULT_SPANS = ("1M", "3M", "YTD", "1Y", "5Y", "MAX")
+LOOKUP_CHUNK = 400  # (strategy, date) pairs per as-of query
+SPAN_PATTERN = re.compile(r"^(\d+)([DWMY])$")
+INDEX_COLUMNS = ("day", "total_value", "cum_log_return", "cum_flow", "cum_day_flow")
+FLOW_TOLERANCE = 1e-6  # Relative gap allowed between the index's cum_flow and the ledger
+
+
+class SpanError(ValueError):
+    """Unrecognised span or window."""
+
+
+class ReturnIndexError(ValueError):
+    """The return index does not account for the ledger's deposits and withdrawals."""
+
+
+# =====================================================
+# Index Maintenance (called by the snapshot job)
+# =====================================================
+def last_index_row(db, strategy_id):
+    return db.execute(
+        "SELECT * FROM return_index WHERE strategy_id = ? ORDER BY date DESC LIMIT 1", (strategy_id,)
+    ).fetchone()
+
+
+def index_rows(strategy_id, snapshots, previous=None):
+    """Prefix-sum rows continuing from previous for (date, total_value, net_flow) snapshots in date order.
+
+    cum_log_return sums each day's flow-adjusted log return, so a window's
+    time-weighted return is exp(L[end] - L[start]) - 1; cum_flow and
+    cum_day_flow (flows weighted by business-day index) give the Modified
+    Dietz denominator for any window from the same two rows.
+    """
+    if not snapshots:
+        return []
+    dates = [row[0] for row in snapshots]
+    day = np.array([STORE.day(d) for d in dates], dtype=float)
+    value = np.array([row[1] for row in snapshots], dtype=float)
+    flow = np.array([row[2] for row in snapshots], dtype=float)
+
+    before = np.concatenate([[previous["total_value"] if previous else np.nan], value[:-1]])
+    growth = np.divide(value - flow, before, out=np.full_like(value, np.nan), where=before > 0)
+    log_return = np.zeros_like(value)
+    np.log(growth, out=log_return, where=growth > 0)  # undefined days (no prior value) add nothing
+
+    base = {c: previous[c] for c in ("cum_log_return", "cum_flow", "cum_day_flow")} if previous else dict.fromkeys(
+        ("cum_log_return", "cum_flow", "cum_day_flow"), 0.0
+    )
+    columns = zip(
+        day.astype(int).tolist(),
+        value.tolist(),
+        (base["cum_log_return"] + np.cumsum(log_return)).tolist(),
+        (base["cum_flow"] + np.cumsum(flow)).tolist(),
+        (base["cum_day_flow"] + np.cumsum(day * flow)).tolist(),
+    )
+    return [(strategy_id, d, *values) for d, values in zip(dates, columns)]
+
+
+def rebuild_return_index(db, strategy_id):
+    """Recreate one strategy's index from its stored snapshots (no commit)."""
+    db.execute("DELETE FROM return_index WHERE strategy_id = ?", (strategy_id,))
+    snapshots = db.execute(
+        "SELECT date, total_value, net_flow FROM equity_snapshots WHERE strategy_id = ? ORDER BY date",
+        (strategy_id,),
+    ).fetchall()
+    write_index(db, index_rows(strategy_id, [tuple(row) for row in snapshots]))
+    verify_index_flows(db, strategy_id)
+
+
+def verify_index_flows(db, strategy_id):
+    """Raise ReturnIndexError unless the last row's cum_flow equals the ledger's net deposits to that day.
+
+    A flow missing from the snapshots would otherwise be counted as
+    performance by every window that spans it.
+    """
+    last = last_index_row(db, strategy_id)
+    if not last:
+        return
+    ledger = db.execute(
+        """
+        SELECT COALESCE(SUM(CASE type WHEN 'deposit' THEN price WHEN 'withdraw' THEN -price ELSE 0 END), 0)
+        FROM transactions WHERE strategy_id = ? AND date <= ?
+        """,
+        (strategy_id, last["date"] + " 23:59:59"),
+    ).fetchone()[0]
+    if abs(last["cum_flow"] - ledger) > FLOW_TOLERANCE * max(1.0, abs(ledger)):
+        raise ReturnIndexError(
+            f"Strategy {strategy_id}: return index flows {last['cum_flow']:.2f} through {last['date']} "
+            f"but the ledger nets {ledger:.2f}; run flask update-snapshots --rebuild."
+        )
+
+
+def write_index(db, rows):
+    db.executemany(
+        f"""
+        INSERT OR REPLACE INTO return_index (strategy_id, date, {", ".join(INDEX_COLUMNS)})
+        VALUES (?, ?, {", ".join("?" for _ in INDEX_COLUMNS)})
+        """,
+        rows,
+    )
+
+
+# =====================================================
+# Windows
+# =====================================================
+def months_before(day, months):
+    year, month = divmod(day.year * 12 + day.month - 1 - months, 12)
+    return date(year, month + 1, min(day.day, calendar.monthrange(year, month + 1)[1]))
+
+
+def span_window(span, end):
+    """(start, end) ISO dates for a span like 1M, 3M, YTD, 1Y, 5Y or MAX ending on end."""
+    span = span.strip().upper()
+    if span == "MAX":
+        return None, end.isoformat()
+    if span == "YTD":
+        return (date(end.year, 1, 1) - timedelta(days=1)).isoformat(), end.isoformat()
+    if span == "MTD":
+        return (end.replace(day=1) - timedelta(days=1)).isoformat(), end.isoformat()
+    match = SPAN_PATTERN.match(span)
+    if not match:
+        raise SpanError(f"Unknown span '{span}'.")
+    count, unit = int(match.group(1)), match.group(2)
+    if unit == "D":
+        start = end - timedelta(days=count)
+    elif unit == "W":
+        start = end - timedelta(weeks=count)
+    else:
+        start = months_before(end, count * (12 if unit == "Y" else 1))
+    return start.isoformat(), end.isoformat()
+
+
+# =====================================================
+# Window Returns
+# =====================================================
+def _as_of(db, pairs):
+    """{(strategy_id, date): index row} for the last row on or before each date (first row if none)."""
+    found = {}
+    pairs = list(pairs)
+    for i in range(0, len(pairs), LOOKUP_CHUNK):
+        chunk = pairs[i:i + LOOKUP_CHUNK]
+        values = ", ".join("(?, ?)" for _ in chunk)
+        rows = db.execute(
+            f"""
+            WITH wanted(strategy_id, asked) AS (VALUES {values})
+            SELECT w.strategy_id AS sid, w.asked, r.date, r.{", r.".join(INDEX_COLUMNS)}
+            FROM wanted w
+            JOIN return_index r ON r.strategy_id = w.strategy_id AND r.date = COALESCE(
+                (SELECT MAX(date) FROM return_index WHERE strategy_id = w.strategy_id AND date <= w.asked),
+                (SELECT MIN(date) FROM return_index WHERE strategy_id = w.strategy_id)
+            )
+            """,
+            [value for pair in chunk for value in pair],
+        ).fetchall()
+        for row in rows:
+            found[(row["sid"], row["asked"])] = row
+    return found
+
+
+def window_return(first, last):
+    """Returns between two index rows: constant work whatever the window length."""
+    flows = last["cum_flow"] - first["cum_flow"]
+    elapsed = last["day"] - first["day"]
+    time_weighted = math.exp(last["cum_log_return"] - first["cum_log_return"]) - 1.0
+
+    # Modified Dietz: each flow weighted by the share of the window it was invested
+    weighted = (last["day"] * flows - (last["cum_day_flow"] - first["cum_day_flow"])) / elapsed if elapsed else 0.0
+    invested = first["total_value"] + weighted
+    gain = last["total_value"] - first["total_value"] - flows
+
+    result = {
+        "start": first["date"],
+        "end": last["date"],
+        "start_value": first["total_value"],
+        "end_value": last["total_value"],
+        "net_flows": flows,
+        "gain": gain,
+        "time_weighted_return": time_weighted,
+        "money_weighted_return": gain / invested if invested > 0 else None,
+    }
+    years = (date.fromisoformat(last["date"]) - date.fromisoformat(first["date"])).days / DAYS_PER_YEAR
+    if years >= 1:
+        result["annualized_return"] = (1.0 + time_weighted) ** (1.0 / years) - 1.0
+    return result
+
+
+def window_returns(db, strategy_ids, windows):
+    """{strategy_id: {label: returns}} for every (label, start, end) window, from two lookups each.
+
+    All as-of lookups for all strategies and windows go to SQLite together,
+    each an index seek on return_index's primary key.
+    """
+    pairs = set()
+    for strategy_id in strategy_ids:
+        for _, start, end in windows:
+            pairs.add((strategy_id, start or "0000-00-00"))
+            pairs.add((strategy_id, end))
+    rows = _as_of(db, pairs)
+
+    results = {}
+    for strategy_id in strategy_ids:
+        results[strategy_id] = {}
+        for label, start, end in windows:
+            first = rows.get((strategy_id, start or "0000-00-00"))
+            last = rows.get((strategy_id, end))
+            if not first or not last or last["date"] < first["date"]:
+                results[strategy_id][label] = None
+                continue
+            result = window_return(first, last)
+            result["partial"] = bool(start) and first["date"] > start  # history starts inside the window
+            results[strategy_id][label] = result
+    return results
@@ -0,0 +1,290 @@
+import os
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+from statistics import NormalDist
+
+import numpy as np
+
+# Custom modules
+from helpers.backtest import TRADING_DAYS
+from helpers.cache import SingleFlight
+from helpers.pricestore import STORE, forward_fill
+
+DEFAULT_BENCHMARK = os.getenv("RISK_BENCHMARK", "SPY")
+DEFAULT_LOOKBACK = TRADING_DAYS  # Daily returns in the window
+CONFIDENCE_LEVELS = (0.95, 0.99)
+MIN_OBSERVATIONS = 20
+COVARIANCE_CACHE_SIZE = 32  # Ticker-set/lookback windows kept in memory
+RESYNC_UPDATES = 250  # Incremental updates before the running sums are recomputed exactly
+
+
+class RiskError(ValueError):
+    """Not enough price history or bad risk parameters."""
+
+
+# =====================================================
+# Rolling Covariance (one ticker set and lookback)
+# =====================================================
+def _prices(tickers, first_day, last_day):
+    """Forward-filled USD closes (tickers x days) and the index of the last day returned."""
+    start, end = (str(d) for d in STORE.dates(first_day, last_day)[[0, -1]])
+    values, _, dates = STORE.window(tickers, start, end, currency="USD")
+    return forward_fill(values), STORE.day(dates[-1])
+
+
+class RollingCovariance:
+    """The last `lookback` daily returns of a ticker set, with running sums for the covariance.
+
+    Moving the window forward adds the new days' return sums and cross
+    products and subtracts the ones that fall out, so a daily update costs
+    O(new days x N^2) instead of a full O(lookback x N^2) recompute.
+    """
+
+    def __init__(self, tickers, lookback, end_day):
+        self.tickers = tickers
+        self.lookback = lookback
+        self.lock = threading.Lock()  # held by the cache while advancing or reading this window
+        prices, self.last_day = _prices(tickers, max(end_day - lookback, 0), end_day)
+        complete = ~np.isnan(prices).any(axis=0)
+        if not complete.any():
+            raise RiskError("No day in the window has prices for every ticker.")
+        prices = prices[:, complete.argmax():]  # trim to the days every ticker has traded
+        self.last_prices = prices[:, -1]
+        self._reset((prices[:, 1:] / prices[:, :-1] - 1.0).T)
+
+    def _reset(self, returns):
+        self.returns = returns
+        self.sums = returns.sum(axis=0)
+        self.products = returns.T @ returns
+        self.updates = 0
+
+    def advance(self, end_day):
+        """Slide the window forward to end_day; returns the number of new days."""
+        prices, last_day = _prices(self.tickers, self.last_day, end_day)
+        prices[:, 0] = self.last_prices
+        prices = forward_fill(prices)
+        new = (prices[:, 1:] / prices[:, :-1] - 1.0).T
+        if not len(new):
+            return 0
+
+        returns = np.concatenate([self.returns, new])
+        dropped = returns[:max(len(returns) - self.lookback, 0)]
+        returns = returns[len(dropped):]
+        self.last_day, self.last_prices = last_day, prices[:, -1]
+        if len(new) >= self.lookback or self.updates >= RESYNC_UPDATES:
+            self._reset(returns)  # cheaper (or more accurate) to start over
+            return len(new)
+
+        self.sums += new.sum(axis=0) - dropped.sum(axis=0)
+        self.products += new.T @ new - dropped.T @ dropped
+        self.returns = returns
+        self.updates += 1
+        return len(new)
+
+    def snapshot(self):
+        """(returns (T, N), mean (N,), covariance (N, N), last day index) for the current window."""
+        count = len(self.returns)
+        if count < MIN_OBSERVATIONS:
+            raise RiskError(f"Only {count} days of common price history; need at least {MIN_OBSERVATIONS}.")
+        mean = self.sums / count
+        covariance = (self.products - count * np.outer(mean, mean)) / (count - 1)
+        return self.returns, mean, covariance, self.last_day
+
+
+class CovarianceCache:
+    """LRU of RollingCovariance windows keyed by (ticker set, lookback).
+
+    The cache-wide lock only guards the LRU itself. Windows are built outside
+    it (concurrent misses for one key share a single build) and each window
+    is advanced under its own lock, so a slow build never holds up requests
+    for other ticker sets.
+    """
+
+    def __init__(self, maxsize=COVARIANCE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._building = SingleFlight()
+        self.hits = 0
+        self.updates = 0
+        self.misses = 0
+
+    def _build(self, key, end_day):
+        entry = RollingCovariance(list(key[0]), key[1], end_day)
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = entry
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    def get(self, tickers, lookback, end_day):
+        """Window snapshot ending on end_day, advancing or building the cached entry as needed."""
+        key = (tuple(tickers), lookback)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        built = entry is None
+        if built:
+            entry = self._building.do(key, lambda: self._build(key, end_day))
+
+        with entry.lock:
+            if entry.last_day <= end_day:
+                advanced = entry.last_day < end_day and entry.advance(end_day)
+                with self._lock:
+                    if advanced:
+                        self.updates += 1
+                    elif not built:
+                        self.hits += 1
+                return entry.snapshot()
+        return RollingCovariance(list(tickers), lookback, end_day).snapshot()  # past window: not cached
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.updates = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "updates": self.updates,
+                "misses": self.misses,
+            }
+
+
+COVARIANCE = CovarianceCache()
+
+
+# =====================================================
+# Batched Statistics
+# =====================================================
+def risk_stats(returns, mean, covariance, weights, benchmark, risk_free=0.0, levels=CONFIDENCE_LEVELS):
+    """Risk statistics for K weight vectors at once.
+
+    weights is (K, N) over the columns of returns; benchmark is the column
+    index of the benchmark. Every statistic is an array of length K (VaR and
+    CVaR are (K, levels)), all from one matrix product per input.
+    """
+    weights = np.atleast_2d(weights)
+    levels = np.asarray(levels, dtype=float)
+    series = returns @ weights.T  # (T, K) daily returns
+    mu = weights @ mean
+    sigma = np.sqrt(np.maximum(np.einsum("kn,nm,km->k", weights, covariance, weights), 0.0))
+    daily_free = risk_free / TRADING_DAYS
+
+    excess = mu * TRADING_DAYS - risk_free
+    volatility = sigma * np.sqrt(TRADING_DAYS)
+    downside = np.sqrt((np.minimum(series - daily_free, 0.0) ** 2).mean(axis=0)) * np.sqrt(TRADING_DAYS)
+    wealth = np.cumprod(1.0 + series, axis=0)
+    drawdown = wealth / np.maximum.accumulate(np.maximum(wealth, 1.0), axis=0) - 1.0
+
+    # Historical: the empirical tail of the window's daily returns
+    cutoff = np.quantile(series, 1.0 - levels, axis=0).T  # (K, levels)
+    tail = series.T[:, :, None] <= cutoff[:, None, :]  # (K, T, levels)
+    tail_mean = (series.T[:, :, None] * tail).sum(axis=1) / np.maximum(tail.sum(axis=1), 1)
+
+    # Parametric: normal returns with the window's mean and covariance
+    normal = NormalDist()
+    z = np.array([normal.inv_cdf(1.0 - level) for level in levels])
+    density = np.array([normal.pdf(value) for value in z])
+
+    market = covariance[:, benchmark]
+    variance = covariance[benchmark, benchmark]  # zero for a flat benchmark: beta is undefined
+    return {
+        "annual_return": mu * TRADING_DAYS,
+        "volatility": volatility,
+        "beta": weights @ market / variance if variance > 0 else np.full(len(weights), np.nan),
+        "sharpe": np.divide(excess, volatility, out=np.zeros_like(excess), where=volatility > 0),
+        "sortino": np.divide(excess, downside, out=np.zeros_like(excess), where=downside > 0),
+        "max_drawdown": drawdown.min(axis=0),
+        "var_historical": -cutoff,
+        "cvar_historical": -tail_mean,
+        "var_parametric": -(mu[:, None] + sigma[:, None] * z),
+        "cvar_parametric": -(mu[:, None] - sigma[:, None] * density / (1.0 - levels)),
+    }
+
+
+# =====================================================
+# Strategy Risk
+# =====================================================
+def estimates(tickers, lookback=DEFAULT_LOOKBACK, end=None):
+    """(returns, daily mean, daily covariance, last day index) over the window ending on end.
+
+    Served from the covariance cache; the window never includes today's
+    still-moving bar.
+    """
+    if lookback < MIN_OBSERVATIONS:
+        raise RiskError(f"Lookback must be at least {MIN_OBSERVATIONS} days.")
+    settled = (date.today() - timedelta(days=1)).isoformat()
+    return COVARIANCE.get(list(tickers), lookback, STORE.last_day(min(end or settled, settled)))
+
+
+def _number(value):
+    """JSON-safe float: None where a statistic is undefined (NaN or infinite)."""
+    return float(value) if np.isfinite(value) else None
+
+
+def _correlation(a, b):
+    if a.std() == 0 or b.std() == 0:
+        return None
+    return float(np.corrcoef(a, b)[0, 1])
+
+
+def portfolio_risk(weights, total_value, benchmark=DEFAULT_BENCHMARK, lookback=DEFAULT_LOOKBACK,
+                   end=None, risk_free=0.0, levels=CONFIDENCE_LEVELS):
+    """Risk report for holdings weights (fractions of total_value; the rest is cash).
+
+    Covariance comes from the shared cache, so repeated requests for the same
+    holdings only add the days that arrived since the last one.
+    """
+    if any(not 0 < level < 1 for level in levels):
+        raise RiskError("Confidence levels must be between 0 and 1.")
+    held = sorted(weights)
+    tickers = sorted(set(held) | {benchmark})
+    column = {ticker: i for i, ticker in enumerate(tickers)}
+    returns, mean, covariance, last_day = estimates(tickers, lookback, end)
+
+    # Row 0 is the portfolio, then one row per holding on its own
+    matrix = np.zeros((len(held) + 1, len(tickers)))
+    for i, ticker in enumerate(held):
+        matrix[0, column[ticker]] = weights[ticker]
+        matrix[i + 1, column[ticker]] = 1.0
+    stats = risk_stats(returns, mean, covariance, matrix, column[benchmark], risk_free, levels)
+    bench = risk_stats(returns, mean, covariance, np.eye(len(tickers))[[column[benchmark]]], column[benchmark],
+                       risk_free, levels)
+
+    # Share of portfolio variance from each holding (sums to 1)
+    portfolio = matrix[0]
+    variance = portfolio @ covariance @ portfolio
+    contribution = portfolio * (covariance @ portfolio) / variance if variance > 0 else np.zeros_like(portfolio)
+
+    def row(stats, k, value=None):
+        report = {key: _number(stats[key][k]) for key in ("annual_return", "volatility", "beta", "sharpe",
+                                                          "sortino", "max_drawdown")}
+        for key in ("var_historical", "cvar_historical", "var_parametric", "cvar_parametric"):
+            report[key] = {f"{level:g}": float(v) for level, v in zip(levels, stats[key][k])}
+            if value is not None:
+                report[key + "_amount"] = {f"{level:g}": float(v) * value for level, v in zip(levels, stats[key][k])}
+        return report
+
+    dates = STORE.dates(last_day - len(returns) + 1, last_day)
+    return {
+        "start": str(dates[0]),
+        "end": str(dates[-1]),
+        "observations": len(returns),
+        "benchmark": {"ticker": benchmark, **row(bench, 0)},
+        "portfolio": {
+            **row(stats, 0, total_value),
+            "correlation": _correlation(returns @ portfolio, returns[:, column[benchmark]]),
+        },
+        "positions": [
+            {"ticker": ticker, "weight": weights[ticker], "risk_contribution": float(contribution[column[ticker]]),
+             **row(stats, i + 1)}
+            for i, ticker in enumerate(held)
+        ],
+    }
@@ -1,20 +1,123 @@
+import os
+import queue
 import sqlite3
+import threading
+from contextlib import contextmanager
 from flask import Blueprint, jsonify, g
 from werkzeug.exceptions import HTTPException
 
+DATABASE = os.getenv("PORTFOLIO_DB", "portfolio.db")
+SCHEMA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "portfolio.sql")
+POOL_SIZE = 16  # Idle connections kept open for reuse
+BUSY_TIMEOUT = 5.0  # Seconds a writer waits on a locked database before failing
+
+# Applied once per connection, when it is created
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",  # readers never block the writer (persisted in the file)
+    "PRAGMA synchronous = NORMAL",  # fsync at checkpoints only; safe with WAL
+    f"PRAGMA busy_timeout = {int(BUSY_TIMEOUT * 1000)}",
+    "PRAGMA cache_size = -16000",  # ~16 MB page cache per connection
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA mmap_size = 134217728",  # 128 MB memory-mapped reads
+)
+
 # ============================
 # Database Connection
 # ============================
+def connect_db(path=None):
+    """Open a new tuned connection."""
+    db = sqlite3.connect(path or DATABASE, timeout=BUSY_TIMEOUT, check_same_thread=False)
+    db.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        db.execute(pragma)
+    return db
+
+def apply_schema(db):
+    """Run portfolio.sql on a connection; every statement is idempotent, so this doubles as a migration."""
+    with open(SCHEMA) as f:
+        db.executescript(f.read())
+    db.commit()
+
+class ConnectionPool:
+    """Reuse tuned connections across requests and threads (one borrower at a time).
+
+    The first connection a pool opens applies the schema, so tables added
+    since the database was made exist before any request uses them.
+    """
+
+    def __init__(self, path, size=POOL_SIZE):
+        self.path = path
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            db = connect_db(self.path)
+            if not self._schema_ready:
+                with self._schema_lock:
+                    if not self._schema_ready:
+                        apply_schema(db)
+                        self._schema_ready = True
+            return db
+
+    def release(self, db):
+        if db.in_transaction:
+            db.rollback()  # never hand on locks or half-finished writes
+        try:
+            self._idle.put_nowait(db)
+        except queue.Full:
+            db.close()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+POOL = ConnectionPool(DATABASE)
+
+def configure_db(path):
+    """Point every connection (requests and helpers) at a different database file."""
+    global DATABASE, POOL
+    if path == DATABASE:
+        return
+    POOL.close_all()
+    DATABASE = path
+    POOL = ConnectionPool(path)
+
+@contextmanager
+def db_connection():
+    """Borrow a pooled connection outside a request."""
+    db = POOL.acquire()
+    try:
+        yield db
+    finally:
+        POOL.release(db)
+
 def get_db():
     if "db" not in g:
-        g.db = sqlite3.connect("portfolio.db")
-        g.db.row_factory = sqlite3.Row
+        g.db = POOL.acquire()
     return g.db
 
 def close_db(e=None):
     db = g.pop("db", None)
     if db is not None:
-        db.close()
+        POOL.release(db)
+
+def init_app(app):
+    """Use app.config["DATABASE"] and return connections to the pool at teardown."""
+    app.config.setdefault("DATABASE", DATABASE)
+    configure_db(app.config["DATABASE"])
+    app.teardown_appcontext(close_db)
+
+def init_db():
+    """Apply portfolio.sql now rather than on the pool's first connection."""
+    with db_connection() as db:
+        apply_schema(db)
 
 # ============================
 # Error Handlers
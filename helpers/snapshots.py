@@ -0,0 +1,271 @@
+from datetime import date, timedelta
+
+import numpy as np
+
+# Custom modules
+from helpers.pricestore import STORE, forward_fill
+from helpers.returns import index_rows, last_index_row, rebuild_return_index, verify_index_flows, write_index
+from helpers.trading import run_in_write_transaction
+
+SHARE_EPSILON = 1e-9
+
+
+# =====================================================
+# Planning (a few aggregate queries per strategy)
+# =====================================================
+def _rewind_backdated(db, strategy_id):
+    """Drop snapshots that a backdated transaction (e.g. a CSV import) has made stale."""
+    row = db.execute(
+        "SELECT MAX(date) AS last, MAX(transaction_id) AS seen FROM equity_snapshots WHERE strategy_id = ?",
+        (strategy_id,),
+    ).fetchone()
+    if not row["last"]:
+        return
+    earliest = db.execute(
+        "SELECT MIN(date) FROM transactions WHERE strategy_id = ? AND id > ?",
+        (strategy_id, row["seen"] or 0),
+    ).fetchone()[0]
+    if earliest and earliest[:10] <= row["last"]:
+        for table in ("equity_snapshots", "return_index"):
+            db.execute(f"DELETE FROM {table} WHERE strategy_id = ? AND date >= ?", (strategy_id, earliest[:10]))
+
+
+def _sync_index(db, strategy_id):
+    """Rebuild the return index if it does not end where the snapshots do (e.g. after an upgrade)."""
+    last = db.execute(
+        "SELECT MAX(date) FROM equity_snapshots WHERE strategy_id = ?", (strategy_id,)
+    ).fetchone()[0]
+    indexed = db.execute(
+        "SELECT MAX(date) FROM return_index WHERE strategy_id = ?", (strategy_id,)
+    ).fetchone()[0]
+    if last != indexed:
+        rebuild_return_index(db, strategy_id)
+
+
+def _plan(db, strategy, end):
+    """Opening state and the ledger rows to replay for one strategy, or None if up to date."""
+    strategy_id = strategy["id"]
+    last = db.execute(
+        "SELECT MAX(date) FROM equity_snapshots WHERE strategy_id = ?", (strategy_id,)
+    ).fetchone()[0]
+    if last:
+        since = (date.fromisoformat(last) + timedelta(days=1)).isoformat()
+    else:
+        first = db.execute("SELECT MIN(date) FROM transactions WHERE strategy_id = ?", (strategy_id,)).fetchone()[0]
+        if not first:
+            return None
+        since = first[:10]
+    # Rows from since onward are replayed; weekend rows land on the next business day (start or later)
+    start = str(np.busday_offset(np.datetime64(since, "D"), 0, roll="forward"))
+    through = str(STORE.dates(STORE.last_day(end), STORE.last_day(end))[0])
+    if start > through:
+        return None
+
+    # State before since: one aggregate each for shares and cash
+    opening = db.execute(
+        """
+        SELECT ticker, SUM(CASE WHEN type = 'buy' THEN shares ELSE -shares END) AS net
+        FROM transactions
+        WHERE strategy_id = ? AND type IN ('buy', 'sell') AND date < ?
+        GROUP BY ticker
+        """,
+        (strategy_id, since),
+    ).fetchall()
+    flows = db.execute(
+        """
+        SELECT COALESCE(SUM(CASE type
+                   WHEN 'deposit' THEN price
+                   WHEN 'withdraw' THEN -price
+                   WHEN 'buy' THEN -price * shares
+                   WHEN 'sell' THEN price * shares
+               END), 0) AS cash,
+               COALESCE(MAX(id), 0) AS seen
+        FROM transactions WHERE strategy_id = ? AND date < ?
+        """,
+        (strategy_id, since),
+    ).fetchone()
+    ledger = db.execute(
+        """
+        SELECT id, type, ticker, shares, price, date
+        FROM transactions
+        WHERE strategy_id = ? AND date >= ? AND date <= ?
+        ORDER BY date, id
+        """,
+        (strategy_id, since, through + " 23:59:59"),
+    ).fetchall()
+
+    held = {row["ticker"].strip().upper(): float(row["net"]) for row in opening if abs(row["net"] or 0) > SHARE_EPSILON}
+    return {
+        "id": strategy_id,
+        "start": start,
+        "held": held,
+        "cash": float(strategy["starting_cash"] or 0) + float(flows["cash"]),
+        "seen": int(flows["seen"]),
+        "ledger": ledger,
+        "tickers": set(held) | {row["ticker"].strip().upper() for row in ledger if row["ticker"]},
+    }
+
+
+# =====================================================
+# Replay (vectorized over days and tickers)
+# =====================================================
+def _replay(plan, tickers, prices, first_day, days):
+    """Daily snapshot rows for one strategy.
+
+    Each ledger row becomes a delta at its day index (np.add.at), rows dated
+    on a weekend or holiday counting on the next business day; holdings,
+    cash and flows are cumulative sums over days, and equity is holdings
+    times close prices summed per day.
+    """
+    offset = STORE.day(plan["start"]) - first_day
+    count = days - offset
+    column = {ticker: i for i, ticker in enumerate(tickers)}
+    own = sorted(plan["tickers"], key=column.get)
+    cols = np.array([column[t] for t in own], dtype=np.intp)
+    local = {t: i for i, t in enumerate(own)}
+
+    shares = np.zeros((count, len(own)))
+    cash = np.zeros(count)
+    flow = np.zeros(count)
+    seen = np.zeros(count, dtype=np.int64)
+    for ticker, net in plan["held"].items():
+        shares[0, local[ticker]] += net
+
+    ledger = plan["ledger"]
+    if ledger:
+        day = np.array([STORE.day(row["date"][:10]) for row in ledger]) - first_day - offset
+        kind = np.array([row["type"] for row in ledger])
+        amount = np.array([float(row["price"] or 0) for row in ledger])
+        size = np.array([float(row["shares"] or 0) for row in ledger])
+        ids = np.array([row["id"] for row in ledger], dtype=np.int64)
+
+        trades = np.isin(kind, ("buy", "sell"))
+        sign = np.where(kind == "buy", 1.0, -1.0)
+        if trades.any():
+            where = np.array([local[row["ticker"].strip().upper()] for row in ledger if row["type"] in ("buy", "sell")])
+            np.add.at(shares, (day[trades], where), (sign * size)[trades])
+        deposits = np.where(kind == "deposit", amount, np.where(kind == "withdraw", -amount, 0.0))
+        np.add.at(cash, day, deposits + np.where(trades, -sign * size * amount, 0.0))
+        np.add.at(flow, day, deposits)
+        np.maximum.at(seen, day, ids)
+
+    shares = np.cumsum(shares, axis=0)
+    cash = plan["cash"] + np.cumsum(cash)
+    seen = np.maximum.accumulate(np.maximum(seen, plan["seen"]))
+
+    window = prices[cols, offset:]
+    equity = np.where(np.isnan(window.T), 0.0, shares * window.T).sum(axis=1)
+    dates = STORE.dates(first_day + offset, first_day + days - 1)
+    return [
+        (plan["id"], str(d), c, e, c + e, f, int(s))
+        for d, c, e, f, s in zip(dates, cash.tolist(), equity.tolist(), flow.tolist(), seen.tolist())
+    ]
+
+
+# =====================================================
+# Snapshot Job
+# =====================================================
+def update_snapshots(db, strategy_id=None, end=None, refresh=True, rebuild=False):
+    """Append daily snapshots from each strategy's last one through end (default yesterday).
+
+    Every strategy is planned with a handful of aggregate queries, prices for
+    the union of tickers come from one store window, and all new rows are
+    written in one transaction - so a years-long backfill is one pass.
+    rebuild=True drops the stored snapshots first and replays the whole ledger.
+    The write is rolled back with ReturnIndexError if a strategy's index
+    flows no longer match its ledger.
+    """
+    end = end or (date.today() - timedelta(days=1)).isoformat()
+    if strategy_id is None:
+        strategies = db.execute("SELECT id, starting_cash FROM strategy ORDER BY id").fetchall()
+    else:
+        strategies = db.execute("SELECT id, starting_cash FROM strategy WHERE id = ?", (strategy_id,)).fetchall()
+
+    def plan_all(db):
+        for strategy in strategies:
+            if rebuild:
+                for table in ("equity_snapshots", "return_index"):
+                    db.execute(f"DELETE FROM {table} WHERE strategy_id = ?", (strategy["id"],))
+            _rewind_backdated(db, strategy["id"])
+            _sync_index(db, strategy["id"])
+        return [p for p in (_plan(db, s, end) for s in strategies) if p]
+
+    plans = run_in_write_transaction(db, plan_all)
+    if not plans:
+        return {"strategies": 0, "rows": 0, "unpriced": []}
+
+    start = min(p["start"] for p in plans)
+    first_day, last_day = STORE.day(start), STORE.last_day(end)
+    days = last_day - first_day + 1
+    tickers = sorted(set().union(*(p["tickers"] for p in plans)))
+
+    prices = np.full((len(tickers), days), np.nan)
+    unpriced = []
+    if tickers:
+        if refresh:
+            STORE.refresh(tickers, start, end)
+        stored = set(STORE.tickers())
+        known = [t for t in tickers if t in stored]
+        if known:
+            values, _, _ = STORE.window(known, start, end, currency="USD")
+            rows = [tickers.index(t) for t in known]
+            prices[rows, :values.shape[1]] = forward_fill(values)
+        unpriced = [t for t, row in zip(tickers, prices) if np.isnan(row).all()]
+
+    replayed = {plan["id"]: _replay(plan, tickers, prices, first_day, days) for plan in plans}
+
+    def write(db):
+        db.executemany(
+            """
+            INSERT OR REPLACE INTO equity_snapshots
+                (strategy_id, date, cash, equity, total_value, net_flow, transaction_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            [row for rows in replayed.values() for row in rows],
+        )
+        # Extend each strategy's return index from its last row in the same transaction
+        for strategy_id, rows in replayed.items():
+            snapshots = [(row[1], row[4], row[5]) for row in rows]
+            write_index(db, index_rows(strategy_id, snapshots, last_index_row(db, strategy_id)))
+            verify_index_flows(db, strategy_id)
+
+    run_in_write_transaction(db, write)
+    rows = sum(len(rows) for rows in replayed.values())
+    return {"strategies": len(plans), "rows": rows, "unpriced": unpriced}
+
+
+# =====================================================
+# Reads
+# =====================================================
+def equity_curve(db, strategy_id, start=None, end=None):
+    """Stored snapshots as columns: {"dates", "cash", "equity", "total_value", "net_flow"}."""
+    rows = db.execute(
+        """
+        SELECT date, cash, equity, total_value, net_flow
+        FROM equity_snapshots
+        WHERE strategy_id = ? AND date >= ? AND date <= ?
+        ORDER BY date
+        """,
+        (strategy_id, start or "0000-00-00", end or "9999-99-99"),
+    ).fetchall()
+    return {key: [row[key] for row in rows] for key in ("date", "cash", "equity", "total_value", "net_flow")}
+
+
+def period_return(curve):
+    """Value change, net flows and time-weighted return over a curve from equity_curve()."""
+    values = np.array(curve["total_value"], dtype=float)
+    flows = np.array(curve["net_flow"], dtype=float)
+    if len(values) < 2:
+        return None
+    # Each day's return excludes that day's deposits/withdrawals
+    previous = values[:-1]
+    daily = np.divide(values[1:] - flows[1:], previous, out=np.ones_like(previous), where=previous > 0)
+    return {
+        "start": curve["date"][0],
+        "end": curve["date"][-1],
+        "start_value": float(values[0]),
+        "end_value": float(values[-1]),
+        "net_flows": float(flows[1:].sum()),
+        "gain": float(values[-1] - values[0] - flows[1:].sum()),
+        "time_weighted_return": float(np.prod(daily) - 1.0),
+    }
@@ -0,0 +1,248 @@
+import random
+import sqlite3
+import time
+from datetime import datetime
+
+# Custom modules
+from helpers.ledger import record_buy, record_sell
+from helpers.lots import open_lot, close_lots
+
+MAX_RETRIES = 5  # Attempts after the connection's own busy timeout gives up
+RETRY_BACKOFF = 0.05  # Seconds; doubled on every retry, plus jitter
+SHARE_EPSILON = 1e-9
+
+
+class TradeError(ValueError):
+    """An order was rejected against the strategy's current state."""
+
+
+# =====================================================
+# Write Unit Of Work
+# =====================================================
+def is_busy(error):
+    """True for SQLite lock/busy errors that are worth retrying."""
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+
+def run_in_write_transaction(db, work, retries=MAX_RETRIES):
+    """Run work(db) under BEGIN IMMEDIATE and commit, retrying while the database is busy.
+
+    IMMEDIATE takes SQLite's write lock up front, so every read inside work()
+    sees the state it is about to modify and no other writer can interleave.
+    Any exception rolls the whole unit back.
+    """
+    for attempt in range(retries + 1):
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            result = work(db)
+            db.commit()
+            return result
+        except sqlite3.OperationalError as e:
+            if db.in_transaction:
+                db.rollback()
+            if not is_busy(e) or attempt == retries:
+                raise
+            time.sleep(RETRY_BACKOFF * (2 ** attempt) * (1 + random.random()))
+        except Exception:
+            if db.in_transaction:
+                db.rollback()
+            raise
+
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _cash(db, strategy_id):
+    return float(db.execute("SELECT current_cash FROM strategy WHERE id = ?", (strategy_id,)).fetchone()["current_cash"])
+
+
+def _require_strategy(db, strategy_id):
+    if not db.execute("SELECT id FROM strategy WHERE id = ?", (strategy_id,)).fetchone():
+        raise TradeError("Strategy not found.")
+
+
+def _record(db, strategy_id, kind, ticker, shares, price, date):
+    cursor = db.execute(
+        """
+        INSERT INTO transactions (strategy_id, type, ticker, shares, price, date)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        (strategy_id, kind, ticker, shares, price, date),
+    )
+    return cursor.lastrowid
+
+
+# =====================================================
+# Cash Movements (call inside a write transaction)
+# =====================================================
+def apply_deposit(db, strategy_id, amount, date=None):
+    result = db.execute(
+        "UPDATE strategy SET current_cash = current_cash + ? WHERE id = ?", (amount, strategy_id)
+    )
+    if result.rowcount == 0:
+        raise TradeError("Strategy not found.")
+    _record(db, strategy_id, "deposit", None, None, amount, date or _now())
+    return {"amount": amount, "new_cash": _cash(db, strategy_id)}
+
+
+def apply_withdraw(db, strategy_id, amount, date=None):
+    result = db.execute(
+        "UPDATE strategy SET current_cash = current_cash - ? WHERE id = ? AND current_cash >= ?",
+        (amount, strategy_id, amount),
+    )
+    if result.rowcount == 0:
+        _require_strategy(db, strategy_id)
+        raise TradeError("Insufficient cash balance.")
+    _record(db, strategy_id, "withdraw", None, None, amount, date or _now())
+    return {"amount": amount, "new_cash": _cash(db, strategy_id)}
+
+
+# =====================================================
+# Trades (call inside a write transaction)
+# =====================================================
+def apply_buy(db, strategy_id, ticker, shares, price, date=None):
+    cost = price * shares
+    result = db.execute(
+        "UPDATE strategy SET current_cash = current_cash - ? WHERE id = ? AND current_cash >= ?",
+        (cost, strategy_id, cost),
+    )
+    if result.rowcount == 0:
+        _require_strategy(db, strategy_id)
+        raise TradeError("Insufficient cash balance.")
+
+    db.execute(
+        """
+        INSERT INTO portfolio (strategy_id, ticker, shares) VALUES (?, ?, ?)
+        ON CONFLICT(strategy_id, ticker) DO UPDATE SET shares = shares + excluded.shares
+        """,
+        (strategy_id, ticker, shares),
+    )
+    record_buy(db, strategy_id, ticker, shares, price)
+
+    date = date or _now()
+    transaction_id = _record(db, strategy_id, "buy", ticker, shares, price, date)
+    lot_id = open_lot(db, strategy_id, ticker, shares, price, date, transaction_id)
+    return {
+        "side": "buy",
+        "ticker": ticker,
+        "shares": shares,
+        "price": price,
+        "cost": cost,
+        "lot_id": lot_id,
+        "new_cash": _cash(db, strategy_id),
+    }
+
+
+def apply_sell(db, strategy_id, ticker, shares, price, date=None, lot_method="fifo", lot_ids=None):
+    result = db.execute(
+        "UPDATE portfolio SET shares = shares - ? WHERE strategy_id = ? AND ticker = ? AND shares >= ?",
+        (shares, strategy_id, ticker, shares),
+    )
+    if result.rowcount == 0:
+        raise TradeError("Insufficient shares to sell.")
+    db.execute(
+        "DELETE FROM portfolio WHERE strategy_id = ? AND ticker = ? AND shares <= ?",
+        (strategy_id, ticker, SHARE_EPSILON),
+    )
+
+    revenue = price * shares
+    result = db.execute(
+        "UPDATE strategy SET current_cash = current_cash + ? WHERE id = ?", (revenue, strategy_id)
+    )
+    if result.rowcount == 0:
+        raise TradeError("Strategy not found.")
+
+    date = date or _now()
+    transaction_id = _record(db, strategy_id, "sell", ticker, shares, price, date)
+    closures = close_lots(
+        db, strategy_id, ticker, shares, price, date,
+        method=lot_method, lot_ids=lot_ids, transaction_id=transaction_id,
+    )
+    record_sell(db, strategy_id, ticker, shares, price, closures)
+    return {
+        "side": "sell",
+        "ticker": ticker,
+        "shares": shares,
+        "price": price,
+        "revenue": revenue,
+        "lots": closures,
+        "new_cash": _cash(db, strategy_id),
+    }
+
+
+# =====================================================
+# Single-Order Entry Points
+# =====================================================
+def deposit(db, strategy_id, amount):
+    return run_in_write_transaction(db, lambda db: apply_deposit(db, strategy_id, amount))
+
+
+def withdraw(db, strategy_id, amount):
+    return run_in_write_transaction(db, lambda db: apply_withdraw(db, strategy_id, amount))
+
+
+def buy(db, strategy_id, ticker, shares, price):
+    return run_in_write_transaction(db, lambda db: apply_buy(db, strategy_id, ticker, shares, price))
+
+
+def sell(db, strategy_id, ticker, shares, price, lot_method="fifo", lot_ids=None):
+    return run_in_write_transaction(
+        db, lambda db: apply_sell(db, strategy_id, ticker, shares, price, lot_method=lot_method, lot_ids=lot_ids)
+    )
+
+
+# =====================================================
+# Batch Orders
+# =====================================================
+class BatchRejected(TradeError):
+    """At least one order in an all-or-nothing batch failed; nothing was written."""
+
+    def __init__(self, results):
+        super().__init__("One or more orders were rejected; no orders were executed.")
+        self.results = results
+
+
+def apply_orders(db, strategy_id, orders, all_or_nothing=True):
+    """Apply parsed orders in sequence inside an open write transaction.
+
+    Each order runs under its own savepoint, so a rejected order is undone
+    on its own and later orders are checked against the cash and shares that
+    actually remain. With all_or_nothing, any rejection raises BatchRejected
+    (the caller's transaction then rolls everything back).
+    """
+    _require_strategy(db, strategy_id)
+    date = _now()
+    results = []
+
+    for index, order in enumerate(orders):
+        db.execute("SAVEPOINT batch_order")
+        try:
+            if order["side"] == "buy":
+                result = apply_buy(db, strategy_id, order["ticker"], order["shares"], order["price"], date)
+            else:
+                result = apply_sell(
+                    db, strategy_id, order["ticker"], order["shares"], order["price"], date,
+                    lot_method=order.get("lot_method", "fifo"), lot_ids=order.get("lot_ids"),
+                )
+            result.pop("new_cash")
+            results.append({"index": index, "status": "filled", **result})
+        except ValueError as e:  # TradeError or LotError
+            db.execute("ROLLBACK TO batch_order")
+            results.append({"index": index, "status": "rejected", "side": order["side"], "ticker": order["ticker"], "message": str(e)})
+        db.execute("RELEASE batch_order")
+
+    if all_or_nothing and any(r["status"] == "rejected" for r in results):
+        # Fills are about to be rolled back: report them as passing, without lot ids
+        raise BatchRejected([
+            r if r["status"] == "rejected" else
+            {key: r[key] for key in ("index", "side", "ticker", "shares", "price")} | {"status": "ok"}
+            for r in results
+        ])
+    return {"results": results, "new_cash": _cash(db, strategy_id)}
+
+
+def execute_orders(db, strategy_id, orders, all_or_nothing=True):
+    """Execute a batch of orders with a single commit."""
+    return run_in_write_transaction(db, lambda db: apply_orders(db, strategy_id, orders, all_or_nothing))
@@ -0,0 +1,69 @@
+import numpy as np
+
+# Custom modules
+from helpers.api import lookup_many
+from helpers.trading import run_in_write_transaction
+
+
+# =====================================================
+# All-Strategies Valuation
+# =====================================================
+def value_strategies(db, write=True):
+    """Value every strategy from one quote per distinct ticker.
+
+    Holdings are flattened into (strategy, ticker, shares) arrays, priced with
+    a single lookup_many over the union of tickers and summed per strategy with
+    np.bincount. With write=True every total_value is updated in one transaction.
+    """
+    strategies = db.execute(
+        "SELECT id, name, starting_cash, current_cash FROM strategy ORDER BY id ASC"
+    ).fetchall()
+    if not strategies:
+        return {"strategies": [], "tickers": 0, "unpriced": []}
+
+    holdings = db.execute("SELECT strategy_id, ticker, shares FROM portfolio WHERE shares > 0").fetchall()
+    position = {row["id"]: i for i, row in enumerate(strategies)}
+    holdings = [row for row in holdings if row["strategy_id"] in position]
+    tickers = sorted({row["ticker"].strip().upper() for row in holdings})
+    column = {ticker: i for i, ticker in enumerate(tickers)}
+
+    quotes = lookup_many(tickers)
+    prices = np.array(
+        [(quotes.get(t) or {}).get("price") or np.nan for t in tickers], dtype=float
+    )
+
+    owner = np.fromiter((position[row["strategy_id"]] for row in holdings), dtype=np.intp, count=len(holdings))
+    held = np.fromiter((column[row["ticker"].strip().upper()] for row in holdings), dtype=np.intp, count=len(holdings))
+    shares = np.fromiter((row["shares"] for row in holdings), dtype=float, count=len(holdings))
+
+    # Unavailable tickers are left out of equity, as on the portfolio page
+    values = shares * prices[held]
+    priced = ~np.isnan(values)
+    equity = np.bincount(owner[priced], weights=values[priced], minlength=len(strategies))
+
+    starting = np.array([row["starting_cash"] or 0 for row in strategies], dtype=float)
+    cash = np.array([row["current_cash"] or 0 for row in strategies], dtype=float)
+    total = equity + cash
+    returns = np.divide(total - starting, starting, out=np.zeros_like(total), where=starting != 0)
+
+    ids = [row["id"] for row in strategies]
+    if write:
+        run_in_write_transaction(db, lambda db: db.executemany(
+            "UPDATE strategy SET total_value = ? WHERE id = ?", zip(total.tolist(), ids)
+        ))
+
+    return {
+        "strategies": [
+            {
+                "id": id,
+                "name": row["name"],
+                "cash": c,
+                "equity_value": e,
+                "total_value": t,
+                "overall_return": r,
+            }
+            for id, row, c, e, t, r in zip(ids, strategies, cash.tolist(), equity.tolist(), total.tolist(), returns.tolist())
+        ],
+        "tickers": len(tickers),
+        "unpriced": [t for t, p in zip(tickers, prices.tolist()) if np.isnan(p)],
+    }
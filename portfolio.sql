@@ -23,4 +23,97 @@ CREATE TABLE IF NOT EXISTS transactions (
     price REAL,
     date TEXT NOT NULL,
     FOREIGN KEY (strategy_id) REFERENCES strategy(id)
-);
\ No newline at end of file
+);
+
+-- Covers the per-ticker cost-basis aggregate without touching the table
+CREATE INDEX IF NOT EXISTS idx_transactions_cost_basis
+    ON transactions (strategy_id, ticker, type, price, shares);
+
+-- Keyset pagination of the history API on (date, id), newest first
+CREATE INDEX IF NOT EXISTS idx_transactions_history
+    ON transactions (strategy_id, date, id);
+CREATE INDEX IF NOT EXISTS idx_transactions_history_ticker
+    ON transactions (strategy_id, ticker, date, id);
+CREATE INDEX IF NOT EXISTS idx_transactions_history_type
+    ON transactions (strategy_id, type, date, id);
+
+-- Running totals per position, maintained by buy/sell in the same SQL transaction
+CREATE TABLE IF NOT EXISTS position_totals (
+    strategy_id INTEGER NOT NULL,
+    ticker TEXT NOT NULL,
+    shares_bought REAL DEFAULT 0,
+    shares_sold REAL DEFAULT 0,
+    total_bought REAL DEFAULT 0,
+    total_sold REAL DEFAULT 0,
+    cost_basis REAL DEFAULT 0,
+    realized_pnl REAL DEFAULT 0,
+    UNIQUE(strategy_id, ticker),
+    FOREIGN KEY (strategy_id) REFERENCES strategy(id)
+);
+
+-- Tax lots: one per buy, drawn down by sells under the chosen matching rule
+CREATE TABLE IF NOT EXISTS lots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    strategy_id INTEGER NOT NULL,
+    ticker TEXT NOT NULL,
+    transaction_id INTEGER,
+    opened TEXT NOT NULL,
+    price REAL NOT NULL,
+    shares REAL NOT NULL,
+    remaining REAL NOT NULL,
+    FOREIGN KEY (strategy_id) REFERENCES strategy(id),
+    FOREIGN KEY (transaction_id) REFERENCES transactions(id)
+);
+
+-- Partial indexes over open lots only, one per matching order
+CREATE INDEX IF NOT EXISTS idx_lots_open_by_date
+    ON lots (strategy_id, ticker, opened, id) WHERE remaining > 0;
+CREATE INDEX IF NOT EXISTS idx_lots_open_by_price
+    ON lots (strategy_id, ticker, price, id) WHERE remaining > 0;
+
+CREATE TABLE IF NOT EXISTS lot_closures (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    lot_id INTEGER NOT NULL,
+    transaction_id INTEGER,
+    closed TEXT NOT NULL,
+    shares REAL NOT NULL,
+    price REAL NOT NULL,
+    realized_pnl REAL NOT NULL,
+    FOREIGN KEY (lot_id) REFERENCES lots(id),
+    FOREIGN KEY (transaction_id) REFERENCES transactions(id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_lot_closures_lot ON lot_closures (lot_id);
+
+CREATE TABLE IF NOT EXISTS ticker_metadata (
+    ticker TEXT PRIMARY KEY,
+    exchange TEXT NOT NULL,
+    currency TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+
+-- End-of-day value per strategy, appended by the snapshot job (helpers/snapshots.py)
+CREATE TABLE IF NOT EXISTS equity_snapshots (
+    strategy_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    cash REAL NOT NULL,
+    equity REAL NOT NULL,
+    total_value REAL NOT NULL,
+    net_flow REAL NOT NULL DEFAULT 0,
+    transaction_id INTEGER,
+    PRIMARY KEY (strategy_id, date),
+    FOREIGN KEY (strategy_id) REFERENCES strategy(id)
+) WITHOUT ROWID;
+
+-- Running sums over equity_snapshots, so any window's return is two row lookups (helpers/returns.py)
+CREATE TABLE IF NOT EXISTS return_index (
+    strategy_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    day INTEGER NOT NULL,
+    total_value REAL NOT NULL,
+    cum_log_return REAL NOT NULL,
+    cum_flow REAL NOT NULL,
+    cum_day_flow REAL NOT NULL,
+    PRIMARY KEY (strategy_id, date),
+    FOREIGN KEY (strategy_id) REFERENCES strategy(id)
+) WITHOUT ROWID;
@@ -248,6 +248,9 @@ document.addEventListener("click", async (event) => {
 // ======================================================
 // Load portfolio
 // ======================================================
+let live_stream = null;
+let live_data = null;
+
 async function load_portfolio(strategy_id) {
   if (!strategy_id) return;
 
@@ -255,59 +258,95 @@ async function load_portfolio(strategy_id) {
     const response = await fetch(`/api/portfolio/${strategy_id}`);
     if (!response.ok) throw new Error();
 
-    const data = await response.json();
+    render_portfolio(await response.json());
+    watch_portfolio(strategy_id);
+  } catch (err) {
+    console.error("Portfolio load failed:", err);
+    alert("Failed to load portfolio data.");
+  }
+}
 
-    const div = document.getElementById("portfolio");
-    if (!div) return;
+// ======================================================
+// Live updates (server-sent events)
+// ======================================================
+function watch_portfolio(strategy_id) {
+  if (live_stream) live_stream.close();
+  if (!window.EventSource) return;
 
-    div.innerHTML = "";
+  live_stream = new EventSource(`/api/portfolio/${strategy_id}/stream`);
 
-    const overview = data.overview;
-    const portfolio = data.portfolio;
+  live_stream.addEventListener("snapshot", (event) => {
+    render_portfolio(JSON.parse(event.data));
+  });
 
-    if (overview) {
-      const table = document.createElement("table");
-      table.innerHTML = `
-        <tr><th>Starting Cash</th><td>${formatUSD(overview.starting_cash)}</td></tr>
-        <tr><th>Current Cash</th><td>${formatUSD(overview.current_cash)}</td></tr>
-        <tr><th>Equity Value</th><td>${formatUSD(overview.equity_value)}</td></tr>
-        <tr><th>Total Value</th><td>${formatUSD(overview.total_value)}</td></tr>
-        <tr><th>Overall Return</th><td>${formatPercent(overview.overall_return)}</td></tr>
-
-      `;
-      div.appendChild(table);
-    }
+  // Deltas carry only the positions whose price moved, plus new weights and overview
+  live_stream.addEventListener("delta", (event) => {
+    if (!live_data) return;
+    const delta = JSON.parse(event.data);
+    delta.positions.forEach((update) => {
+      const stock = live_data.portfolio.find((s) => s.ticker === update.ticker);
+      if (stock) Object.assign(stock, update);
+    });
+    live_data.portfolio.forEach((stock) => {
+      if (stock.ticker in delta.weights) stock.portfolio_contribution = delta.weights[stock.ticker];
+    });
+    live_data.overview = delta.overview;
+    render_portfolio(live_data);
+  });
 
-    if (Array.isArray(portfolio) && portfolio.length > 0) {
-      const table = document.createElement("table");
-      table.innerHTML = `
-        <thead>
-          <tr>
-            <th>Ticker</th><th>Shares</th><th>Price</th><th>Value</th>
-            <th>Weighted Price</th><th>%</th><th>Return</th>
-          </tr>
-        </thead>
-        <tbody>
-          ${portfolio
-            .map(
-              (stock) => `
-              <tr>
-                <td>${stock.ticker}</td>
-                <td>${stock.shares}</td>
-                <td>${formatUSD(stock.price)}</td>
-                <td>${formatUSD(stock.share_value)}</td>
-                <td>${formatUSD(stock.weighted_price)}</td>
-                <td>${formatPercent(stock.portfolio_contribution)}</td>
-                <td>${formatPercent(stock.stock_return)}</td>
-              </tr>`
-            )
-            .join("")}
-        </tbody>
-      `;
-      div.appendChild(table);
-    }
-  } catch (err) {
-    console.error("Portfolio load failed:", err);
-    alert("Failed to load portfolio data.");
+  live_stream.addEventListener("deleted", () => live_stream.close());
+}
+
+function render_portfolio(data) {
+  live_data = data;
+
+  const div = document.getElementById("portfolio");
+  if (!div) return;
+
+  div.innerHTML = "";
+
+  const overview = data.overview;
+  const portfolio = data.portfolio;
+
+  if (overview) {
+    const table = document.createElement("table");
+    table.innerHTML = `
+      <tr><th>Starting Cash</th><td>${formatUSD(overview.starting_cash)}</td></tr>
+      <tr><th>Current Cash</th><td>${formatUSD(overview.current_cash)}</td></tr>
+      <tr><th>Equity Value</th><td>${formatUSD(overview.equity_value)}</td></tr>
+      <tr><th>Total Value</th><td>${formatUSD(overview.total_value)}</td></tr>
+      <tr><th>Overall Return</th><td>${formatPercent(overview.overall_return)}</td></tr>
+
+    `;
+    div.appendChild(table);
+  }
+
+  if (Array.isArray(portfolio) && portfolio.length > 0) {
+    const table = document.createElement("table");
+    table.innerHTML = `
+      <thead>
+        <tr>
+          <th>Ticker</th><th>Shares</th><th>Price</th><th>Value</th>
+          <th>Weighted Price</th><th>%</th><th>Return</th>
+        </tr>
+      </thead>
+      <tbody>
+        ${portfolio
+          .map(
+            (stock) => `
+            <tr>
+              <td>${stock.ticker}</td>
+              <td>${stock.shares}</td>
+              <td>${formatUSD(stock.price)}</td>
+              <td>${formatUSD(stock.share_value)}</td>
+              <td>${formatUSD(stock.weighted_price)}</td>
+              <td>${formatPercent(stock.portfolio_contribution)}</td>
+              <td>${formatPercent(stock.stock_return)}</td>
+            </tr>`
+          )
+          .join("")}
+      </tbody>
+    `;
+    div.appendChild(table);
   }
 }